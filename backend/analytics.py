@@ -0,0 +1,105 @@
+"""Booking time series for /api/admin/analytics.
+
+Series are read from booking_rollups (see rollups.py), never from bookings:
+hourly series from the hour rows, daily and weekly series from the day rows,
+weeks grouped in SQL by their Monday. A three-year daily range is about 1,100
+primary-key rows however many bookings there are. A window function carries
+the running revenue total, and buckets without activity are filled with
+zeros so charts get an evenly spaced series.
+"""
+from datetime import date, datetime, timedelta
+from dateutil.parser import parse
+from sqlalchemy import func, select
+
+from models import db, BookingRollup
+from rollups import _as_datetime
+
+# interval: (rollup grain, bucket width)
+INTERVALS = {
+    'hour': ('hour', timedelta(hours=1)),
+    'day': ('day', timedelta(days=1)),
+    'week': ('day', timedelta(weeks=1)),
+}
+DEFAULT_DAYS = {'hour': 2, 'day': 30, 'week': 365}
+MAX_POINTS = 5000
+METRICS = ('bookings', 'guests', 'revenue', 'cancellations')
+
+
+class InvalidAnalyticsParameter(ValueError):
+    pass
+
+
+def _parse_date(value):
+    try:
+        return parse(value).date()
+    except (ValueError, OverflowError):
+        raise InvalidAnalyticsParameter('Invalid date format')
+
+
+def parse_range(args):
+    """(interval, start, end) from ?interval=hour|day|week&start=&end= (dates, inclusive)"""
+    interval = args.get('interval', 'day')
+    if interval not in INTERVALS:
+        raise InvalidAnalyticsParameter(f"interval must be one of {', '.join(INTERVALS)}")
+    end = _parse_date(args['end']) if args.get('end') else date.today()
+    start = _parse_date(args['start']) if args.get('start') else end - timedelta(days=DEFAULT_DAYS[interval] - 1)
+    if start > end:
+        raise InvalidAnalyticsParameter('start must not be after end')
+    if interval == 'week':
+        start -= timedelta(days=start.weekday())
+    points = (end - start + timedelta(days=1)) / INTERVALS[interval][1]
+    if points > MAX_POINTS:
+        raise InvalidAnalyticsParameter(f'Range too long for {interval} buckets, use a larger interval')
+    return interval, start, end
+
+
+def _week_start(column):
+    if db.engine.dialect.name == 'postgresql':
+        return func.date_trunc('week', column)
+    return func.date(column, '-6 days', 'weekday 1')
+
+
+def time_series(interval, start, end):
+    grain, step = INTERVALS[interval]
+    first = datetime.combine(start, datetime.min.time())
+    stop = datetime.combine(end + timedelta(days=1), datetime.min.time())
+    bucket = _week_start(BookingRollup.bucket) if interval == 'week' else BookingRollup.bucket
+
+    grouped = select(
+        bucket.label('bucket'),
+        *(func.sum(getattr(BookingRollup, metric)).label(metric) for metric in METRICS)
+    ).where(
+        BookingRollup.grain == grain,
+        BookingRollup.bucket >= first,
+        BookingRollup.bucket < stop
+    ).group_by(bucket).subquery()
+    rows = db.session.execute(
+        select(grouped, func.sum(grouped.c.revenue).over(order_by=grouped.c.bucket).label('cumulative_revenue'))
+        .order_by(grouped.c.bucket)
+    ).all()
+    found = {_as_datetime(row.bucket): row for row in rows}
+
+    series, cumulative, current = [], 0.0, first
+    while current < stop:
+        row = found.get(current)
+        if row is not None:
+            cumulative = row.cumulative_revenue
+        series.append({
+            'bucket': current.isoformat(),
+            'bookings': row.bookings if row else 0,
+            'guests': row.guests if row else 0,
+            'revenue': round(row.revenue, 2) if row else 0.0,
+            'cancellations': row.cancellations if row else 0,
+            'cumulative_revenue': round(cumulative, 2)
+        })
+        current += step
+
+    totals = {metric: sum(point[metric] for point in series) for metric in METRICS}
+    totals['revenue'] = round(totals['revenue'], 2)
+    return {
+        'interval': interval,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'series': series,
+        'totals': totals
+    }
@@ -1,7 +1,11 @@
-from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
-from flask_bcrypt import Bcrypt
+from flask import Flask, request, jsonify, send_file, send_from_directory, abort, redirect
 from flask_cors import CORS
+from functools import wraps
+from dateutil.parser import parse
+import datetime
+import json
+import jwt
+import math
 import os
 from dotenv import load_dotenv
 
@@ -12,14 +16,68 @@ app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'digital-guides-secret-key-2024')
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///digital_guides.db').replace('postgres://', 'postgresql://')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Pool sized to the worker's concurrency (gunicorn_config.py), SQLite in WAL mode
+from database import engine_options, pool_stats
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+# Defaults to 'shared' when gunicorn runs several workers (cache.py)
+app.config['WEB_WORKERS'] = int(os.getenv('WEB_WORKERS', 1))
+app.config['RESPONSE_CACHE_BACKEND'] = os.getenv('RESPONSE_CACHE_BACKEND')
+app.config['RESPONSE_CACHE_TTL'] = int(os.getenv('RESPONSE_CACHE_TTL', 60))
+app.config['RESPONSE_CACHE_SIZE'] = int(os.getenv('RESPONSE_CACHE_SIZE', 1024))
+app.config['REDIS_URL'] = os.getenv('REDIS_URL')
+app.config['COMPRESS_MIN_SIZE'] = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+app.config['COMPRESS_LEVEL'] = int(os.getenv('COMPRESS_LEVEL', 6))
+app.config['COMPRESS_BROTLI_LEVEL'] = int(os.getenv('COMPRESS_BROTLI_LEVEL', 4))
+app.config['AUTH_CACHE_TTL'] = int(os.getenv('AUTH_CACHE_TTL', 60))
+app.config['AUTH_CACHE_SIZE'] = int(os.getenv('AUTH_CACHE_SIZE', 4096))
+app.config['BCRYPT_LOG_ROUNDS'] = int(os.getenv('BCRYPT_LOG_ROUNDS', 12))
+app.config['PASSWORD_HASH_WORKERS'] = int(os.getenv('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))
+app.config['PASSWORD_HASH_QUEUE'] = int(os.getenv('PASSWORD_HASH_QUEUE', 2 * (os.cpu_count() or 1)))
 
-# 2️⃣ Now initialize extensions
-db = SQLAlchemy(app)
-bcrypt = Bcrypt(app)
+# 2️⃣ Now initialize extensions (shared with models.py)
+from models import db, hasher
+db.init_app(app)
+hasher.init_app(app)
 CORS(app)
 
 # 3️⃣ Then import models
-from models import User, Experience, Booking, ExperienceDate, UserRole, BookingStatus
+from models import (
+    User, Experience, Booking, ExperienceDate, UploadJob, Review, UserRole, BookingStatus,
+    with_review_relations, reviews_to_dicts
+)
+from pagination import list_response, wants_ndjson, parse_limit, PaginationError
+from migrations import run_migrations
+from serializers import (
+    FastJSONProvider, user_rows, experience_date_rows, booking_rows,
+    experience_encoder, InvalidFields
+)
+from search import build_search_query, search_facets, InvalidSearchParameter
+from geo import distance_squared
+from cache import ResponseCache
+from compression import Compressor
+from auth import Authenticator
+from passwords import HashingBusy
+from uploads import UploadPipeline, InvalidUpload, UploadTooLarge
+from images import ImageVariants
+from booking_engine import reserve_slots, cancel_booking
+from jobs import enqueue, queue_stats, start_worker_thread
+from notifications import notify_guide
+from rollups import dashboard
+from analytics import parse_range, time_series, InvalidAnalyticsParameter
+import ratings  # keeps experience and guide rating aggregates in sync
+from availability import expand_schedule, bulk_upsert_dates, close_dates, InvalidSchedule
+from conditional import (
+    conditional, experiences_fingerprint, experience_fingerprint, availability_fingerprint
+)
+
+# orjson for every JSON body; listings are encoded from row tuples (serializers.py)
+app.json = FastJSONProvider(app)
+# gzip/brotli for JSON bodies; cached responses are stored already compressed
+compressor = Compressor(app)
+# Public catalog reads are cached; writes below invalidate the groups they touch
+response_cache = ResponseCache.from_config(app.config, compressor=compressor)
+# Verified tokens and user roles are cached; User updates evict their entry
+authenticator = Authenticator.from_config(app.config)
 
 
 # Cloudinary configuration
@@ -39,6 +97,24 @@ except ImportError:
     CLOUDINARY_AVAILABLE = False
     print("⚠️ Cloudinary not available")
 
+# Uploads are spooled and validated in the request, then stored in the background
+app.config['UPLOAD_STORAGE'] = os.getenv('UPLOAD_STORAGE', 'cloudinary' if CLOUDINARY_AVAILABLE else 'local')
+app.config['UPLOAD_MAX_BYTES'] = int(os.getenv('UPLOAD_MAX_BYTES', 10 * 1024 * 1024))
+app.config['UPLOAD_WORKERS'] = int(os.getenv('UPLOAD_WORKERS', 4))
+app.config['UPLOAD_LOCAL_DIR'] = os.getenv('UPLOAD_LOCAL_DIR')
+# Multipart overhead on top of the largest image; other bodies are tiny JSON
+app.config['MAX_CONTENT_LENGTH'] = app.config['UPLOAD_MAX_BYTES'] + 1024 * 1024
+upload_pipeline = UploadPipeline(app)
+
+# Thumbnail and card sized copies of every upload, for catalog listings
+app.config['IMAGE_CACHE_DIR'] = os.getenv('IMAGE_CACHE_DIR')
+app.config['IMAGE_CACHE_MAX_BYTES'] = int(os.getenv('IMAGE_CACHE_MAX_BYTES', 500 * 1024 * 1024))
+app.config['IMAGE_VARIANT_FORMATS'] = os.getenv('IMAGE_VARIANT_FORMATS', 'webp')
+image_variants = ImageVariants(app)
+upload_pipeline.variants = image_variants
+if upload_pipeline.local_root():
+    image_variants.local_sources['/api/uploads'] = upload_pipeline.local_root()
+
 
 # Authentication decorators
 def token_required(f):
@@ -50,8 +126,7 @@ def token_required(f):
         
         try:
             token = token.split(' ')[1]
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
-            current_user = User.query.get(data['user_id'])
+            current_user = authenticator.authenticate(token)
             if not current_user:
                 return jsonify({'message': 'User not found'}), 401
         except Exception as e:
@@ -72,6 +147,7 @@ def admin_required(f):
 # Initialize database
 def init_db():
     db.create_all()
+    run_migrations()
     
     admin = User.query.filter_by(email='admin@digitalguides.com').first()
     if not admin:
@@ -581,21 +657,13 @@ def create_sample_data():
     
     db.session.commit()
 
-    # Create available dates for all experiences
-    from datetime import date, time, timedelta
-    
-    for experience in Experience.query.all():
-        # Create available dates for the next 30 days
-        for i in range(1, 31):
-            exp_date = ExperienceDate(
-                experience_id=experience.id,
-                date=date.today() + timedelta(days=i),
-                start_time=time(8, 0),
-                available_slots=experience.max_group_size
-            )
-            db.session.add(exp_date)
-    
-    db.session.commit()
+    # Create available dates for the next 30 days in one bulk insert
+    schedule = expand_schedule({'days': 30, 'start_time': '08:00'})
+    bulk_upsert_dates(
+        (experience.id, day, start_time, experience.max_group_size)
+        for experience in Experience.query.all()
+        for day, start_time in schedule
+    )
     print(f"✅ Created {len(experiences_data)} sample experiences with availability dates")
 
 # Health check endpoint
@@ -605,69 +673,84 @@ def health_check():
         'status': 'healthy', 
         'message': 'Digital Guides API with Database is running',
         'database': 'Active',
+        'database_pool': pool_stats(db.engine),
         'cloudinary': CLOUDINARY_AVAILABLE,
+        'cache': response_cache.stats(),
+        'compression': compressor.stats(),
+        'auth': authenticator.stats(),
+        'password_hashing': hasher.stats(),
+        'jobs': queue_stats(),
         'timestamp': datetime.datetime.utcnow().isoformat()
     })
 
 # Advanced Search Endpoint
 @app.route('/api/experiences/search', methods=['GET'])
+@response_cache.cached('experiences', 'availability')
 def search_experiences():
     try:
-        # Get search parameters
-        category = request.args.get('category')
-        location = request.args.get('location')
-        min_price = request.args.get('min_price')
-        max_price = request.args.get('max_price')
-        search_date = request.args.get('date')
-        
-        # Start with base query
-        query = Experience.query.filter_by(is_approved=True, is_active=True)
-        
-        # Apply filters
-        if category:
-            query = query.filter(Experience.category.ilike(f'%{category}%'))
-        if location:
-            query = query.filter(Experience.location.ilike(f'%{location}%'))
-        if min_price:
-            query = query.filter(Experience.price_per_person >= float(min_price))
-        if max_price:
-            query = query.filter(Experience.price_per_person <= float(max_price))
-        
-        # Date availability filtering
-        if search_date:
-            try:
-                search_date = parse(search_date).date()
-                # Find experiences with available slots on this date
-                available_experiences = db.session.query(Experience).join(
-                    ExperienceDate
-                ).filter(
-                    ExperienceDate.date == search_date,
-                    ExperienceDate.available_slots > 0,
-                    ExperienceDate.is_available == True
-                ).all()
-                experience_ids = [exp.id for exp in available_experiences]
-                query = query.filter(Experience.id.in_(experience_ids))
-            except Exception as e:
-                return jsonify({'message': 'Invalid date format'}), 400
-        
-        experiences = query.all()
-        return jsonify({
-            'experiences': [exp.to_dict() for exp in experiences],
+        # Every filter combination compiles to a single statement
+        try:
+            query, params = build_search_query(request.args)
+            encoder = experience_encoder(request.args)
+        except (InvalidSearchParameter, InvalidFields) as e:
+            return jsonify({'message': str(e)}), 400
+        
+        # ?limit=&offset= return one sorted page; ?facets=true adds counts
+        try:
+            limit = parse_limit(request.args['limit']) if 'limit' in request.args else None
+            offset = request.args.get('offset', 0, type=int)
+            if offset < 0:
+                raise PaginationError('Invalid offset')
+        except PaginationError as e:
+            return jsonify({'message': str(e)}), 400
+        
+        query = encoder.select(query)
+        near = params.get('near')
+        if near is not None:
+            query = query.add_columns(distance_squared(*near[:2]).label('distance_squared'))
+        next_offset = None
+        if limit is None:
+            experiences = query.all()
+        else:
+            experiences = query.offset(offset).limit(limit + 1).all()
+            if len(experiences) > limit:
+                experiences = experiences[:limit]
+                next_offset = offset + limit
+        
+        results = encoder(experiences)
+        if near is not None:
+            for item, row in zip(results, experiences):
+                item['distance_km'] = round(math.sqrt(row.distance_squared), 1)
+        
+        result = {
+            'experiences': results,
             'count': len(experiences),
             'filters_applied': {
-                'category': category,
-                'location': location,
-                'min_price': min_price,
-                'max_price': max_price,
-                'date': search_date
+                'q': request.args.get('q'),
+                'category': request.args.get('category'),
+                'location': request.args.get('location'),
+                'min_price': request.args.get('min_price'),
+                'max_price': request.args.get('max_price'),
+                'date': params.get('date'),
+                'lat': near[0] if near else None,
+                'lng': near[1] if near else None,
+                'radius_km': near[2] if near else None,
+                'sort': params.get('sort')
             }
-        })
+        }
+        if limit is not None:
+            result['next_offset'] = next_offset
+        if request.args.get('facets') == 'true':
+            result['facets'] = search_facets(request.args)
+        return jsonify(result)
         
     except Exception as e:
         return jsonify({'message': 'Search failed', 'error': str(e)}), 500
 
 # Calendar Availability Endpoint
 @app.route('/api/experiences/<int:experience_id>/availability', methods=['GET'])
+@conditional(availability_fingerprint)
+@response_cache.cached('availability:{experience_id}')
 def get_availability(experience_id):
     try:
         start_date = request.args.get('start_date')
@@ -683,50 +766,146 @@ def get_availability(experience_id):
         if end_date:
             query = query.filter(ExperienceDate.date <= parse(end_date).date())
         
-        available_dates = query.all()
+        available_dates = experience_date_rows.select(query).all()
         return jsonify({
             'experience_id': experience_id,
-            'available_dates': [date.to_dict() for date in available_dates],
+            'available_dates': experience_date_rows(available_dates),
             'count': len(available_dates)
         })
         
     except Exception as e:
         return jsonify({'message': 'Failed to fetch availability', 'error': str(e)}), 500
 
+# Calendar publishing endpoints
+@app.route('/api/experiences/<int:experience_id>/calendar', methods=['POST'])
+@token_required
+def publish_calendar(current_user, experience_id):
+    try:
+        experience = Experience.query.get(experience_id)
+        if not experience:
+            return jsonify({'message': 'Experience not found'}), 404
+        if experience.guide_id != current_user.id and current_user.role != UserRole.ADMIN:
+            return jsonify({'message': 'Access denied'}), 403
+        
+        data = request.get_json() or {}
+        try:
+            occurrences = expand_schedule(data)
+        except InvalidSchedule as e:
+            return jsonify({'message': str(e)}), 400
+        
+        slots = data.get('slots', experience.max_group_size)
+        if not isinstance(slots, int) or slots < 1:
+            return jsonify({'message': 'Invalid number of slots'}), 400
+        
+        # Existing dates are left alone, so re-publishing is idempotent
+        created = bulk_upsert_dates(
+            (experience.id, day, start_time, slots) for day, start_time in occurrences
+        )
+        response_cache.invalidate('availability', f'availability:{experience.id}')
+        
+        return jsonify({
+            'message': 'Calendar published successfully',
+            'experience_id': experience.id,
+            'requested': len(occurrences),
+            'created': created,
+            'existing': len(occurrences) - created
+        }), 201
+        
+    except Exception as e:
+        return jsonify({'message': 'Failed to publish calendar', 'error': str(e)}), 500
+
+@app.route('/api/experiences/<int:experience_id>/calendar', methods=['DELETE'])
+@token_required
+def close_calendar(current_user, experience_id):
+    try:
+        experience = Experience.query.get(experience_id)
+        if not experience:
+            return jsonify({'message': 'Experience not found'}), 404
+        if experience.guide_id != current_user.id and current_user.role != UserRole.ADMIN:
+            return jsonify({'message': 'Access denied'}), 403
+        
+        try:
+            start_date = parse(request.args['start_date']).date()
+            end_date = parse(request.args.get('end_date', request.args['start_date'])).date()
+        except (KeyError, ValueError, OverflowError):
+            return jsonify({'message': 'start_date is required (end_date optional)'}), 400
+        
+        closed = close_dates(experience.id, start_date, end_date)
+        response_cache.invalidate('availability', f'availability:{experience.id}')
+        
+        return jsonify({
+            'message': 'Dates closed successfully',
+            'experience_id': experience.id,
+            'closed': closed
+        })
+        
+    except Exception as e:
+        return jsonify({'message': 'Failed to close dates', 'error': str(e)}), 500
+
 # Image Upload Endpoint
 @app.route('/api/upload', methods=['POST'])
 @token_required
 def upload_image(current_user):
     try:
-        if 'image' not in request.files:
-            return jsonify({'message': 'No image provided'}), 400
-        
-        file = request.files['image']
-        if file.filename == '':
-            return jsonify({'message': 'No image selected'}), 400
-        
-        if CLOUDINARY_AVAILABLE:
-            # Upload to Cloudinary
-            upload_result = cloudinary.uploader.upload(
-                file,
-                folder="digital-guides/",
-                use_filename=True,
-                unique_filename=True,
-                overwrite=False
+        if request.mimetype == 'multipart/form-data':
+            if 'image' not in request.files:
+                return jsonify({'message': 'No image provided'}), 400
+            file = request.files['image']
+            if file.filename == '':
+                return jsonify({'message': 'No image selected'}), 400
+            job = upload_pipeline.submit(current_user.id, file.stream, file.filename)
+        elif request.mimetype.startswith('image/'):
+            # Raw body upload: streamed straight to the spool file
+            job = upload_pipeline.submit(
+                current_user.id, request.stream, request.args.get('filename', ''), request.content_length
             )
-            image_url = upload_result['secure_url']
         else:
-            # Fallback: Simulate upload (return placeholder)
-            image_url = "https://via.placeholder.com/600x400/007bff/ffffff?text=Uploaded+Image"
+            return jsonify({'message': 'No image provided'}), 400
         
         return jsonify({
-            'url': image_url,
-            'message': 'Image uploaded successfully'
-        })
+            **job.to_dict(),
+            'status_url': f'/api/upload/{job.id}',
+            'message': 'Upload accepted'
+        }), 202
         
+    except UploadTooLarge as e:
+        return jsonify({'message': str(e)}), 413
+    except InvalidUpload as e:
+        return jsonify({'message': str(e)}), 400
     except Exception as e:
         return jsonify({'message': 'Upload failed', 'error': str(e)}), 500
 
+@app.route('/api/upload/<job_id>', methods=['GET'])
+@token_required
+def get_upload(current_user, job_id):
+    job = db.session.get(UploadJob, job_id)
+    if not job or (job.user_id != current_user.id and current_user.role != UserRole.ADMIN):
+        return jsonify({'message': 'Upload not found'}), 404
+    if upload_pipeline.is_stale(job):
+        upload_pipeline.recover([job])
+    return jsonify(job.to_dict())
+
+@app.route('/api/images/<name>', methods=['GET'])
+def serve_image_variant(name):
+    path = image_variants.path(name)
+    if path is None:
+        # Evicted and not rebuildable right now: the original still shows
+        source_url = image_variants.source_url(name)
+        if source_url is None:
+            abort(404)
+        return redirect(source_url)
+    # Names are content hashes, so a URL never changes meaning
+    response = send_file(path, max_age=365 * 24 * 3600)
+    response.cache_control.immutable = True
+    return response
+
+@app.route('/api/uploads/<path:filename>', methods=['GET'])
+def serve_upload(filename):
+    root = upload_pipeline.local_root()
+    if root is None:
+        abort(404)
+    return send_from_directory(root, filename, max_age=365 * 24 * 3600)
+
 # Contact guide endpoint
 @app.route('/api/contact/guide', methods=['POST'])
 @token_required
@@ -743,9 +922,9 @@ def contact_guide(current_user):
         if not guide or guide.role != UserRole.GUIDE:
             return jsonify({'message': 'Guide not found'}), 404
         
-        # In a real app, you would send an email or notification here
-        # For now, we'll just log the message
-        print(f"Message from {current_user.email} to guide {guide.email}: {message}")
+        # Delivered by the job worker, batched into one digest per guide
+        notify_guide(guide.id, f"Message from {current_user.email}:\n{message}")
+        db.session.commit()
         
         return jsonify({
             'message': 'Message sent to guide successfully',
@@ -770,13 +949,19 @@ def delete_booking(current_user, booking_id):
         if booking.traveler_id != current_user.id and current_user.role != UserRole.ADMIN:
             return jsonify({'message': 'Access denied'}), 403
         
-        # Restore available slots
-        experience_date = ExperienceDate.query.get(booking.experience_date_id)
-        if experience_date:
-            experience_date.available_slots += booking.number_of_guests
-        
-        db.session.delete(booking)
-        db.session.commit()
+        # Delete and restore slots atomically; a concurrent cancel loses.
+        # The notification is queued in the same transaction.
+        experience_id = booking.experience_id
+        enqueue('booking_cancellation', {
+            'booking_id': booking.id,
+            'traveler_id': booking.traveler_id,
+            'experience_id': booking.experience_id,
+            'experience_date_id': booking.experience_date_id,
+            'number_of_guests': booking.number_of_guests
+        })
+        if not cancel_booking(booking):
+            return jsonify({'message': 'Booking not found'}), 404
+        response_cache.invalidate('availability', f'availability:{experience_id}')
         
         return jsonify({
             'message': 'Booking cancelled successfully',
@@ -788,18 +973,26 @@ def delete_booking(current_user, booking_id):
 
 # Experiences endpoint
 @app.route('/api/experiences', methods=['GET'])
+@conditional(experiences_fingerprint)
+@response_cache.cached('experiences', bypass=wants_ndjson)
 def get_experiences():
     try:
-        experiences = Experience.query.filter_by(is_approved=True, is_active=True).all()
-        return jsonify({
-            'experiences': [exp.to_dict() for exp in experiences],
-            'count': len(experiences)
-        })
+        # ?view=summary or ?fields= select only the listed columns (serializers.py)
+        try:
+            encoder = experience_encoder(request.args)
+        except InvalidFields as e:
+            return jsonify({'message': str(e)}), 400
+        query = encoder.select(
+            Experience.query.filter_by(is_approved=True, is_active=True)
+        )
+        return list_response(query, Experience.id, encoder, 'experiences')
     except Exception as e:
         return jsonify({'message': 'Failed to fetch experiences', 'error': str(e)}), 500
 
 # Get single experience
 @app.route('/api/experiences/<int:experience_id>', methods=['GET'])
+@conditional(experience_fingerprint)
+@response_cache.cached('experience:{experience_id}')
 def get_experience(experience_id):
     try:
         experience = Experience.query.get(experience_id)
@@ -813,6 +1006,11 @@ def get_experience(experience_id):
         return jsonify({'message': 'Failed to fetch experience', 'error': str(e)}), 500
 
 # Auth endpoints
+def password_hashing_busy():
+    response = jsonify({'message': 'Too many sign-ins right now, please retry shortly'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
 @app.route('/api/auth/register', methods=['POST'])
 def register():
     try:
@@ -854,6 +1052,8 @@ def register():
             'message': 'User registered successfully'
         }), 201
         
+    except HashingBusy:
+        return password_hashing_busy()
     except Exception as e:
         return jsonify({'message': 'Registration failed', 'error': str(e)}), 500
 
@@ -868,6 +1068,14 @@ def login():
         if not user or not user.check_password(data['password']):
             return jsonify({'message': 'Invalid credentials'}), 401
         
+        # Upgrade the stored hash after a BCRYPT_LOG_ROUNDS change
+        if user.password_needs_rehash():
+            try:
+                user.set_password(data['password'])
+                db.session.commit()
+            except HashingBusy:
+                pass  # keep the old hash, try again on a later login
+        
         # Generate token
         token = jwt.encode({
             'user_id': user.id,
@@ -882,6 +1090,8 @@ def login():
             'message': 'Login successful'
         })
         
+    except HashingBusy:
+        return password_hashing_busy()
     except Exception as e:
         return jsonify({'message': 'Login failed', 'error': str(e)}), 500
 
@@ -892,12 +1102,33 @@ def get_my_experiences(current_user):
     if current_user.role != UserRole.GUIDE:
         return jsonify({'message': 'Only guides can access this endpoint'}), 403
     
-    guide_experiences = Experience.query.filter_by(guide_id=current_user.id).all()
+    try:
+        encoder = experience_encoder(request.args)
+    except InvalidFields as e:
+        return jsonify({'message': str(e)}), 400
+    
+    guide_experiences = encoder.select(
+        Experience.query.filter_by(guide_id=current_user.id)
+    ).order_by(Experience.id).all()
     return jsonify({
-        'experiences': [exp.to_dict() for exp in guide_experiences],
+        'experiences': encoder(guide_experiences),
         'count': len(guide_experiences)
     })
 
+def upload_variants(cover_image, images):
+    """JSON of the resized variants recorded for uploaded images, if any"""
+    if isinstance(images, str):
+        try:
+            images = json.loads(images)
+        except ValueError:
+            images = []
+    urls = [url for url in [cover_image, *(images or [])] if isinstance(url, str) and url]
+    if not urls:
+        return None
+    jobs = UploadJob.query.filter(UploadJob.url.in_(urls), UploadJob.variants.isnot(None)).all()
+    variants = {job.url: json.loads(job.variants) for job in jobs}
+    return json.dumps(variants) if variants else None
+
 @app.route('/api/experiences', methods=['POST'])
 @token_required
 def create_experience(current_user):
@@ -916,6 +1147,9 @@ def create_experience(current_user):
             short_description=data.get('short_description', ''),
             category=data['category'],
             location=data['location'],
+            # Looked up from the location when not given (geo.py)
+            latitude=data.get('latitude'),
+            longitude=data.get('longitude'),
             duration_hours=data['duration_hours'],
             max_group_size=data.get('max_group_size', 10),
             price_per_person=data['price_per_person'],
@@ -925,11 +1159,13 @@ def create_experience(current_user):
             requirements=data.get('requirements', ''),
             cover_image=data.get('cover_image', ''),
             images=data.get('images', '[]'),
+            image_variants=upload_variants(data.get('cover_image'), data.get('images')),
             is_approved=True  # Auto-approve for demo
         )
         
         db.session.add(experience)
         db.session.commit()
+        response_cache.invalidate('experiences')
         
         return jsonify({
             'experience': experience.to_dict(),
@@ -952,33 +1188,38 @@ def create_booking(current_user):
         if not experience:
             return jsonify({'message': 'Experience not found'}), 404
         
-        experience_date = ExperienceDate.query.get(data['experience_date_id'])
-        if not experience_date or experience_date.experience_id != experience.id:
-            return jsonify({'message': 'Invalid date selection'}), 400
+        guests = data['number_of_guests']
+        if not isinstance(guests, int) or guests < 1:
+            return jsonify({'message': 'Invalid number of guests'}), 400
         
-        if experience_date.available_slots < data['number_of_guests']:
+        # Conditional decrement: only succeeds while enough slots remain
+        if not reserve_slots(data['experience_date_id'], experience.id, guests):
+            db.session.rollback()
+            experience_date = ExperienceDate.query.get(data['experience_date_id'])
+            if not experience_date or experience_date.experience_id != experience.id:
+                return jsonify({'message': 'Invalid date selection'}), 400
             return jsonify({'message': 'Not enough available slots'}), 400
         
         # Calculate total price
-        total_price = experience.price_per_person * data['number_of_guests']
+        total_price = experience.price_per_person * guests
         
         # Create booking
         booking = Booking(
             traveler_id=current_user.id,
             experience_id=data['experience_id'],
             experience_date_id=data['experience_date_id'],
-            number_of_guests=data['number_of_guests'],
+            number_of_guests=guests,
             total_price=total_price,
             special_requests=data.get('special_requests', ''),
             status=BookingStatus.CONFIRMED,
             is_paid=True  # Auto-pay for demo
         )
         
-        # Update available slots
-        experience_date.available_slots -= data['number_of_guests']
-        
         db.session.add(booking)
+        db.session.flush()
+        enqueue('booking_confirmation', {'booking_id': booking.id})
         db.session.commit()
+        response_cache.invalidate('availability', f'availability:{experience.id}')
         
         return jsonify({
             'booking': booking.to_dict(),
@@ -992,24 +1233,103 @@ def create_booking(current_user):
 @token_required
 def get_my_bookings(current_user):
     try:
-        user_bookings = Booking.query.filter_by(traveler_id=current_user.id).all()
+        query = booking_rows.select(
+            Booking.query.filter_by(traveler_id=current_user.id)
+        )
+        return list_response(query, Booking.id, booking_rows, 'bookings')
+    except Exception as e:
+        return jsonify({'message': 'Failed to fetch bookings', 'error': str(e)}), 500
+
+# Reviews endpoints
+def invalidate_guide_listings(guide_id):
+    """Ratings appear in every listing of the guide's experiences"""
+    experience_ids = [row.id for row in db.session.query(Experience.id).filter_by(guide_id=guide_id)]
+    response_cache.invalidate('experiences', *[f'experience:{id}' for id in experience_ids])
+
+@app.route('/api/reviews', methods=['POST'])
+@token_required
+def create_review(current_user):
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'message': 'No data provided'}), 400
+        
+        rating = data.get('rating')
+        if not isinstance(rating, int) or not 1 <= rating <= 5:
+            return jsonify({'message': 'Rating must be a whole number from 1 to 5'}), 400
+        
+        experience = Experience.query.get(data.get('experience_id'))
+        if not experience:
+            return jsonify({'message': 'Experience not found'}), 404
+        
+        booked = db.session.query(Booking.id).filter_by(
+            traveler_id=current_user.id, experience_id=experience.id
+        ).first()
+        if not booked:
+            return jsonify({'message': 'Only travelers who booked this experience can review it'}), 403
+        
+        if Review.query.filter_by(experience_id=experience.id, user_id=current_user.id).first():
+            return jsonify({'message': 'You have already reviewed this experience'}), 400
+        
+        # Inserting the review updates the rating aggregates (ratings.py)
+        review = Review(
+            experience_id=experience.id,
+            user_id=current_user.id,
+            booking_id=booked.id,
+            rating=rating,
+            comment=data.get('comment', '')
+        )
+        db.session.add(review)
+        db.session.commit()
+        invalidate_guide_listings(experience.guide_id)
+        
+        return jsonify({
+            'review': review.to_dict(),
+            'message': 'Review created successfully'
+        }), 201
+        
+    except Exception as e:
+        return jsonify({'message': 'Failed to create review', 'error': str(e)}), 500
+
+@app.route('/api/experiences/<int:experience_id>/reviews', methods=['GET'])
+def get_experience_reviews(experience_id):
+    try:
+        query = with_review_relations(Review.query.filter_by(experience_id=experience_id))
+        return list_response(query, Review.id, reviews_to_dicts, 'reviews')
+    except Exception as e:
+        return jsonify({'message': 'Failed to fetch reviews', 'error': str(e)}), 500
+
+@app.route('/api/reviews/<int:review_id>', methods=['DELETE'])
+@token_required
+def delete_review(current_user, review_id):
+    try:
+        review = Review.query.get(review_id)
+        if not review:
+            return jsonify({'message': 'Review not found'}), 404
+        
+        if review.user_id != current_user.id and current_user.role != UserRole.ADMIN:
+            return jsonify({'message': 'Access denied'}), 403
+        
+        guide_id = db.session.query(Experience.guide_id).filter_by(id=review.experience_id).scalar()
+        db.session.delete(review)
+        db.session.commit()
+        invalidate_guide_listings(guide_id)
+        
         return jsonify({
-            'bookings': [booking.to_dict() for booking in user_bookings],
-            'count': len(user_bookings)
+            'message': 'Review deleted successfully',
+            'review_id': review_id
         })
+        
     except Exception as e:
-        return jsonify({'message': 'Failed to fetch bookings', 'error': str(e)}), 500
+        return jsonify({'message': 'Failed to delete review', 'error': str(e)}), 500
 
 # Admin endpoints
 @app.route('/api/admin/bookings', methods=['GET'])
 @admin_required
 def get_all_bookings(current_user):
     try:
-        bookings = Booking.query.all()
-        return jsonify({
-            'bookings': [booking.to_dict() for booking in bookings],
-            'count': len(bookings)
-        })
+        query = booking_rows.select(Booking.query)
+        return list_response(query, Booking.id, booking_rows, 'bookings')
     except Exception as e:
         return jsonify({'message': 'Failed to fetch bookings', 'error': str(e)}), 500
 
@@ -1017,11 +1337,7 @@ def get_all_bookings(current_user):
 @admin_required
 def get_all_users(current_user):
     try:
-        users = User.query.all()
-        return jsonify({
-            'users': [user.to_dict() for user in users],
-            'count': len(users)
-        })
+        return list_response(user_rows.select(User.query), User.id, user_rows, 'users')
     except Exception as e:
         return jsonify({'message': 'Failed to fetch users', 'error': str(e)}), 500
 
@@ -1029,21 +1345,27 @@ def get_all_users(current_user):
 @admin_required
 def get_statistics(current_user):
     try:
-        total_users = User.query.count()
-        total_bookings = Booking.query.count()
-        total_experiences = Experience.query.count()
-        total_revenue = db.session.query(db.func.sum(Booking.total_price)).scalar() or 0
-        
-        return jsonify({
-            'total_users': total_users,
-            'total_bookings': total_bookings,
-            'total_experiences': total_experiences,
-            'total_revenue': float(total_revenue),
-            'timestamp': datetime.datetime.utcnow().isoformat()
-        })
+        # Counters maintained on every write (rollups.py), not table scans
+        days = min(max(request.args.get('days', 30, type=int), 1), 366)
+        statistics = dashboard(days=days)
+        statistics['timestamp'] = datetime.datetime.utcnow().isoformat()
+        return jsonify(statistics)
     except Exception as e:
         return jsonify({'message': 'Failed to fetch statistics', 'error': str(e)}), 500
 
+@app.route('/api/admin/analytics', methods=['GET'])
+@admin_required
+def get_analytics(current_user):
+    try:
+        # Bucketed series over the hourly/daily rollups (analytics.py)
+        try:
+            interval, start, end = parse_range(request.args)
+        except InvalidAnalyticsParameter as e:
+            return jsonify({'message': str(e)}), 400
+        return jsonify(time_series(interval, start, end))
+    except Exception as e:
+        return jsonify({'message': 'Failed to fetch analytics', 'error': str(e)}), 500
+
 @app.route('/')
 def index():
     return jsonify({
@@ -1072,5 +1394,10 @@ if __name__ == '__main__':
 
     with app.app_context():
         init_db()
+        upload_pipeline.recover()
+
+    # Production runs `python worker.py` as a separate worker (Procfile)
+    if os.getenv('JOBS_INLINE_WORKER', 'true').lower() == 'true':
+        start_worker_thread(app)
 
     app.run(debug=True, host='0.0.0.0', port=port)
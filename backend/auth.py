@@ -0,0 +1,102 @@
+"""Request authentication.
+
+Tokens are HS256 JWTs carrying user_id (plus email and role). Verifying the
+signature and loading the user used to cost a jwt.decode and a SELECT on
+every authenticated request. Both are now cached per worker:
+
+- verified claims are kept per token until the token's own expiry, so a
+  client reusing its token skips signature checks;
+- the (email, role) of each user is kept in a small TTL cache. Views get an
+  AuthenticatedUser built from it, so role checks never touch the database.
+
+Any update or delete of a User row evicts its cache entry, so role changes
+take effect on the next request in this worker and within the TTL elsewhere.
+"""
+import time
+import jwt
+from sqlalchemy import event
+
+from cache import LocalBackend
+from models import db, User
+
+
+class AuthenticatedUser:
+    """The parts of a User that authorization needs, without a session"""
+    __slots__ = ('id', 'email', 'role')
+
+    def __init__(self, id, email, role):
+        self.id = id
+        self.email = email
+        self.role = role
+
+    def load(self):
+        """The full User row, for views that need more than id/email/role"""
+        return db.session.get(User, self.id)
+
+    def __repr__(self):
+        return f'<AuthenticatedUser {self.id} {self.role.value}>'
+
+
+class Authenticator:
+    def __init__(self, secret_key, ttl=60, max_entries=4096):
+        self.secret_key = secret_key
+        self.ttl = ttl
+        self.tokens = LocalBackend(max_entries) if ttl > 0 else None
+        self.users = LocalBackend(max_entries) if ttl > 0 else None
+        self.user_lookups = 0
+        event.listen(User, 'after_update', self._evict)
+        event.listen(User, 'after_delete', self._evict)
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            config['SECRET_KEY'],
+            ttl=int(config.get('AUTH_CACHE_TTL', 60)),
+            max_entries=int(config.get('AUTH_CACHE_SIZE', 4096))
+        )
+
+    def verify(self, token):
+        """Return the token's claims. Raises jwt.InvalidTokenError."""
+        claims = self.tokens.get(token) if self.tokens is not None else None
+        if claims is not None and claims.get('exp', float('inf')) > time.time():
+            return claims
+        claims = jwt.decode(token, self.secret_key, algorithms=['HS256'])
+        if self.tokens is not None:
+            ttl = claims['exp'] - time.time() if 'exp' in claims else self.ttl
+            self.tokens.set(token, claims, ttl)
+        return claims
+
+    def user(self, user_id):
+        """AuthenticatedUser for `user_id`, or None if the account is gone"""
+        record = self.users.get(user_id) if self.users is not None else None
+        if record is None:
+            self.user_lookups += 1
+            row = db.session.query(User.email, User.role).filter_by(id=user_id).first()
+            if row is None:
+                return None
+            record = tuple(row)
+            if self.users is not None:
+                self.users.set(user_id, record, self.ttl)
+        return AuthenticatedUser(user_id, *record)
+
+    def authenticate(self, token):
+        # Only user_id is taken from the token. Its email/role claims were
+        # frozen at login, so a demoted or deleted user would keep their old
+        # role until the token expired; the cached row is evicted on update
+        # instead, and costs a SELECT at most once per user per TTL.
+        return self.user(self.verify(token)['user_id'])
+
+    def invalidate(self, user_id):
+        if self.users is not None:
+            self.users.delete(user_id)
+
+    def _evict(self, mapper, connection, target):
+        self.invalidate(target.id)
+
+    def stats(self):
+        return {
+            'ttl': self.ttl,
+            'cached_tokens': len(self.tokens) if self.tokens is not None else 0,
+            'cached_users': len(self.users) if self.users is not None else 0,
+            'user_lookups': self.user_lookups
+        }
@@ -0,0 +1,195 @@
+"""Bulk calendar publishing for experience dates.
+
+Schedules are recurrence rules expanded with dateutil.rrule. The resulting
+rows go to the database through one bulk statement per batch, with
+ON CONFLICT DO NOTHING against the unique (experience_id, date, start_time)
+index, so publishing the same schedule twice is a no-op and existing dates
+(and the bookings against them) are never touched.
+"""
+import csv
+import io
+from itertools import islice
+from datetime import date, datetime, timedelta
+from dateutil.parser import parse
+from dateutil.rrule import rrule, rrulestr, DAILY, WEEKLY, MO, TU, WE, TH, FR, SA, SU
+
+from sqlalchemy import update
+
+from models import db, ExperienceDate
+
+WEEKDAYS = {'mon': MO, 'tue': TU, 'wed': WE, 'thu': TH, 'fri': FR, 'sat': SA, 'sun': SU}
+FREQUENCIES = {'daily': DAILY, 'weekly': WEEKLY}
+MAX_DAYS = 730
+# Sub-daily rules (FREQ=HOURLY...) repeat each day; scan at most this many occurrences
+MAX_OCCURRENCES = MAX_DAYS * 96
+BATCH_SIZE = 50000
+COLUMNS = ['experience_id', 'date', 'start_time', 'available_slots', 'is_available', 'updated_at']
+
+
+class InvalidSchedule(ValueError):
+    pass
+
+
+def _weekdays(names):
+    try:
+        return [WEEKDAYS[name.lower()[:3]] for name in names]
+    except (KeyError, AttributeError):
+        raise InvalidSchedule('Unknown weekday')
+
+
+def expand_schedule(spec):
+    """Expand a schedule into sorted (date, start_time) pairs.
+
+    `spec` is either {'rrule': 'FREQ=DAILY;COUNT=180;BYDAY=TU,WE'} or:
+        start_date     first day (default tomorrow)
+        days/end_date  how far to publish (default 30 days)
+        frequency      'daily' (default) or 'weekly'
+        weekdays       only these days, e.g. ['sat', 'sun']
+        skip_weekdays  never these days, e.g. ['mon']
+        exclude_dates  individual days to leave out
+        start_times    ['08:00', '14:00'] (or a single 'start_time')
+    """
+    for key in ('weekdays', 'skip_weekdays', 'exclude_dates', 'start_times'):
+        if spec.get(key) is not None and not isinstance(spec[key], list):
+            raise InvalidSchedule(f'{key} must be a list')
+    try:
+        start_times = spec.get('start_times') or [spec.get('start_time', '08:00')]
+        start_times = sorted({parse(value).time() for value in start_times})
+        start = parse(spec['start_date']).date() if spec.get('start_date') else date.today() + timedelta(days=1)
+
+        if spec.get('rrule'):
+            occurrences = rrulestr(spec['rrule'], dtstart=datetime.combine(start, datetime.min.time()))
+            days = list(islice(dict.fromkeys(d.date() for d in islice(occurrences, MAX_OCCURRENCES)), MAX_DAYS))
+        else:
+            if spec.get('end_date'):
+                end = parse(spec['end_date']).date()
+            else:
+                end = start + timedelta(days=int(spec.get('days', 30)) - 1)
+            if end < start or (end - start).days >= MAX_DAYS:
+                raise InvalidSchedule(f'Schedules must cover 1 to {MAX_DAYS} days')
+
+            frequency = FREQUENCIES.get(spec.get('frequency', 'daily'))
+            if frequency is None:
+                raise InvalidSchedule('frequency must be daily or weekly')
+            byweekday = _weekdays(spec['weekdays']) if spec.get('weekdays') else None
+            if frequency == WEEKLY and byweekday is None:
+                byweekday = [WEEKDAYS[start.strftime('%a').lower()]]
+            days = [d.date() for d in rrule(frequency, dtstart=start, until=end, byweekday=byweekday)]
+    except InvalidSchedule:
+        raise
+    except (ValueError, TypeError, OverflowError) as e:
+        raise InvalidSchedule(f'Invalid schedule: {e}')
+
+    skipped = {day.weekday for day in _weekdays(spec.get('skip_weekdays') or [])}
+    excluded = set()
+    for value in spec.get('exclude_dates') or []:
+        try:
+            excluded.add(parse(value).date())
+        except (ValueError, TypeError, OverflowError):
+            raise InvalidSchedule('Invalid exclude_dates entry')
+
+    return [
+        (day, start_time)
+        for day in days if day.weekday() not in skipped and day not in excluded
+        for start_time in start_times
+    ]
+
+
+def bulk_upsert_dates(rows):
+    """Insert (experience_id, date, start_time, slots) rows that don't exist yet.
+
+    Returns the number of rows created. Commits.
+    """
+    engine = db.engine
+    processors = _bind_processors(engine.dialect)
+    now = datetime.utcnow()
+    created = 0
+    batch = []
+    for experience_id, day, start_time, slots in rows:
+        batch.append(_process((experience_id, day, start_time, slots, True, now), processors))
+        if len(batch) == BATCH_SIZE:
+            created += _flush(batch)
+            batch = []
+    if batch:
+        created += _flush(batch)
+    db.session.commit()
+    return created
+
+
+def _bind_processors(dialect):
+    """Per-column bind processors, memoized by value.
+
+    Calendars repeat the same handful of dates and times across every
+    experience, so each distinct value is only converted once.
+    """
+    table = ExperienceDate.__table__
+    processors = []
+    for name in COLUMNS:
+        proc = table.c[name].type.dialect_impl(dialect).bind_processor(dialect)
+        processors.append(_memoized(proc) if proc else None)
+    return processors
+
+def _memoized(proc):
+    seen = {}
+    def process(value):
+        try:
+            return seen[value]
+        except KeyError:
+            seen[value] = result = proc(value)
+            return result
+    return process
+
+def _process(values, processors):
+    return tuple(proc(value) if proc else value for value, proc in zip(values, processors))
+
+def _flush(batch):
+    connection = db.session.connection()
+    if connection.dialect.name == 'postgresql':
+        return _copy_upsert(connection, batch)
+    placeholders = ', '.join(['?'] * len(COLUMNS))
+    result = connection.exec_driver_sql(
+        f"INSERT INTO experience_dates ({', '.join(COLUMNS)}) VALUES ({placeholders}) "
+        f"ON CONFLICT (experience_id, date, start_time) DO NOTHING",
+        batch
+    )
+    return result.rowcount
+
+def _copy_upsert(connection, batch):
+    """COPY the batch into a temp table, then insert the rows that are new"""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(batch)
+    buffer.seek(0)
+    cursor = connection.connection.cursor()
+    cursor.execute(
+        "CREATE TEMP TABLE IF NOT EXISTS experience_dates_staging ("
+        "experience_id integer, date date, start_time time, available_slots integer, "
+        "is_available boolean, updated_at timestamp) ON COMMIT DELETE ROWS"
+    )
+    cursor.copy_expert(
+        f"COPY experience_dates_staging ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer
+    )
+    cursor.execute(
+        f"INSERT INTO experience_dates ({', '.join(COLUMNS)}) "
+        f"SELECT {', '.join(COLUMNS)} FROM experience_dates_staging "
+        f"ON CONFLICT (experience_id, date, start_time) DO NOTHING"
+    )
+    created = cursor.rowcount
+    cursor.execute("TRUNCATE experience_dates_staging")
+    return created
+
+
+def close_dates(experience_id, start, end):
+    """Stop selling a date range. Rows stay so existing bookings keep their date."""
+    result = db.session.execute(
+        update(ExperienceDate)
+        .where(
+            ExperienceDate.experience_id == experience_id,
+            ExperienceDate.date >= start,
+            ExperienceDate.date <= end,
+            ExperienceDate.is_available == True
+        )
+        .values(is_available=False)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount
@@ -0,0 +1,1086 @@
+"""Performance checks for the Digital Guides API.
+
+Runs against a throwaway SQLite database (or DATABASE_URL if set) filled
+with synthetic data. Usage:
+
+    python benchmark.py                 # run every benchmark
+    python benchmark.py serialization   # run a single benchmark
+"""
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+if 'DATABASE_URL' not in os.environ:
+    _tmp_dir = tempfile.mkdtemp(prefix='digital-guides-bench-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_tmp_dir, 'bench.db')}"
+
+from datetime import date, datetime, time as dtime, timedelta
+from sqlalchemy import event, text
+
+from app import app, db
+from migrations import run_migrations, rollback_migration
+from models import (
+    User, Experience, ExperienceDate, Booking, UserRole, BookingStatus,
+    with_booking_relations, with_experience_relations, bookings_to_dicts, experiences_to_dicts
+)
+
+CATEGORIES = ['Wildlife Safari', 'Cultural Tour', 'Adventure', 'Food Tour', 'Hiking', 'Conservation']
+LOCATIONS = ['Maasai Mara', 'Lamu', 'Mount Kenya', 'Nairobi', 'Samburu', 'Amboseli', 'Diani Beach']
+WORDS = [
+    'wildlife', 'migration', 'elephant', 'lion', 'leopard', 'rhino', 'flamingo', 'sunrise', 'sunset',
+    'village', 'market', 'spice', 'coffee', 'coral', 'snorkeling', 'dhow', 'forest', 'waterfall',
+    'summit', 'crater', 'lake', 'river', 'canoe', 'cycling', 'photography', 'birding', 'culture',
+    'cuisine', 'history', 'museum', 'beach', 'island', 'camping', 'stargazing', 'hiking', 'trek'
+]
+# Shrink the large datasets for quick runs, e.g. BENCH_SCALE=0.01
+SCALE = float(os.environ.get('BENCH_SCALE', '1'))
+# Placeholder bcrypt hash so seeding does not pay for hashing
+PASSWORD_HASH = '$2b$12$KIXQJYzS4bG3g6m1sI1bNe9uYt5m0W6y2m7yqZ1m8n1i4Gk2cH1yO'
+
+
+@contextmanager
+def count_queries():
+    """Count SQL statements executed inside the block"""
+    counter = {'queries': 0}
+
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        counter['queries'] += 1
+
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', _count)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', _count)
+
+
+@contextmanager
+def timed(label):
+    start = time.perf_counter()
+    yield
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"   {label}: {elapsed:.1f} ms")
+
+
+def scaled(n):
+    return max(1, int(n * SCALE))
+
+
+def reset_schema():
+    """Recreate the schema the way init_db() does"""
+    with db.engine.begin() as conn:
+        conn.execute(text('DROP TABLE IF EXISTS experiences_fts'))
+        conn.execute(text('DROP TABLE IF EXISTS experiences_rtree'))
+        conn.execute(text('DROP TABLE IF EXISTS schema_migrations'))
+    db.drop_all()
+    db.create_all()
+    run_migrations()
+
+
+def explain(query):
+    """Return the database's plan for an ORM query as text"""
+    dialect = db.engine.dialect
+    sql = str(query.statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+    if dialect.name == 'sqlite':
+        rows = db.session.execute(text(f"EXPLAIN QUERY PLAN {sql}")).fetchall()
+        return '\n'.join(f"      {row[-1]}" for row in rows)
+    rows = db.session.execute(text(f"EXPLAIN {sql}")).fetchall()
+    return '\n'.join(f"      {row[0]}" for row in rows)
+
+
+def median_ms(fn, repeat=15):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+def insert_chunked(table, rows, chunk_size=20000):
+    """Bulk insert an iterable of row dicts without materializing it"""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            db.session.execute(table.insert(), chunk)
+            chunk = []
+    if chunk:
+        db.session.execute(table.insert(), chunk)
+
+
+def seed(guides=10, travelers=10, experiences=50, dates_per_experience=5, bookings=1000):
+    """Insert a synthetic dataset using bulk inserts"""
+    reset_schema()
+    now = datetime.utcnow()
+    today = date.today()
+    insert_chunked(User.__table__, (
+        {
+            'first_name': f'User{i}', 'last_name': 'Bench', 'email': f'user{i}@bench.test',
+            'password_hash': PASSWORD_HASH, 'role': UserRole.GUIDE if i < guides else UserRole.TRAVELER,
+            'bio': 'Benchmark guide' if i < guides else None, 'is_verified': True, 'created_at': now
+        } for i in range(guides + travelers)
+    ))
+    insert_chunked(Experience.__table__, (
+        {
+            'guide_id': (i % guides) + 1,
+            'title': f'{WORDS[i % len(WORDS)].title()} {WORDS[(i // 7) % len(WORDS)]} experience {i}',
+            'description': ' '.join(
+                [WORDS[(i * k + k) % len(WORDS)] for k in range(1, 30)]
+                + [f'{WORDS[k % len(WORDS)]}{(i * 7919 + k * 104729) % 5000}' for k in range(10)]
+            ),
+            'short_description': 'Synthetic benchmark experience',
+            'category': CATEGORIES[i % len(CATEGORIES)], 'location': LOCATIONS[i % len(LOCATIONS)],
+            'duration_hours': 4 + i % 48, 'max_group_size': 10, 'price_per_person': 50 + (i * 7) % 450,
+            'images': [], 'is_active': i % 10 != 0, 'is_approved': True,
+            'created_at': now, 'updated_at': now
+        } for i in range(experiences)
+    ))
+    insert_chunked(ExperienceDate.__table__, (
+        {
+            'experience_id': e + 1, 'date': today + timedelta(days=d + 1), 'start_time': dtime(8, 0),
+            'available_slots': (e + d) % 11, 'is_available': True
+        } for e in range(experiences) for d in range(dates_per_experience)
+    ))
+    insert_chunked(Booking.__table__, (
+        {
+            'traveler_id': guides + (i % travelers) + 1, 'experience_id': (i % experiences) + 1,
+            'experience_date_id': (i % experiences) * dates_per_experience + 1,
+            'number_of_guests': 1 + i % 4, 'total_price': 100.0 * (1 + i % 4),
+            'status': BookingStatus.CONFIRMED, 'is_paid': True, 'created_at': now, 'updated_at': now
+        } for i in range(bookings)
+    ))
+    db.session.commit()
+
+
+def bench_serialization():
+    """Booking listings must issue a constant number of queries"""
+    print("📦 Booking serialization (admin bookings listing)")
+    counts = {}
+    for rows in (10, 100, 1000):
+        seed(bookings=rows)
+        db.session.expunge_all()
+        with count_queries() as lazy:
+            with timed(f"{rows:>5} rows, per-row to_dict"):
+                [booking.to_dict() for booking in Booking.query.all()]
+        db.session.expunge_all()
+        with count_queries() as batched:
+            with timed(f"{rows:>5} rows, batched"):
+                bookings_to_dicts(with_booking_relations(Booking.query).all())
+        db.session.expunge_all()
+        counts[rows] = batched['queries']
+        print(f"   {rows:>5} rows: {lazy['queries']} queries per-row vs {batched['queries']} batched")
+    assert len(set(counts.values())) == 1, f"query count grows with rows: {counts}"
+    print("✅ Query count is constant regardless of row count")
+
+
+def hot_path_queries():
+    """The filters used by the search, availability and booking endpoints"""
+    target_date = date.today() + timedelta(days=30)
+    listed = Experience.query.filter_by(is_approved=True, is_active=True)
+    open_dates = ExperienceDate.query.filter(
+        ExperienceDate.is_available == True,
+        ExperienceDate.available_slots > 0
+    )
+    return {
+        'search by price range': listed.filter(
+            Experience.price_per_person >= 100, Experience.price_per_person <= 110
+        ),
+        'search by category and price': listed.filter(
+            Experience.category == 'Hiking', Experience.price_per_person <= 100
+        ),
+        'search by date': db.session.query(Experience.id).join(ExperienceDate).filter(
+            ExperienceDate.date == target_date,
+            ExperienceDate.available_slots > 0,
+            ExperienceDate.is_available == True
+        ),
+        'availability (one experience, 2 weeks)': open_dates.filter(
+            ExperienceDate.experience_id == 4242 % scaled(10000) + 1,
+            ExperienceDate.date >= target_date,
+            ExperienceDate.date <= target_date + timedelta(days=14)
+        ),
+        'my-bookings (first page)': Booking.query.filter_by(
+            traveler_id=scaled(500) + 7
+        ).order_by(Booking.id).limit(50),
+        'bookings for one experience': Booking.query.filter_by(experience_id=42),
+    }
+
+
+def bench_indexes():
+    """Query plans and latencies for the hot paths with and without indexes"""
+    experiences = scaled(10000)
+    print(f"🗂️  Hot-path indexes ({experiences * 100:,} experience dates, {scaled(200000):,} bookings)")
+    with timed("seed"):
+        seed(guides=scaled(500), travelers=scaled(5000), experiences=experiences,
+             dates_per_experience=100, bookings=scaled(200000))
+    results = {}
+    for phase in ('before', 'after'):
+        if phase == 'before':
+            rollback_migration('0001')
+        else:
+            run_migrations()
+        db.session.execute(text('ANALYZE'))
+        print(f"   --- {phase} ---")
+        for name, query in hot_path_queries().items():
+            latency = median_ms(query.all)
+            results.setdefault(name, {})[phase] = latency
+            print(f"   {name}: {latency:.2f} ms")
+            print(explain(query))
+    print("   --- summary (median ms) ---")
+    for name, timings in results.items():
+        speedup = timings['before'] / timings['after'] if timings['after'] else float('inf')
+        print(f"   {name:<42} {timings['before']:>9.2f} -> {timings['after']:>8.2f}  ({speedup:.1f}x)")
+
+
+def bench_search():
+    """Full-text q= search against LIKE scans at 100k experiences"""
+    from search import full_text_backend, full_text_search
+    experiences = scaled(100000)
+    print(f"🔎 Full-text search ({experiences:,} experiences)")
+    with timed("seed"):
+        seed(guides=scaled(1000), travelers=1, experiences=experiences, dates_per_experience=0, bookings=0)
+    print(f"   backend: {full_text_backend()}")
+    listed = Experience.query.filter_by(is_approved=True, is_active=True)
+    # Common words match a large share of the catalog; suffixed words such
+    # as 'lion1234' behave like rare place or species names.
+    for q in ('elephant', 'coral snorkeling', 'lion1234', 'forest417 waterfall', 'photo'):
+        like = listed
+        for term in q.split():
+            like = like.filter((Experience.title.ilike(f'%{term}%')) | (Experience.description.ilike(f'%{term}%')))
+        ranked = full_text_search(listed, q)
+        like_ms = median_ms(lambda: like.limit(50).all(), repeat=5)
+        fts_ms = median_ms(lambda: ranked.limit(50).all(), repeat=5)
+        print(f"   q={q!r:<24} LIKE {like_ms:>8.2f} ms   full-text {fts_ms:>7.2f} ms   ({ranked.count():,} matches)")
+
+
+def legacy_date_search(day):
+    """The pre-builder date filter: materialize ids, then IN (...)"""
+    available = db.session.query(Experience).join(ExperienceDate).filter(
+        ExperienceDate.date == day,
+        ExperienceDate.available_slots > 0,
+        ExperienceDate.is_available == True
+    ).all()
+    ids = [exp.id for exp in available]
+    return Experience.query.filter_by(is_approved=True, is_active=True).filter(
+        Experience.id.in_(ids)
+    ).all()
+
+
+def bench_date_search():
+    """Date-filtered search: two queries plus IN list vs one EXISTS query"""
+    from search import build_search_query
+    experiences = scaled(10000)
+    print(f"📅 Date search ({experiences:,} experiences x 365 dates)")
+    with timed("seed"):
+        seed(guides=scaled(500), travelers=1, experiences=experiences,
+             dates_per_experience=365, bookings=0)
+    db.session.execute(text('ANALYZE'))
+    day = date.today() + timedelta(days=100)
+    cases = {
+        'date only': {'date': day.isoformat()},
+        'date + category': {'date': day.isoformat(), 'category': 'safari'},
+        'date + price range': {'date': day.isoformat(), 'min_price': '100', 'max_price': '150'},
+    }
+    for label, args in cases.items():
+        query, _ = build_search_query(args)
+        with count_queries() as single:
+            rows = len(query.all())
+        db.session.expunge_all()
+        new_ms = median_ms(query.all, repeat=7)
+        print(f"   {label}: {rows:,} rows, builder: {single['queries']} query, {new_ms:.1f} ms")
+        if label == 'date only':
+            with count_queries() as old:
+                legacy_date_search(day)
+            db.session.expunge_all()
+            old_ms = median_ms(lambda: legacy_date_search(day), repeat=7)
+            print(f"   {label}: legacy id list + IN: {old['queries']} queries, {old_ms:.1f} ms")
+
+
+def auth_headers(user_id):
+    import jwt
+    token = jwt.encode({
+        'user_id': user_id,
+        'exp': datetime.utcnow() + timedelta(hours=1)
+    }, app.config['SECRET_KEY'], algorithm='HS256')
+    return {'Authorization': f'Bearer {token}'}
+
+
+def bench_booking_concurrency(requests_total=400, workers=32, slots=100):
+    """Parallel bookings against one date must never overbook"""
+    from concurrent.futures import ThreadPoolExecutor
+    print(f"🎟️  Concurrent bookings ({requests_total} requests, {workers} threads, {slots} slots)")
+    seed(guides=1, travelers=workers, experiences=1, dates_per_experience=1, bookings=0)
+    db.session.execute(ExperienceDate.__table__.update().values(available_slots=slots))
+    db.session.commit()
+    headers = [auth_headers(2 + i) for i in range(workers)]
+
+    def book(i):
+        client = app.test_client()
+        response = client.post('/api/bookings', headers=headers[i % workers], json={
+            'experience_id': 1, 'experience_date_id': 1, 'number_of_guests': 1 + i % 3
+        })
+        return response.status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        statuses = list(pool.map(book, range(requests_total)))
+    elapsed = time.perf_counter() - start
+
+    db.session.expire_all()
+    remaining = db.session.get(ExperienceDate, 1).available_slots
+    booked = db.session.query(db.func.coalesce(db.func.sum(Booking.number_of_guests), 0)).scalar()
+    print(f"   {statuses.count(201)} booked, {statuses.count(400)} refused, "
+          f"{len(statuses) - statuses.count(201) - statuses.count(400)} errors")
+    print(f"   {booked} guests booked, {remaining} slots left, {requests_total / elapsed:.0f} requests/s")
+    assert remaining >= 0, "slots went negative"
+    assert booked + remaining == slots, f"overbooked: {booked} booked + {remaining} left != {slots}"
+    print("✅ No overbooking")
+
+
+def bench_calendar():
+    """Publish a year of daily dates for 10k experiences, then re-publish"""
+    from availability import expand_schedule, bulk_upsert_dates
+    experiences = scaled(10000)
+    print(f"🗓️  Calendar publishing ({experiences:,} experiences x 1 year)")
+    seed(guides=scaled(500), travelers=1, experiences=experiences, dates_per_experience=0, bookings=0)
+    schedule = expand_schedule({'days': 365, 'start_time': '08:00'})
+    rows = lambda: ((e + 1, day, start_time, 10) for e in range(experiences) for day, start_time in schedule)
+
+    for label in ('first publish', 're-publish (idempotent)'):
+        start = time.perf_counter()
+        created = bulk_upsert_dates(rows())
+        elapsed = time.perf_counter() - start
+        print(f"   {label}: {created:,} rows created in {elapsed:.1f} s")
+    total = db.session.query(db.func.count(ExperienceDate.id)).scalar()
+    assert total == experiences * len(schedule), f"expected {experiences * len(schedule)} dates, found {total}"
+    print(f"✅ {total:,} dates, no duplicates")
+
+
+def legacy_authenticate(token):
+    """token_required before the auth cache: decode and load the User every time"""
+    import jwt
+    data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
+    return User.query.get(data['user_id'])
+
+
+def bench_auth(requests_total=2000, travelers=50):
+    """Per-request auth overhead for a my-bookings / create_booking mix"""
+    from app import authenticator
+    requests_total = scaled(requests_total)
+    print(f"🔑 Auth overhead ({requests_total:,} requests, {travelers} travelers, 80% reads / 20% bookings)")
+    seed(guides=5, travelers=travelers, experiences=20, dates_per_experience=10, bookings=travelers * 10)
+    db.session.execute(ExperienceDate.__table__.update().values(available_slots=1_000_000))
+    db.session.commit()
+    headers = [auth_headers(6 + i) for i in range(travelers)]
+    client = app.test_client()
+    cached_authenticate = authenticator.authenticate
+
+    def run(authenticate):
+        spent = [0.0]
+        auth_queries = [0]
+
+        def timed_authenticate(token):
+            queries_before = counter['queries']
+            start = time.perf_counter()
+            try:
+                return authenticate(token)
+            finally:
+                spent[0] += time.perf_counter() - start
+                auth_queries[0] += counter['queries'] - queries_before
+
+        authenticator.authenticate = timed_authenticate
+        try:
+            with count_queries() as counter:
+                start = time.perf_counter()
+                for i in range(requests_total):
+                    if i % 5 == 4:
+                        response = client.post('/api/bookings', headers=headers[i % travelers], json={
+                            'experience_id': 1 + i % 20, 'experience_date_id': 1 + (i % 20) * 10, 'number_of_guests': 1
+                        })
+                        assert response.status_code == 201, response.get_json()
+                    else:
+                        response = client.get('/api/bookings/my-bookings?limit=20', headers=headers[i % travelers])
+                        assert response.status_code == 200, response.get_json()
+                elapsed = time.perf_counter() - start
+        finally:
+            del authenticator.authenticate
+        return (spent[0] * 1e6 / requests_total, auth_queries[0] / requests_total,
+                counter['queries'] / requests_total, elapsed * 1000 / requests_total)
+
+    for label, authenticate in (('before (decode + SELECT)', legacy_authenticate),
+                                ('after (cached claims + users)', cached_authenticate)):
+        auth_us, auth_queries, queries, request_ms = run(authenticate)
+        print(f"   {label}: auth {auth_us:.0f} µs and {auth_queries:.2f} queries/request, "
+              f"{queries:.2f} queries/request in total, {request_ms:.2f} ms/request")
+    print(f"   {authenticator.stats()}")
+
+
+def bench_login_storm(login_threads=16, duration=5.0):
+    """Catalog read latency while a burst of logins hashes passwords"""
+    import threading
+    from app import hasher, response_cache
+    from cache import LocalBackend
+    from passwords import hash_password
+    print(f"🔐 Login storm ({login_threads} login threads for {duration:.0f}s, bcrypt cost {hasher.rounds})")
+    seed(guides=5, travelers=login_threads, experiences=200, dates_per_experience=5, bookings=0)
+    db.session.execute(User.__table__.update().values(password_hash=hash_password('storm-password', hasher.rounds)))
+    db.session.commit()
+    response_cache.backend = LocalBackend(0)  # measure the real read path, not cache hits
+
+    def storm(stop, statuses):
+        client = app.test_client()
+        i = 0
+        while not stop.is_set():
+            response = client.post('/api/auth/login', json={
+                'email': f'user{5 + i % login_threads}@bench.test', 'password': 'storm-password'
+            })
+            statuses.append(response.status_code)
+            if response.status_code == 503:
+                stop.wait(float(response.headers.get('Retry-After', 1)))
+            i += 1
+
+    def read_latencies():
+        client = app.test_client()
+        samples = []
+        end = time.perf_counter() + duration
+        i = 0
+        while time.perf_counter() < end:
+            start = time.perf_counter()
+            response = client.get(f'/api/experiences/{1 + i % 200}')
+            samples.append((time.perf_counter() - start) * 1000)
+            assert response.status_code in (200, 404)
+            i += 1
+        samples.sort()
+        return samples[len(samples) // 2], samples[int(len(samples) * 0.95)], samples[-1]
+
+    def run(label, workers, queue_size, logins=True):
+        hasher.shutdown()
+        hasher.workers, hasher.queue_size = workers, queue_size
+        hasher._slots = threading.BoundedSemaphore(max(workers, 1) + queue_size)
+        stop, statuses = threading.Event(), []
+        threads = [threading.Thread(target=storm, args=(stop, statuses)) for _ in range(login_threads if logins else 0)]
+        for thread in threads:
+            thread.start()
+        p50, p95, worst = read_latencies()
+        stop.set()
+        for thread in threads:
+            thread.join()
+        print(f"   {label}: reads p50 {p50:.1f} ms, p95 {p95:.1f} ms, max {worst:.0f} ms; "
+              f"logins {statuses.count(200)} ok, {statuses.count(503)} shed (503)")
+
+    cores = os.cpu_count() or 1
+    run('no logins', cores, 2 * cores, logins=False)
+    run('storm, inline bcrypt (before)', 0, login_threads)
+    run(f'storm, pool of {cores} + queue {2 * cores} (after)', cores, 2 * cores)
+    hasher.shutdown()
+
+
+UPSTREAM_DELAY = 0.3
+
+
+def serving_app(environ, start_response):
+    """The API plus /bench/upload, which waits like a Cloudinary upload does"""
+    if environ['PATH_INFO'] == '/bench/upload':
+        time.sleep(UPSTREAM_DELAY)
+        start_response('200 OK', [('Content-Type', 'application/json')])
+        return [b'{"uploaded": true}']
+    return app(environ, start_response)
+
+
+def bench_serving(clients=32, duration=10.0):
+    """Requests/s and p99 of sync vs threaded gunicorn workers, mixed workload"""
+    import http.client
+    import socket
+    import subprocess
+    import threading
+    print(f"🚦 Serving modes ({clients} clients for {duration:.0f}s: "
+          f"70% experience reads, 20% my-bookings, 10% {UPSTREAM_DELAY * 1000:.0f} ms uploads)")
+    seed(guides=5, travelers=clients, experiences=200, dates_per_experience=5, bookings=clients * 20)
+    headers = [auth_headers(6 + i) for i in range(clients)]
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+
+    def free_port():
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            return sock.getsockname()[1]
+
+    def client_loop(i, port, stop, results):
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        n = i
+        while not stop.is_set():
+            kind = n % 10
+            if kind == 0:
+                path, request_headers = '/bench/upload', {}
+            elif kind in (1, 2):
+                path, request_headers = '/api/bookings/my-bookings?limit=20', headers[i]
+            else:
+                path, request_headers = f'/api/experiences/{1 + n % 200}', {}
+            start = time.perf_counter()
+            try:
+                connection.request('GET', path, headers=request_headers)
+                response = connection.getresponse()
+                response.read()
+                ok = response.status == 200
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+                ok = False
+            results.append((kind, (time.perf_counter() - start) * 1000, ok))
+            n += clients
+        connection.close()
+
+    def run(label, worker_class):
+        port = free_port()
+        env = dict(os.environ, PORT=str(port), GUNICORN_WORKER_CLASS=worker_class, WEB_CONCURRENCY='2')
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn_config.py', 'benchmark:serving_app'],
+            cwd=backend_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            for _ in range(100):
+                try:
+                    socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                    break
+                except OSError:
+                    time.sleep(0.2)
+            stop, results = threading.Event(), []
+            threads = [threading.Thread(target=client_loop, args=(i, port, stop, results)) for i in range(clients)]
+            for thread in threads:
+                thread.start()
+            time.sleep(duration)
+            stop.set()
+            for thread in threads:
+                thread.join()
+        finally:
+            server.terminate()
+            server.wait()
+
+        fast = sorted(ms for kind, ms, ok in results if kind != 0)
+        everything = sorted(ms for kind, ms, ok in results)
+        errors = sum(1 for kind, ms, ok in results if not ok)
+        p99 = lambda samples: samples[int(len(samples) * 0.99)] if samples else float('nan')
+        print(f"   {label}: {len(results) / duration:.0f} requests/s, p99 {p99(everything):.0f} ms "
+              f"(API only: p50 {fast[len(fast) // 2]:.1f} ms, p99 {p99(fast):.0f} ms), {errors} errors")
+
+    run('2 sync workers (before)', 'sync')
+    run('2 gthread workers x 8 threads (after)', 'gthread')
+
+
+def bench_pool(threads=16, requests_per_thread=50):
+    """Pool checkout waits when more threads than connections hit the database.
+
+    Compare pool sizes with e.g. DB_POOL_SIZE=16 python benchmark.py pool
+    """
+    import threading
+    from app import response_cache
+    from cache import LocalBackend
+    from database import pool_stats
+    pool = db.engine.pool
+    print(f"🏊 Connection pool ({threads} threads, pool_size {pool.size()}, max_overflow {pool._max_overflow}, "
+          f"journal_mode {db.session.execute(text('PRAGMA journal_mode')).scalar() if db.engine.dialect.name == 'sqlite' else 'n/a'})")
+    seed(guides=5, travelers=threads, experiences=200, dates_per_experience=5, bookings=threads * 20)
+    db.session.execute(ExperienceDate.__table__.update().values(available_slots=1_000_000))
+    db.session.commit()
+    db.session.remove()
+    headers = [auth_headers(6 + i) for i in range(threads)]
+    response_cache.backend = LocalBackend(0)
+    db.engine.dispose()
+
+    def worker(i):
+        client = app.test_client()
+        for n in range(requests_per_thread):
+            if n % 5 == 4:
+                response = client.post('/api/bookings', headers=headers[i], json={
+                    'experience_id': 1 + n % 200, 'experience_date_id': 1 + (n % 200) * 5, 'number_of_guests': 1
+                })
+            else:
+                response = client.get('/api/bookings/my-bookings?limit=20', headers=headers[i])
+            assert response.status_code in (200, 201), response.get_json()
+
+    start = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    print(f"   {threads * requests_per_thread / elapsed:.0f} requests/s")
+    print(f"   {pool_stats(db.engine)}")
+
+
+class DelayedStorage:
+    """Local storage behind a fixed round trip, standing in for Cloudinary"""
+    name = 'delayed'
+
+    def __init__(self, storage, delay):
+        self.storage = storage
+        self.delay = delay
+
+    def store(self, path, name):
+        time.sleep(self.delay)
+        return self.storage.store(path, name)
+
+
+def bench_uploads(uploads=20, size=(1600, 1200)):
+    """Upload request latency must not depend on remote storage latency"""
+    import io
+    from app import upload_pipeline
+    from images import PIL_AVAILABLE
+    from uploads import LocalStorage
+    if not PIL_AVAILABLE:
+        print("⚠️ Pillow not installed, skipping uploads")
+        return
+    from PIL import Image
+    seed(guides=1, travelers=1, experiences=1, dates_per_experience=0, bookings=0)
+    headers = auth_headers(1)
+    client = app.test_client()
+    # A decodable photo-sized PNG, so variant rendering runs as it does in production
+    buffer = io.BytesIO()
+    Image.effect_noise(size, 40).convert('RGB').save(buffer, 'PNG')
+    image = buffer.getvalue()
+    print(f"🖼️  Uploads ({uploads} x {len(image) // 1024} KB PNG, {size[0]}x{size[1]})")
+    local = LocalStorage(tempfile.mkdtemp(prefix='digital-guides-uploads-'))
+
+    for delay in (0.0, 0.5, 2.0):
+        upload_pipeline.storage = DelayedStorage(local, delay)
+        inline = median_ms(lambda: upload_pipeline.storage.store(
+            upload_pipeline.spool(io.BytesIO(image))[0], 'inline.png'
+        ), repeat=3)
+
+        latencies, job_ids = [], []
+        for _ in range(uploads):
+            start = time.perf_counter()
+            response = client.post('/api/upload', headers={**headers, 'Content-Type': 'image/png'}, data=image)
+            latencies.append((time.perf_counter() - start) * 1000)
+            assert response.status_code == 202, response.get_json()
+            job_ids.append(response.get_json()['job_id'])
+        start = time.perf_counter()
+        for job_id in job_ids:
+            while (job := client.get(f'/api/upload/{job_id}', headers=headers).get_json())['status'] in ('pending', 'processing'):
+                time.sleep(0.02)
+            assert job['status'] == 'completed', job
+        drained = time.perf_counter() - start
+        latencies.sort()
+        print(f"   storage {delay * 1000:>4.0f} ms: inline request ~{inline:.0f} ms; pipeline request "
+              f"p50 {latencies[len(latencies) // 2]:.1f} ms, max {latencies[-1]:.1f} ms "
+              f"(all {uploads} stored {drained:.1f} s later)")
+
+
+def bench_image_variants(photos=10):
+    """Bytes a catalog card downloads: original photo vs generated variants"""
+    import io
+    from app import image_variants
+    from images import PIL_AVAILABLE, VariantCache
+    if not PIL_AVAILABLE:
+        print("⚠️ Pillow not installed, skipping image variants")
+        return
+    from PIL import Image, ImageDraw
+    print(f"🖼️  Image variants ({photos} photos, 4000x3000 JPEG, formats {image_variants.formats})")
+    image_variants.cache = VariantCache(tempfile.mkdtemp(prefix='digital-guides-variants-'), 500 * 1024 * 1024)
+    originals, sizes, elapsed = 0, {}, 0.0
+    for i in range(photos):
+        photo = Image.effect_noise((4000, 3000), 40 + i).convert('RGB')
+        ImageDraw.Draw(photo).ellipse((500, 500, 3500, 2500), fill=(30 * i % 255, 120, 60))
+        buffer = io.BytesIO()
+        photo.save(buffer, 'JPEG', quality=90)
+        originals += buffer.tell()
+        buffer.seek(0)
+        start = time.perf_counter()
+        rendered = image_variants.render(buffer)
+        elapsed += time.perf_counter() - start
+        for variant, image_format, data in rendered:
+            sizes[(variant, image_format)] = sizes.get((variant, image_format), 0) + len(data)
+    print(f"   original: {originals / photos / 1024:.0f} KB per photo")
+    for (variant, image_format), total in sorted(sizes.items()):
+        print(f"   {variant} {image_format}: {total / photos / 1024:.1f} KB per photo "
+              f"({originals / total:.0f}x smaller)")
+    print(f"   rendering: {elapsed * 1000 / photos:.0f} ms per upload, in the upload worker")
+
+
+def bench_jobs(messages=200, guides=5, delivery_ms=200):
+    """contact_guide latency with slow delivery, and how many digests the worker sends"""
+    import subprocess
+    import notifications
+    from jobs import queue_stats
+    from models import Job
+    print(f"📨 Jobs ({messages} guide messages to {guides} guides, {delivery_ms} ms per delivery)")
+    seed(guides=guides, travelers=1, experiences=guides, dates_per_experience=0, bookings=0)
+    headers = auth_headers(guides + 1)
+    client = app.test_client()
+    deliveries = []
+
+    def slow_deliver(recipient, subject, body):
+        time.sleep(delivery_ms / 1000)
+        deliveries.append(recipient)
+
+    original_deliver = notifications.deliver
+    notifications.deliver = slow_deliver
+    try:
+        # What the endpoint costs if it delivers the message itself
+        inline = median_ms(lambda: slow_deliver('guide@bench.test', 'Message', 'hello'), repeat=3)
+
+        latencies = []
+        for i in range(messages):
+            start = time.perf_counter()
+            response = client.post('/api/contact/guide', headers=headers,
+                                   json={'guide_id': i % guides + 1, 'message': f'Question {i}'})
+            latencies.append((time.perf_counter() - start) * 1000)
+            assert response.status_code == 200, response.get_json()
+        latencies.sort()
+        print(f"   request: inline delivery ~{inline:.0f} ms; queued p50 {latencies[len(latencies) // 2]:.1f} ms, "
+              f"max {latencies[-1]:.1f} ms")
+
+    finally:
+        notifications.deliver = original_deliver
+
+    # Drain the queue with the real entry point, as Procfile/render.yaml run it
+    Job.query.update({'run_at': datetime.utcnow()})  # skip the digest window
+    db.session.commit()
+    start = time.perf_counter()
+    worker = subprocess.run(
+        [sys.executable, 'worker.py', '--once'], cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=dict(os.environ, JOBS_INLINE_WORKER='false'), capture_output=True, text=True, timeout=600
+    )
+    drained = time.perf_counter() - start
+    assert worker.returncode == 0, worker.stderr
+    db.session.expire_all()
+    stats = queue_stats()
+    assert stats['queued'] == stats['running'] == stats['failed'] == 0, stats
+    sent = worker.stdout.count('📧 To ')
+    print(f"   python worker.py --once: {stats['done']} jobs in {drained:.1f} s as {sent} deliveries "
+          f"(unbatched: {messages} deliveries, ~{messages * delivery_ms / 1000:.0f} s at {delivery_ms} ms each)")
+
+
+def legacy_statistics():
+    return (
+        User.query.count(), Booking.query.count(), Experience.query.count(),
+        db.session.query(db.func.sum(Booking.total_price)).scalar() or 0
+    )
+
+
+def bench_statistics():
+    """Admin dashboard: full-table aggregates vs maintained counters"""
+    import rollups
+    print("📊 Admin statistics")
+    for bookings in (scaled(10000), scaled(100000), scaled(500000)):
+        seed(guides=20, travelers=200, experiences=500, dates_per_experience=5, bookings=bookings)
+        start = time.perf_counter()
+        with db.engine.begin() as connection:
+            rollups.rebuild(connection)
+        rebuild_ms = (time.perf_counter() - start) * 1000
+        legacy = legacy_statistics()
+        current = rollups.dashboard()
+        assert (current['total_users'], current['total_bookings'], current['total_experiences']) == legacy[:3]
+        assert round(current['total_revenue'], 2) == round(legacy[3], 2)
+        old_ms = median_ms(legacy_statistics, repeat=5)
+        new_ms = median_ms(rollups.dashboard)
+        print(f"   {bookings:>7} bookings: aggregates {old_ms:.1f} ms; counters {new_ms:.1f} ms "
+              f"(with by-day/category/guide breakdowns; rebuild {rebuild_ms:.0f} ms)")
+
+
+# Kenyan tourism: migration season Jul-Oct and the December holidays peak,
+# the long rains (Apr-May) are quiet; weekends and evenings (EAT) book more
+MONTH_WEIGHTS = [1.1, 1.0, 0.8, 0.5, 0.5, 0.8, 1.3, 1.5, 1.4, 1.0, 0.8, 1.2]
+WEEKDAY_WEIGHTS = [0.9, 0.9, 0.95, 1.0, 1.1, 1.3, 1.2]
+HOUR_WEIGHTS = [1, 1, 1, 2, 4, 6, 7, 7, 6, 6, 7, 8, 8, 9, 10, 10, 9, 7, 5, 3, 2, 1, 1, 1]  # UTC
+GROUP_SIZES = ([1, 2, 3, 4, 5, 6, 7, 8], [20, 35, 15, 15, 6, 5, 2, 2])
+
+
+def generate_bookings(total, years=3, experiences=500, cancellation_rate=0.06, seed_value=42):
+    """Fill the database with `total` bookings spread realistically over `years`.
+
+    Volume grows over the period and follows the seasons, weekdays and hours
+    above; a few experiences get most bookings. Cancelled bookings are not
+    inserted (cancelling deletes them) but are counted in the rollups.
+    """
+    import random
+    import rollups
+    from collections import Counter
+    rng = random.Random(seed_value)
+    seed(guides=50, travelers=1000, experiences=experiences, dates_per_experience=1, bookings=0)
+    prices = [50 + (i * 7) % 450 for i in range(experiences)]
+    popularity = [1 / (rank + 1) ** 0.8 for rank in range(experiences)]
+
+    first_day = date.today() - timedelta(days=365 * years)
+    days = [first_day + timedelta(days=d) for d in range(365 * years)]
+    weights = [
+        (0.4 + 0.6 * d / len(days)) * MONTH_WEIGHTS[day.month - 1] * WEEKDAY_WEIGHTS[day.weekday()]
+        for d, day in enumerate(days)
+    ]
+    moments = sorted(zip(
+        rng.choices(days, weights, k=total),
+        rng.choices(range(24), HOUR_WEIGHTS, k=total),
+        (rng.randrange(3600) for _ in range(total))
+    ))
+    picks = rng.choices(range(experiences), popularity, k=total)
+    guests = rng.choices(*GROUP_SIZES, k=total)
+
+    cancellations = Counter()
+    def rows():
+        for i, ((day, hour, second), e, n) in enumerate(zip(moments, picks, guests)):
+            created = datetime.combine(day, dtime(hour)) + timedelta(seconds=second)
+            if rng.random() < cancellation_rate:
+                cancelled = created + timedelta(hours=rng.randrange(1, 14 * 24))
+                cancellations[cancelled.replace(minute=0, second=0, microsecond=0)] += 1
+                continue
+            yield {
+                'traveler_id': 51 + i % 1000, 'experience_id': e + 1, 'experience_date_id': e + 1,
+                'number_of_guests': n, 'total_price': float(prices[e] * n),
+                'status': BookingStatus.CONFIRMED, 'is_paid': True, 'created_at': created, 'updated_at': created
+            }
+    insert_chunked(Booking.__table__, rows())
+    db.session.commit()
+    with db.engine.begin() as connection:
+        rollups.add_activity(connection, [(hour, 0, 0, 0, count) for hour, count in cancellations.items()])
+        rollups.rebuild(connection)
+    return total - sum(cancellations.values()), sum(cancellations.values())
+
+
+def legacy_daily_series(start, end):
+    day = db.func.date(Booking.created_at)
+    return db.session.query(
+        day, db.func.count(Booking.id), db.func.sum(Booking.number_of_guests), db.func.sum(Booking.total_price)
+    ).filter(Booking.created_at >= start, Booking.created_at < end).group_by(day).all()
+
+
+def bench_analytics(total=2_000_000, years=3):
+    """Analytics series over rollups on a multi-million-booking dataset"""
+    from analytics import time_series
+    total = scaled(total)
+    print(f"📈 Analytics ({total} bookings over {years} years)")
+    start = time.perf_counter()
+    kept, cancelled = generate_bookings(total, years)
+    print(f"   generated {kept} bookings + {cancelled} cancellations in {time.perf_counter() - start:.0f} s")
+    User.query.filter_by(id=1).update({'role': UserRole.ADMIN})
+    db.session.commit()
+    headers = auth_headers(1)
+    client = app.test_client()
+
+    end = date.today()
+    first = end - timedelta(days=365 * years)
+    for interval, since, label in (('day', first, f'{years} years'), ('week', first, f'{years} years'),
+                                   ('hour', end - timedelta(days=30), '30 days')):
+        url = f'/api/admin/analytics?interval={interval}&start={since}&end={end}'
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200, response.get_json()
+        points = len(response.get_json()['series'])
+        ms = median_ms(lambda: client.get(url, headers=headers))
+        query_ms = median_ms(lambda: time_series(interval, since, end))
+        print(f"   {interval:>4} x {label}: {points} points, endpoint {ms:.1f} ms (query + fill {query_ms:.1f} ms)")
+    legacy_ms = median_ms(lambda: legacy_daily_series(first, end + timedelta(days=1)), repeat=3)
+    print(f"   daily x {years} years straight from bookings (GROUP BY date): {legacy_ms:.0f} ms")
+
+
+def legacy_rating_sort(limit=50):
+    """Top rated listings by aggregating reviews at query time"""
+    from models import Review
+    averages = db.session.query(
+        Review.experience_id, db.func.avg(Review.rating).label('rating'), db.func.count(Review.id).label('reviews')
+    ).group_by(Review.experience_id).subquery()
+    return Experience.query.filter_by(is_approved=True, is_active=True).outerjoin(
+        averages, averages.c.experience_id == Experience.id
+    ).order_by(averages.c.rating.desc(), averages.c.reviews.desc(), Experience.id).limit(limit).all()
+
+
+def bench_ratings(reviews_per_experience=20):
+    """sort=rating over denormalized aggregates vs aggregating reviews per query"""
+    import random
+    import ratings
+    from models import Review
+    from search import build_search_query
+    experiences = scaled(20000)
+    rng = random.Random(7)
+    print(f"⭐ Ratings ({experiences:,} experiences, ~{reviews_per_experience} reviews each)")
+    seed(guides=scaled(500), travelers=1000, experiences=experiences, dates_per_experience=0, bookings=0)
+    now = datetime.utcnow()
+    insert_chunked(Review.__table__, (
+        {'experience_id': e + 1, 'user_id': scaled(500) + 1 + t, 'rating': rng.choices([1, 2, 3, 4, 5], [2, 3, 10, 35, 50])[0],
+         'comment': '', 'created_at': now}
+        for e in range(experiences) for t in rng.sample(range(1000), rng.randrange(reviews_per_experience * 2))
+    ))
+    db.session.commit()
+    with db.engine.begin() as connection:
+        ratings.rebuild(connection)
+    print(f"   {Review.query.count():,} reviews")
+
+    query, _ = build_search_query({'sort': 'rating'})
+    top = with_experience_relations(query).limit(50)
+    with count_queries() as counted:
+        experiences_to_dicts(top.all())
+    legacy_ms = median_ms(legacy_rating_sort, repeat=5)
+    new_ms = median_ms(lambda: experiences_to_dicts(top.all()))
+    print(f"   top 50 by rating: aggregate reviews {legacy_ms:.1f} ms; rating_avg column {new_ms:.1f} ms "
+          f"including serialization ({counted['queries']} query)")
+
+
+def bench_search_sort(experiences=100000):
+    """Sorted result pages with facet counts vs downloading the whole catalog"""
+    from search import build_search_query, search_facets
+    experiences = scaled(experiences)
+    print(f"↕️  Search sort + facets ({experiences:,} experiences)")
+    seed(guides=scaled(1000), travelers=1, experiences=experiences, dates_per_experience=3, bookings=0)
+    whole_ms = median_ms(lambda: experiences_to_dicts(
+        with_experience_relations(build_search_query({})[0]).all()), repeat=3)
+    print(f"   whole catalog (client-side sort/filter): {whole_ms:.0f} ms")
+    for args in ({'sort': 'price'}, {'sort': 'newest'}, {'sort': 'rating'}, {'sort': 'availability'},
+                 {'sort': 'price', 'category': 'Hiking', 'max_price': '200'}):
+        query, _ = build_search_query(args)
+        page = with_experience_relations(query).limit(50)
+        page_ms = median_ms(lambda: experiences_to_dicts(page.all()))
+        facets_ms = median_ms(lambda: search_facets(args), repeat=5)
+        label = '&'.join(f'{k}={v}' for k, v in args.items())
+        print(f"   {label:<40} page of 50 {page_ms:>6.1f} ms   facets (1 query) {facets_ms:>6.1f} ms")
+    print("   plan for sort=price:")
+    print(explain(build_search_query({'sort': 'price'})[0].limit(50)))
+
+
+def bench_encoders(rows=10000):
+    """Rows/sec for 10k-row listing payloads: ORM to_dict + stdlib json vs row tuples + orjson"""
+    import json
+    from models import users_to_dicts
+    from serializers import ORJSON_AVAILABLE, user_rows, experience_rows, experience_date_rows, booking_rows
+    rows = scaled(rows)
+    print(f"🧾 Listing encoders ({rows:,} rows per payload, orjson {'on' if ORJSON_AVAILABLE else 'off'})")
+    seed(guides=scaled(200), travelers=rows, experiences=rows, dates_per_experience=1, bookings=rows)
+    models = (
+        ('users', User.query, User.query, users_to_dicts, user_rows),
+        ('experiences', with_experience_relations(Experience.query), Experience.query,
+         experiences_to_dicts, experience_rows),
+        ('experience dates', ExperienceDate.query, ExperienceDate.query,
+         lambda dates: [d.to_dict() for d in dates], experience_date_rows),
+        ('bookings', with_booking_relations(Booking.query), Booking.query, bookings_to_dicts, booking_rows),
+    )
+    for label, query, base, to_dicts, encoder in models:
+        id_column = encoder.columns[0]
+        query = query.order_by(id_column).limit(rows)
+        tuples = encoder.select(base).order_by(id_column).limit(rows)
+
+        def legacy():
+            db.session.expunge_all()
+            return json.dumps(to_dicts(query.all()))
+
+        def encoded():
+            return app.json.dumps(encoder(tuples.all()))
+
+        assert json.loads(legacy()) == json.loads(encoded()), f"{label}: encoder output differs from to_dict"
+        legacy_ms = median_ms(legacy, repeat=5)
+        new_ms = median_ms(encoded, repeat=5)
+        print(f"   {label:<17} to_dict + json {rows / legacy_ms * 1000:>9,.0f} rows/s   "
+              f"tuples + encoder {rows / new_ms * 1000:>9,.0f} rows/s   ({legacy_ms / new_ms:.1f}x)")
+
+
+def bench_fieldsets(experiences=20000):
+    """Catalog listing payload size and time by ?view= / ?fields="""
+    experiences = scaled(experiences)
+    print(f"🗂️  Sparse fieldsets ({experiences:,} experiences)")
+    seed(guides=scaled(200), travelers=1, experiences=experiences, dates_per_experience=0, bookings=0)
+    long_text = ' '.join(WORDS) * 8
+    db.session.execute(Experience.__table__.update().values(
+        description=long_text, itinerary=long_text, includes=WORDS[:12],
+        excludes=WORDS[12:24], requirements=long_text[:400]
+    ))
+    db.session.commit()
+    client = app.test_client()
+    for query in ('', '?view=summary', '?fields=title,price_per_person,cover_image,card_image'):
+        url = f'/api/experiences{query}&format=ndjson' if query else '/api/experiences?format=ndjson'
+        size = len(client.get(url).get_data())
+        ms = median_ms(lambda: client.get(url).get_data(), repeat=5)
+        print(f"   {query or '(full detail)':<55} {size / 1024 / 1024:>7.1f} MB {ms:>8.0f} ms")
+
+
+def bench_compression(experiences=5000):
+    """Catalog response size and latency with negotiated compression and precompressed cache hits"""
+    from app import compressor
+    from compression import negotiate
+    experiences = scaled(experiences)
+    print(f"🗜️  Compression ({experiences:,} experiences)")
+    seed(guides=scaled(100), travelers=1, experiences=experiences, dates_per_experience=0, bookings=0)
+    client = app.test_client()
+    for encoding in ('identity', 'gzip', 'br'):
+        headers = {'Accept-Encoding': encoding}
+        with app.test_request_context(headers=headers):
+            if (negotiate() or 'identity') != encoding:
+                print(f"   {encoding:<8} not available")
+                continue
+        for url in ('/api/experiences', '/api/experiences?view=summary'):
+            response = client.get(url, headers=headers)
+            hit_ms = median_ms(lambda: client.get(url, headers=headers).get_data())
+            body = client.get(f'{url}{"&" if "?" in url else "?"}format=ndjson', headers=headers).get_data()
+            print(f"   {encoding:<8} {url:<32} {len(response.get_data()) / 1024:>8.0f} KB "
+                  f"cache hit {hit_ms:>6.1f} ms   NDJSON stream {len(body) / 1024:>8.0f} KB")
+    payload = client.get('/api/experiences', headers={'Accept-Encoding': 'identity'}).get_data()
+    per_request_ms = median_ms(lambda: compressor.compress(payload, 'gzip'))
+    print(f"   recompressing the catalog per request would add {per_request_ms:.1f} ms (gzip {compressor.level})")
+
+
+def bench_geo(experiences=100000):
+    """Radius search around a point vs matching the location text"""
+    import random
+    from geo import GAZETTEER, spatial_backend
+    from search import build_search_query
+    from serializers import experience_rows
+    experiences = scaled(experiences)
+    rng = random.Random(11)
+    print(f"📍 Geo search ({experiences:,} experiences)")
+    seed(guides=scaled(1000), travelers=1, experiences=experiences, dates_per_experience=0, bookings=0)
+    places = list(GAZETTEER.values())
+    points = []
+    for i in range(experiences):
+        latitude, longitude = rng.choice(places)
+        points.append({'row_id': i + 1, 'lat': latitude + rng.gauss(0, 0.3), 'lng': longitude + rng.gauss(0, 0.3)})
+    db.session.execute(
+        Experience.__table__.update().where(Experience.id == db.bindparam('row_id')).values(
+            latitude=db.bindparam('lat'), longitude=db.bindparam('lng')
+        ), points
+    )
+    db.session.commit()
+    print(f"   spatial index: {spatial_backend() or 'B-tree box scan'}")
+
+    legacy_query = with_experience_relations(build_search_query({'location': 'Nairobi'})[0])
+    legacy_ms = median_ms(lambda: experiences_to_dicts(legacy_query.all()), repeat=3)
+    print(f"   location=Nairobi (ilike, every match): {legacy_ms:.0f} ms")
+    nairobi = GAZETTEER['nairobi']
+    for radius in (10, 50, 200):
+        args = {'lat': str(nairobi[0]), 'lng': str(nairobi[1]), 'radius_km': str(radius)}
+        query = experience_rows.select(build_search_query(args)[0])
+        found = query.order_by(None).count()
+        page_ms = median_ms(lambda: experience_rows(query.limit(50).all()))
+        print(f"   lat/lng Nairobi radius_km={radius:<4} {found:>7,} within, nearest 50 in {page_ms:>6.1f} ms")
+    print("   plan for radius_km=50:")
+    args = {'lat': str(nairobi[0]), 'lng': str(nairobi[1]), 'radius_km': '50'}
+    print(explain(build_search_query(args)[0].limit(50)))
+
+
+BENCHMARKS = {
+    'serialization': bench_serialization,
+    'indexes': bench_indexes,
+    'search': bench_search,
+    'date-search': bench_date_search,
+    'booking-concurrency': bench_booking_concurrency,
+    'calendar': bench_calendar,
+    'auth': bench_auth,
+    'login-storm': bench_login_storm,
+    'serving': bench_serving,
+    'pool': bench_pool,
+    'uploads': bench_uploads,
+    'image-variants': bench_image_variants,
+    'jobs': bench_jobs,
+    'statistics': bench_statistics,
+    'analytics': bench_analytics,
+    'ratings': bench_ratings,
+    'search-sort': bench_search_sort,
+    'encoders': bench_encoders,
+    'fieldsets': bench_fieldsets,
+    'compression': bench_compression,
+    'geo': bench_geo,
+}
+
+
+if __name__ == '__main__':
+    selected = sys.argv[1:] or list(BENCHMARKS)
+    with app.app_context():
+        for name in selected:
+            BENCHMARKS[name]()
@@ -0,0 +1,61 @@
+"""Slot accounting for bookings.
+
+Slots are never read, checked in Python and written back. Each change is a
+single conditional UPDATE, so the database serializes concurrent bookings on
+the experience_dates row (a row lock on Postgres, the write lock on SQLite)
+and the `available_slots >= n` guard makes overbooking impossible.
+"""
+from sqlalchemy import update, delete
+
+from models import db, Booking, ExperienceDate, Review
+from rollups import record_booking
+
+
+def reserve_slots(experience_date_id, experience_id, guests):
+    """Take `guests` slots from a bookable date. Returns False if it can't."""
+    result = db.session.execute(
+        update(ExperienceDate)
+        .where(
+            ExperienceDate.id == experience_date_id,
+            ExperienceDate.experience_id == experience_id,
+            ExperienceDate.is_available == True,
+            ExperienceDate.available_slots >= guests
+        )
+        .values(available_slots=ExperienceDate.available_slots - guests)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def release_slots(experience_date_id, guests):
+    db.session.execute(
+        update(ExperienceDate)
+        .where(ExperienceDate.id == experience_date_id)
+        .values(available_slots=ExperienceDate.available_slots + guests)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def cancel_booking(booking):
+    """Delete a booking and give its slots back, exactly once.
+
+    Returns False if another request already cancelled it.
+    """
+    experience_date_id, guests = booking.experience_date_id, booking.number_of_guests
+    # Reviews outlive the booking they were written for (the FK is also ON
+    # DELETE SET NULL, but SQLite databases created before 0012 lack it)
+    db.session.execute(
+        update(Review).where(Review.booking_id == booking.id).values(booking_id=None)
+        .execution_options(synchronize_session=False)
+    )
+    deleted = db.session.execute(
+        delete(Booking).where(Booking.id == booking.id).execution_options(synchronize_session=False)
+    ).rowcount
+    if deleted != 1:
+        db.session.rollback()
+        return False
+    release_slots(experience_date_id, guests)
+    # A bulk delete skips the ORM events that keep the statistics counters
+    record_booking(db.session.connection(), booking, sign=-1)
+    db.session.commit()
+    return True
@@ -0,0 +1,255 @@
+"""Response cache for anonymous read endpoints.
+
+Entries are keyed by path, normalized query params and the generation of
+every group the view belongs to. Invalidating a group bumps its generation,
+so stale entries simply stop being addressed and age out of the backend.
+
+With a Compressor (compression.py) the cache keeps one entry per negotiated
+encoding and stores the body already compressed, so a hit is served as-is.
+
+Backends:
+- LocalBackend: in-process LRU with TTL (default for a single worker)
+- SharedBackend: any redis-like client (get/set/incr), shared by workers.
+  LocalSharedClient is an in-process stand-in for running without Redis.
+- NullBackend: caching off
+
+Generations live in the backend, so an invalidation only reaches the
+processes sharing it. With more than one web worker (WEB_WORKERS, set by
+gunicorn_config.py) the default backend is 'shared', and without Redis the
+cache is switched off rather than letting other workers serve stale
+listings until their TTL runs out. render.yaml provisions the Redis for
+this; its volatile-lru policy evicts cached entries (which carry a TTL)
+but never the generation counters.
+"""
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import request, make_response, Response
+
+from compression import negotiate
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+
+class LocalBackend:
+    name = 'local'
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    # Generations live outside the LRU so eviction can never roll one back
+    def counter(self, key):
+        return self._counters.get(key, 0)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class LocalSharedClient:
+    """Minimal in-process stand-in for the redis client API used below"""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ex if ex else None)
+
+    def incr(self, key):
+        with self._lock:
+            value, expires_at = self._data.get(key, (b'0', None))
+            value = str(int(value) + 1).encode()
+            self._data[key] = (value, expires_at)
+            return int(value)
+
+    def dbsize(self):
+        return len(self._data)
+
+
+class SharedBackend:
+    name = 'shared'
+
+    def __init__(self, client, prefix='digital-guides:cache:'):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return pickle.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=ttl)
+
+    def counter(self, key):
+        value = self.client.get(self.prefix + key)
+        return int(value) if value is not None else 0
+
+    def incr(self, key):
+        return self.client.incr(self.prefix + key)
+
+    def __len__(self):
+        return self.client.dbsize()
+
+
+class NullBackend:
+    name = 'off'
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl):
+        pass
+
+    def counter(self, key):
+        return 0
+
+    def incr(self, key):
+        return 0
+
+    def __len__(self):
+        return 0
+
+
+class ResponseCache:
+    def __init__(self, backend, ttl=60, compressor=None):
+        self.backend = backend
+        self.ttl = ttl
+        self.compressor = compressor
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @classmethod
+    def from_config(cls, config, compressor=None):
+        ttl = int(config.get('RESPONSE_CACHE_TTL', 60))
+        workers = int(config.get('WEB_WORKERS', 1))
+        backend = config.get('RESPONSE_CACHE_BACKEND') or ('shared' if workers > 1 else 'local')
+        redis_url = config.get('REDIS_URL')
+        if backend == 'shared' and redis_url and REDIS_AVAILABLE:
+            return cls(SharedBackend(redis.Redis.from_url(redis_url)), ttl, compressor)
+        if workers > 1:
+            print(f"⚠️ Response cache off: {workers} workers need Redis (REDIS_URL) to share invalidations")
+            return cls(NullBackend(), ttl, compressor)
+        if backend == 'shared':
+            print("⚠️ Redis not available, shared response cache uses a local stand-in")
+            return cls(SharedBackend(LocalSharedClient()), ttl, compressor)
+        return cls(LocalBackend(int(config.get('RESPONSE_CACHE_SIZE', 1024))), ttl, compressor)
+
+    def _generation(self, group):
+        return self.backend.counter(f'gen:{group}')
+
+    def _key(self, groups, encoding):
+        params = sorted((k, v) for k, v in request.args.items(multi=True) if v != '')
+        query = '&'.join(f'{k}={v}' for k, v in params)
+        generations = ','.join(f'{group}@{self._generation(group)}' for group in groups)
+        return f'{request.path}?{query}|{generations}|{encoding or "identity"}'
+
+    def _compress(self, response, encoding):
+        """Compress a fresh response once for storage; returns the encoding used"""
+        if (encoding is None or not self.compressor.eligible(response)
+                or len(response.get_data()) < self.compressor.min_size):
+            return None
+        response.set_data(self.compressor.compress(response.get_data(), encoding, cached=True))
+        response.headers['Content-Encoding'] = encoding
+        return encoding
+
+    def cached(self, *group_templates, bypass=None):
+        """Cache successful responses of a view.
+
+        Group templates are formatted with the view's URL arguments, e.g.
+        'availability:{experience_id}'. Requests for which `bypass()` returns
+        true go straight to the view.
+        """
+        def decorator(f):
+            @wraps(f)
+            def decorated(*args, **kwargs):
+                if bypass is not None and bypass():
+                    return f(*args, **kwargs)
+                groups = [template.format(**kwargs) for template in group_templates]
+                encoding = negotiate() if self.compressor is not None else None
+                key = self._key(groups, encoding)
+                entry = self.backend.get(key)
+                if entry is not None:
+                    self.hits += 1
+                    body, status, mimetype, content_encoding = entry
+                    response = Response(body, status=status, mimetype=mimetype)
+                    if content_encoding:
+                        response.headers['Content-Encoding'] = content_encoding
+                    response.headers['X-Cache'] = 'HIT'
+                    return response
+
+                self.misses += 1
+                response = make_response(f(*args, **kwargs))
+                if response.status_code == 200 and not response.is_streamed:
+                    content_encoding = self._compress(response, encoding)
+                    self.backend.set(key, (response.get_data(), response.status_code, response.mimetype,
+                                           content_encoding), self.ttl)
+                response.headers['X-Cache'] = 'MISS'
+                return response
+            return decorated
+        return decorator
+
+    def invalidate(self, *groups):
+        for group in groups:
+            self.backend.incr(f'gen:{group}')
+            self.invalidations += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'backend': self.backend.name,
+            'entries': len(self.backend),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+            'invalidations': self.invalidations
+        }
@@ -0,0 +1,127 @@
+"""Negotiated gzip/brotli compression for JSON responses.
+
+Catalog, booking and user listings run to hundreds of kilobytes of
+repetitive JSON that compresses 5-10x. An after_request hook compresses any JSON/text response of at
+least COMPRESS_MIN_SIZE bytes with the best encoding the client accepts
+(brotli when the `brotli` package is installed, else gzip), and streamed
+responses (NDJSON exports) are compressed chunk by chunk as they are sent.
+
+Cached views don't go through the hook: ResponseCache compresses a body once
+when it stores it and keeps one entry per encoding, so a hot catalog
+response is served as stored bytes. Responses that already carry a
+Content-Encoding are left alone.
+
+Config:
+    COMPRESS_MIN_SIZE      smallest body worth compressing (default 1024 bytes)
+    COMPRESS_LEVEL         gzip level per request (default 6)
+    COMPRESS_BROTLI_LEVEL  brotli quality per request (default 4)
+Cached bodies are compressed once, at gzip 9 / brotli 9.
+"""
+import gzip
+import zlib
+
+from flask import request
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'application/javascript')
+# Flush the stream every so much input so clients see rows while the export runs
+STREAM_FLUSH_BYTES = 64 * 1024
+
+
+def negotiate():
+    """The encoding to use for the current request, or None for identity"""
+    accepted = request.accept_encodings
+    if BROTLI_AVAILABLE and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def _compressible(response):
+    mimetype = response.mimetype or ''
+    return mimetype.startswith('text/') or mimetype in COMPRESSIBLE_TYPES
+
+
+class Compressor:
+    def __init__(self, app=None):
+        self.min_size = 1024
+        self.level = 6
+        self.brotli_level = 4
+        self.compressed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.min_size = int(app.config.get('COMPRESS_MIN_SIZE', 1024))
+        self.level = int(app.config.get('COMPRESS_LEVEL', 6))
+        self.brotli_level = int(app.config.get('COMPRESS_BROTLI_LEVEL', 4))
+        app.after_request(self.after_request)
+
+    def compress(self, data, encoding, cached=False):
+        """`data` compressed with `encoding`; cached bodies get the highest useful level"""
+        if encoding == 'br':
+            return brotli.compress(data, quality=9 if cached else self.brotli_level)
+        return gzip.compress(data, compresslevel=9 if cached else self.level, mtime=0)
+
+    def _stream(self, chunks, encoding):
+        if encoding == 'br':
+            compressor = brotli.Compressor(quality=self.brotli_level)
+            compress, flush, finish = compressor.process, compressor.flush, compressor.finish
+        else:
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)  # 31: gzip container
+            compress, finish = compressor.compress, compressor.flush
+            flush = lambda: compressor.flush(zlib.Z_SYNC_FLUSH)
+        pending = 0
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            output = compress(chunk)
+            pending += len(chunk)
+            if pending >= STREAM_FLUSH_BYTES:
+                output += flush()
+                pending = 0
+            if output:
+                yield output
+        yield finish()
+
+    def eligible(self, response):
+        return (response.status_code == 200 and _compressible(response)
+                and 'Content-Encoding' not in response.headers and not response.direct_passthrough)
+
+    def after_request(self, response):
+        if _compressible(response) or response.status_code == 304:
+            response.vary.add('Accept-Encoding')
+        if not self.eligible(response):
+            return response
+        encoding = negotiate()
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = self._stream(response.response, encoding)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < self.min_size:
+                return response
+            response.set_data(self.compress(data, encoding))
+            self.compressed += 1
+            self.bytes_in += len(data)
+            self.bytes_out += response.content_length
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    def stats(self):
+        return {
+            'encodings': ['br', 'gzip'] if BROTLI_AVAILABLE else ['gzip'],
+            'compressed': self.compressed,
+            'ratio': round(self.bytes_in / self.bytes_out, 2) if self.bytes_out else None
+        }
@@ -0,0 +1,80 @@
+"""Conditional GET (ETag / Last-Modified) for catalog resources.
+
+Validators come from a cheap aggregate query (row count and max(updated_at))
+instead of the serialized body, so a 304 skips to_dict() and jsonify
+entirely. The negotiated Content-Encoding is part of the ETag, since gzip and
+brotli bodies are different bytes.
+
+HTTP dates only have whole seconds. A Last-Modified from the same second as
+the response could also describe an edit that lands later in that second,
+so (as RFC 9110 8.8.2.2 suggests) it is left off until the second is over;
+those clients revalidate with the ETag alone.
+"""
+import hashlib
+from datetime import datetime
+from functools import wraps
+from flask import request, make_response, Response
+from sqlalchemy import func
+
+from compression import negotiate
+from models import db, Experience, ExperienceDate
+
+
+def experiences_fingerprint():
+    return db.session.query(func.count(Experience.id), func.max(Experience.updated_at)).filter(
+        Experience.is_approved == True,
+        Experience.is_active == True
+    ).one()
+
+def experience_fingerprint(experience_id):
+    row = db.session.query(Experience.id, Experience.updated_at).filter_by(id=experience_id).first()
+    return tuple(row) if row else None
+
+def availability_fingerprint(experience_id):
+    return db.session.query(func.count(ExperienceDate.id), func.max(ExperienceDate.updated_at)).filter(
+        ExperienceDate.experience_id == experience_id
+    ).one()
+
+
+def conditional(fingerprint):
+    """Answer 304 when the client's validators still match.
+
+    `fingerprint(**view_kwargs)` returns a (count_or_id, last_modified) pair,
+    or None to let the view produce its own 404.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            state = fingerprint(**kwargs)
+            if state is None:
+                return f(*args, **kwargs)
+
+            identity, last_modified = state
+            validator = '|'.join([
+                request.full_path,
+                request.headers.get('Accept', ''),
+                negotiate() or 'identity',
+                str(identity),
+                last_modified.isoformat() if last_modified else ''
+            ])
+            etag = hashlib.sha1(validator.encode()).hexdigest()
+            if last_modified is not None:
+                last_modified = last_modified.replace(microsecond=0)
+                if last_modified >= datetime.utcnow().replace(microsecond=0):
+                    last_modified = None  # the second isn't over, later edits would share it
+
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains(etag)
+            else:
+                not_modified = (last_modified is not None and request.if_modified_since is not None
+                                and last_modified <= request.if_modified_since.replace(tzinfo=None))
+
+            response = Response(status=304) if not_modified else make_response(f(*args, **kwargs))
+            if response.status_code in (200, 304):
+                response.set_etag(etag)
+                if last_modified:
+                    response.last_modified = last_modified
+                response.cache_control.no_cache = True
+            return response
+        return decorated
+    return decorator
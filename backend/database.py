@@ -0,0 +1,104 @@
+"""Engine configuration for Postgres (Render) and SQLite (local).
+
+Postgres gets an explicit QueuePool sized to the gunicorn worker's
+concurrency (DB_POOL_SIZE / DB_MAX_OVERFLOW, exported by gunicorn_config.py),
+pre-ping and recycling so connections dropped by the server are replaced
+before a request trips on them.
+
+SQLite connections switch to WAL with synchronous=NORMAL, so readers never
+block the writer, and wait on a busy timeout instead of failing with
+"database is locked".
+
+Both use TimedQueuePool, which records how long each checkout waited for a
+connection. Rising wait times show pool starvation well before requests
+start failing with pool timeouts; see pool_stats() and /api/health.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+# Checkouts slower than this count as starved
+SLOW_CHECKOUT_MS = float(os.getenv('DB_SLOW_CHECKOUT_MS', 50))
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that measures how long callers wait for a connection"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.slow_checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except Exception:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            with self._stats_lock:
+                self.checkouts += 1
+                self.total_wait += waited
+                self.max_wait = max(self.max_wait, waited)
+                if waited * 1000 >= SLOW_CHECKOUT_MS:
+                    self.slow_checkouts += 1
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'size': self.size(),
+                'checked_out': self.checkedout(),
+                'overflow': max(self.overflow(), 0),
+                'checkouts': self.checkouts,
+                'avg_wait_ms': round(self.total_wait * 1000 / self.checkouts, 3) if self.checkouts else 0,
+                'max_wait_ms': round(self.max_wait * 1000, 1),
+                'slow_checkouts': self.slow_checkouts,
+                'timeouts': self.timeouts
+            }
+
+
+def engine_options(database_uri):
+    """SQLALCHEMY_ENGINE_OPTIONS for the configured database"""
+    if database_uri in ('sqlite://', 'sqlite:///:memory:'):
+        return {}  # in-memory databases live in a single connection
+    options = {
+        'poolclass': TimedQueuePool,
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 2)),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 10))
+    }
+    if not database_uri.startswith('sqlite'):
+        options['pool_pre_ping'] = True
+        options['pool_recycle'] = int(os.getenv('DB_POOL_RECYCLE', 1800))
+    return options
+
+
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute(f"PRAGMA busy_timeout={int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))}")
+    cursor.execute(f"PRAGMA mmap_size={int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))}")
+    cursor.close()
+
+
+def pool_stats(engine):
+    pool = engine.pool
+    if isinstance(pool, TimedQueuePool):
+        return pool.stats()
+    return {'class': type(pool).__name__}
@@ -0,0 +1,231 @@
+"""Coordinates for experiences and "near a point" search.
+
+Experience.latitude/longitude are filled from a small gazetteer of Kenyan
+places when an experience is saved without coordinates: the longest
+gazetteer name found in the free-text location wins, so 'Maasai Mara
+National Reserve' and 'Camp near Maasai Mara' both resolve. Experiences in
+unknown places keep NULL coordinates and never match a radius search.
+
+Radius search narrows candidates with a spatial index, then filters and
+sorts on distance:
+- SQLite: an R-tree (experiences_rtree) kept in sync by triggers
+- Postgres: a GiST index over ll_to_earth() from cube/earthdistance, or a
+  plain (latitude, longitude) B-tree box scan if those extensions can't be
+  installed
+Distances use an equirectangular approximation (plain arithmetic, so it
+runs in any SQL dialect). Within a few hundred km of the equator it is off
+by well under 1%.
+
+    python geo.py --rebuild    # geocode every experience without coordinates
+"""
+import math
+import re
+import sys
+import time
+
+from sqlalchemy import event, func, inspect, select, table, column, update
+
+from models import db, Experience
+
+KM_PER_DEGREE_LAT = 110.574
+KM_PER_DEGREE_LNG = 111.320  # at the equator, times cos(latitude)
+DEFAULT_RADIUS_KM = 50
+MAX_RADIUS_KM = 1000
+
+# name: (latitude, longitude)
+GAZETTEER = {
+    'nairobi': (-1.2864, 36.8172),
+    'karen': (-1.3197, 36.7076),
+    'kiambu': (-1.1714, 36.8356),
+    'limuru': (-1.1136, 36.6422),
+    'thika': (-1.0333, 37.0693),
+    'machakos': (-1.5177, 37.2634),
+    'mombasa': (-4.0435, 39.6682),
+    'diani': (-4.3167, 39.5667),
+    'diani beach': (-4.3167, 39.5667),
+    'shimba hills': (-4.2500, 39.4167),
+    'wasini': (-4.6587, 39.3735),
+    'kilifi': (-3.6305, 39.8499),
+    'watamu': (-3.3540, 40.0240),
+    'malindi': (-3.2192, 40.1169),
+    'lamu': (-2.2717, 40.9020),
+    'voi': (-3.3961, 38.5561),
+    'tsavo': (-2.9000, 38.5000),
+    'tsavo east': (-2.7833, 38.7667),
+    'tsavo west': (-3.0500, 38.1000),
+    'chyulu hills': (-2.6167, 37.8500),
+    'amboseli': (-2.6527, 37.2606),
+    'maasai mara': (-1.4900, 35.1439),
+    'masai mara': (-1.4900, 35.1439),
+    'narok': (-1.0800, 35.8700),
+    'naivasha': (-0.7167, 36.4333),
+    'lake naivasha': (-0.7667, 36.3500),
+    'hells gate': (-0.9000, 36.3167),
+    'nakuru': (-0.3031, 36.0800),
+    'lake nakuru': (-0.3667, 36.0833),
+    'lake bogoria': (0.2500, 36.1000),
+    'lake baringo': (0.6333, 36.0833),
+    'aberdare': (-0.4167, 36.6667),
+    'nyeri': (-0.4201, 36.9476),
+    'nanyuki': (0.0167, 37.0667),
+    'ol pejeta': (-0.0167, 36.9667),
+    'mount kenya': (-0.1521, 37.3084),
+    'mt kenya': (-0.1521, 37.3084),
+    'laikipia': (0.3000, 36.9000),
+    'lewa': (0.2000, 37.4333),
+    'isiolo': (0.3546, 37.5822),
+    'samburu': (0.5667, 37.5333),
+    'buffalo springs': (0.5333, 37.6000),
+    'shaba': (0.6667, 37.8333),
+    'meru': (0.0470, 37.6490),
+    'meru national park': (0.0833, 38.2000),
+    'marsabit': (2.3333, 37.9833),
+    'lake turkana': (3.5000, 36.0000),
+    'lodwar': (3.1191, 35.5973),
+    'garissa': (-0.4532, 39.6461),
+    'kericho': (-0.3689, 35.2863),
+    'eldoret': (0.5143, 35.2698),
+    'kitale': (1.0154, 35.0062),
+    'saiwa swamp': (1.0989, 35.1186),
+    'mount elgon': (1.1333, 34.5500),
+    'kakamega': (0.2827, 34.7519),
+    'kakamega forest': (0.2833, 34.8667),
+    'kisumu': (-0.0917, 34.7680),
+    'homa bay': (-0.5273, 34.4571),
+    'ruma': (-0.6333, 34.2667),
+    'mfangano': (-0.4667, 34.0000),
+}
+
+
+class InvalidLocation(ValueError):
+    pass
+
+
+def _normalize(name):
+    return ' '.join(re.findall(r'[a-z0-9]+', name.lower().replace("'", '')))
+
+# Longest names first, so 'lake nakuru' wins over 'nakuru'
+_PLACES = sorted(((f' {name} ', point) for name, point in GAZETTEER.items()), key=lambda item: -len(item[0]))
+
+
+def geocode(location):
+    """(latitude, longitude) of the gazetteer place named in `location`, or None"""
+    if not location:
+        return None
+    text = f' {_normalize(location)} '
+    for name, point in _PLACES:
+        if name in text:
+            return point
+    return None
+
+
+@event.listens_for(Experience, 'before_insert')
+@event.listens_for(Experience, 'before_update')
+def _locate(mapper, connection, experience):
+    state = inspect(experience)
+    # A new location without new coordinates means the old ones are stale
+    moved = (state.has_identity and state.attrs.location.history.has_changes()
+             and not state.attrs.latitude.history.has_changes())
+    if experience.latitude is None or experience.longitude is None or moved:
+        point = geocode(experience.location)
+        if point is not None or moved:
+            experience.latitude, experience.longitude = point or (None, None)
+
+
+def rebuild(connection):
+    """Geocode experiences without coordinates, one UPDATE per distinct location"""
+    located = Experience.latitude.is_(None)
+    for (location,) in connection.execute(select(Experience.location).where(located).distinct()).all():
+        point = geocode(location)
+        if point is not None:
+            connection.execute(update(Experience).where(Experience.location == location, located).values(
+                latitude=point[0], longitude=point[1]
+            ))
+
+
+# Radius search
+
+_spatial_backend = {}
+# A missing index may just not be migrated yet, so "none" is only trusted this long
+NO_BACKEND_RECHECK = 60
+
+def spatial_backend():
+    """'rtree', 'earthdistance' or None (B-tree box scan), looked up once per database (None is rechecked)"""
+    url = str(db.engine.url)
+    cached = _spatial_backend.get(url)
+    if cached is None or (cached[0] is None and time.monotonic() - cached[1] > NO_BACKEND_RECHECK):
+        inspector = inspect(db.engine)
+        if db.engine.dialect.name == 'postgresql':
+            indexes = {index['name'] for index in inspector.get_indexes('experiences')}
+            backend = 'earthdistance' if 'ix_experiences_earth' in indexes else None
+        else:
+            backend = 'rtree' if inspector.has_table('experiences_rtree') else None
+        _spatial_backend[url] = cached = (backend, time.monotonic())
+    return cached[0]
+
+
+def parse_near(args):
+    """(latitude, longitude, radius_km) from ?lat=&lng=&radius_km=, or None"""
+    if not args.get('lat') and not args.get('lng'):
+        return None
+    try:
+        latitude, longitude = float(args['lat']), float(args['lng'])
+        radius = float(args.get('radius_km') or DEFAULT_RADIUS_KM)
+    except (KeyError, ValueError):
+        raise InvalidLocation('lat and lng must both be numbers')
+    if not -90 <= latitude <= 90 or not -180 <= longitude <= 180:
+        raise InvalidLocation('lat/lng out of range')
+    if not 0 < radius <= MAX_RADIUS_KM:
+        raise InvalidLocation(f'radius_km must be between 0 and {MAX_RADIUS_KM}')
+    return latitude, longitude, radius
+
+
+def distance_squared(latitude, longitude):
+    """SQL expression: squared distance in km² from the point to each experience"""
+    km_per_lng = KM_PER_DEGREE_LNG * math.cos(math.radians(latitude))
+    dy = (Experience.latitude - latitude) * KM_PER_DEGREE_LAT
+    dx = (Experience.longitude - longitude) * km_per_lng
+    return dx * dx + dy * dy
+
+
+def filter_near(query, near):
+    """Keep experiences within radius_km of the point, using the spatial index"""
+    latitude, longitude, radius = near
+    dlat = radius / KM_PER_DEGREE_LAT
+    dlng = radius / (KM_PER_DEGREE_LNG * max(math.cos(math.radians(latitude)), 0.01))
+
+    backend = spatial_backend()
+    if backend == 'rtree':
+        rtree = table('experiences_rtree', column('id'), column('min_lat'), column('max_lat'),
+                      column('min_lng'), column('max_lng'))
+        query = query.join(rtree, rtree.c.id == Experience.id).filter(
+            rtree.c.min_lat <= latitude + dlat, rtree.c.max_lat >= latitude - dlat,
+            rtree.c.min_lng <= longitude + dlng, rtree.c.max_lng >= longitude - dlng
+        )
+    elif backend == 'earthdistance':
+        earth = func.ll_to_earth(Experience.latitude, Experience.longitude)
+        box = func.earth_box(func.ll_to_earth(latitude, longitude), radius * 1000)
+        query = query.filter(box.op('@>')(earth))
+    else:
+        query = query.filter(
+            Experience.latitude.between(latitude - dlat, latitude + dlat),
+            Experience.longitude.between(longitude - dlng, longitude + dlng)
+        )
+    return query.filter(distance_squared(latitude, longitude) <= radius * radius)
+
+
+def order_by_distance(query, near):
+    latitude, longitude, _ = near
+    return query.order_by(distance_squared(latitude, longitude), Experience.id)
+
+
+if __name__ == '__main__':
+    from app import app
+
+    if '--rebuild' not in sys.argv[1:]:
+        sys.exit('usage: python geo.py --rebuild')
+    with app.app_context():
+        with db.engine.begin() as connection:
+            rebuild(connection)
+        located = Experience.query.filter(Experience.latitude.isnot(None)).count()
+        print(f"✅ Geocoded {located} of {Experience.query.count()} experiences")
@@ -1,4 +1,60 @@
-bind = "0.0.0.0:10000"
-workers = 2
-timeout = 120
+"""Gunicorn settings, derived from the machine's CPU count.
 
+    gunicorn -c gunicorn_config.py app:app
+
+GUNICORN_WORKER_CLASS picks the serving mode:
+- gthread (default): each worker serves GUNICORN_THREADS requests at once,
+  so a slow Cloudinary upload or bcrypt check only holds one thread
+- gevent: cooperative greenlets for very high connection counts; needs
+  `gevent` and, on Postgres, `psycogreen`
+- sync: one request per worker, the old behaviour
+
+Every concurrent request may hold a database connection, so the SQLAlchemy
+pool of each worker is sized to its concurrency (see database.py).
+"""
+import multiprocessing
+import os
+
+cores = multiprocessing.cpu_count()
+
+bind = f"0.0.0.0:{os.getenv('PORT', '10000')}"
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.getenv('WEB_CONCURRENCY', min(cores + 1, 8)))
+threads = int(os.getenv('GUNICORN_THREADS', 8)) if worker_class == 'gthread' else 1
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 100))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers now and then so slow leaks can't accumulate
+max_requests = 2000
+max_requests_jitter = 200
+
+# Read by app.py when each worker imports it (the app is not preloaded).
+# One pooled connection per thread; greenlets share a capped pool and wait
+# for a free connection instead of overrunning the database's limit.
+concurrency = worker_connections if worker_class == 'gevent' else threads
+os.environ.setdefault('DB_POOL_SIZE', str(min(concurrency, 10)))
+os.environ.setdefault('DB_MAX_OVERFLOW', '2')
+# Per-process caches can't see each other's invalidations (cache.py)
+os.environ['WEB_WORKERS'] = str(workers)
+# Workers share the cores for bcrypt instead of each starting cores processes
+os.environ.setdefault('PASSWORD_HASH_WORKERS', str(max(1, cores // workers)))
+
+
+def post_fork(server, worker):
+    if worker_class == 'gevent':
+        try:
+            from psycogreen.gevent import patch_psycopg
+            patch_psycopg()
+        except ImportError:
+            print("⚠️ psycogreen not available, Postgres calls will block the gevent hub")
+
+
+def post_worker_init(worker):
+    # Pick up uploads whose transfer died with a previous worker (uploads.py)
+    from app import app, upload_pipeline
+    with app.app_context():
+        requeued, failed = upload_pipeline.recover()
+    if requeued or failed:
+        print(f"🖼️  Recovered uploads: {requeued} requeued, {failed} failed")
@@ -0,0 +1,231 @@
+"""Resized image variants for catalog listings.
+
+Every upload is turned into a `thumb` and a `card` variant (WebP, plus AVIF
+when IMAGE_VARIANT_FORMATS asks for it and Pillow supports it), once, in the
+upload worker. Variant files live in a disk cache named by content hash and
+are served from /api/images/<name> with a long-lived immutable Cache-Control.
+
+The cache is bounded by IMAGE_CACHE_MAX_BYTES and evicts the least recently
+served files first. Each variant also leaves a small index entry naming its
+source image and settings, so an evicted file is rebuilt on its next request
+instead of turning into a 404. If the source can't be fetched either, the
+request is redirected to the original image.
+
+Each web worker tracks the cache size from its own writes and rescans the
+directory at least every SCAN_INTERVAL seconds, so with several workers the
+cache can overshoot its budget by what they write in that interval.
+"""
+import hashlib
+import io
+import os
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+
+try:
+    from PIL import Image, ImageOps, features
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+    print("⚠️ Pillow not available, image variants disabled")
+
+# name: (width, height); images are cropped to fill the box
+VARIANTS = {
+    'thumb': (320, 240),
+    'card': (800, 600),
+}
+QUALITY = {'webp': 80, 'avif': 55}
+MAX_SOURCE_BYTES = 20 * 1024 * 1024
+SOURCE_TIMEOUT = 3  # seconds a request waits for the source of an evicted variant
+SCAN_INTERVAL = 60
+# What VariantCache.put names files; anything else (e.g. 'index') is not a variant
+VARIANT_NAME = re.compile(r'[0-9a-f]{32}\.(?:%s)' % '|'.join(QUALITY))
+
+
+def supported_formats(requested):
+    if not PIL_AVAILABLE:
+        return []
+    formats = []
+    for image_format in requested:
+        if image_format in QUALITY and features.check(image_format):
+            formats.append(image_format)
+        else:
+            print(f"⚠️ Image variant format {image_format} not supported, skipping")
+    return formats
+
+
+def render_variant(source, size, image_format):
+    """Encode `source` (a path or file object) cropped to `size`"""
+    with Image.open(source) as image:
+        image.draft('RGB', (size[0] * 2, size[1] * 2))  # JPEGs decode at reduced scale
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+        variant = ImageOps.fit(image, size, Image.LANCZOS)
+        options = {'quality': QUALITY[image_format]}
+        if image_format == 'webp':
+            options['method'] = 4
+        output = io.BytesIO()
+        variant.save(output, image_format.upper(), **options)
+        return output.getvalue()
+
+
+class VariantCache:
+    """Content-addressed files on disk with size-bounded LRU eviction"""
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.index_root = os.path.join(root, 'index')
+        self.max_bytes = max_bytes
+        self._size = None
+        self._scanned_at = 0.0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def _scan(self):
+        """Refresh the size from disk, which other workers write to as well"""
+        if self._size is None or time.monotonic() - self._scanned_at > SCAN_INTERVAL:
+            os.makedirs(self.index_root, exist_ok=True)
+            self._size = sum(entry.stat().st_size for entry in os.scandir(self.root) if entry.is_file())
+            self._scanned_at = time.monotonic()
+
+    def put(self, data, extension, source):
+        name = f"{hashlib.sha256(data).hexdigest()[:32]}.{extension}"
+        with self._lock:
+            self._scan()
+            path = os.path.join(self.root, name)
+            if not os.path.exists(path):
+                with open(path, 'wb') as f:
+                    f.write(data)
+                self._size += len(data)
+            with open(os.path.join(self.index_root, name), 'w') as f:
+                f.write(source)
+            self._evict()
+        return name
+
+    def get(self, name):
+        """Path of a cached file, marked as recently used, or None"""
+        if not VARIANT_NAME.fullmatch(name):
+            return None
+        path = os.path.join(self.root, name)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def source(self, name):
+        if not VARIANT_NAME.fullmatch(name):
+            return None
+        try:
+            with open(os.path.join(self.index_root, name)) as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def restore(self, name, data):
+        with self._lock:
+            self._scan()
+            path = os.path.join(self.root, name)
+            with open(path, 'wb') as f:
+                f.write(data)
+            self._size += len(data)
+            self._evict()
+        return path
+
+    def _evict(self):
+        if self._size <= self.max_bytes:
+            return
+        files = sorted(
+            (entry for entry in os.scandir(self.root) if entry.is_file()),
+            key=lambda entry: entry.stat().st_mtime
+        )
+        for entry in files:
+            if self._size <= self.max_bytes:
+                break
+            try:
+                size = entry.stat().st_size
+                os.unlink(entry.path)
+            except FileNotFoundError:
+                continue  # evicted by another worker
+            self._size -= size
+            self.evictions += 1
+
+    def stats(self):
+        return {'bytes': self._size, 'max_bytes': self.max_bytes, 'evictions': self.evictions}
+
+
+class ImageVariants:
+    """Variant generation and serving, configured like a Flask extension.
+
+    Config:
+        IMAGE_CACHE_DIR        variant cache directory (instance/image-cache)
+        IMAGE_CACHE_MAX_BYTES  cache budget before LRU eviction (500 MB)
+        IMAGE_VARIANT_FORMATS  comma separated, e.g. 'webp,avif' (webp)
+    """
+
+    def __init__(self, app=None):
+        self.cache = None
+        self.formats = []
+        self.local_sources = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        root = app.config.get('IMAGE_CACHE_DIR') or os.path.join(app.instance_path, 'image-cache')
+        self.cache = VariantCache(root, int(app.config.get('IMAGE_CACHE_MAX_BYTES', 500 * 1024 * 1024)))
+        self.formats = supported_formats(app.config.get('IMAGE_VARIANT_FORMATS', 'webp').split(','))
+
+    @property
+    def enabled(self):
+        return bool(self.formats)
+
+    def render(self, path):
+        """Encode every variant of the image at `path` as [(variant, format, bytes)]"""
+        return [
+            (variant, image_format, render_variant(path, size, image_format))
+            for variant, size in VARIANTS.items()
+            for image_format in self.formats
+        ]
+
+    def save(self, rendered, source_url):
+        """Cache rendered variants of `source_url`.
+
+        Returns {'thumb': {'webp': url, ...}, 'card': {...}}
+        """
+        variants = {}
+        for variant, image_format, data in rendered:
+            name = self.cache.put(data, image_format, f'{source_url}\n{variant}\n{image_format}')
+            variants.setdefault(variant, {})[image_format] = f'/api/images/{name}'
+        return variants
+
+    def path(self, name):
+        """File for a variant name, rebuilt from its source if it was evicted"""
+        path = self.cache.get(name)
+        if path is not None or not self.enabled:
+            return path
+        entry = self.cache.source(name)
+        if entry is None:
+            return None
+        source_url, variant, image_format = entry.split('\n')
+        try:
+            data = render_variant(io.BytesIO(self._load_source(source_url)), VARIANTS[variant], image_format)
+        except (urllib.error.URLError, OSError, ValueError, Image.DecompressionBombError) as e:
+            print(f"⚠️ Could not rebuild image variant {name} from {source_url}: {e}")
+            return None
+        return self.cache.restore(name, data)
+
+    def source_url(self, name):
+        """The original image a variant was made from, or None"""
+        entry = self.cache.source(name)
+        return entry.split('\n')[0] if entry else None
+
+    def _load_source(self, url):
+        for prefix, root in self.local_sources.items():
+            if url.startswith(prefix + '/'):
+                with open(os.path.join(root, os.path.basename(url)), 'rb') as f:
+                    return f.read()
+        with urllib.request.urlopen(url, timeout=SOURCE_TIMEOUT) as response:
+            return response.read(MAX_SOURCE_BYTES)
@@ -0,0 +1,190 @@
+"""Durable background jobs, stored in the application database.
+
+Request handlers call enqueue() before their own commit, so a job exists if
+and only if the change that caused it was saved, and costs the request one
+INSERT. A worker process claims due jobs and runs the registered handler:
+
+- a failing job is retried with exponential backoff and jitter up to its
+  max_attempts, then kept as 'failed' with its last error;
+- handlers registered with batch=True get every queued job sharing a
+  batch_key in one call (e.g. all pending notifications for one guide);
+  batch_window delays new jobs so related work has time to pile up;
+- jobs held by a worker that died are re-queued after LOCK_TIMEOUT.
+
+Claiming is a conditional UPDATE tagged with a per-claim token, so any
+number of workers can share the queue on Postgres and SQLite alike.
+
+    python worker.py           # run a worker until interrupted
+    python worker.py --once    # run the jobs that are due, then exit
+"""
+import json
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, func, or_, update, delete
+
+from models import db, Job, JobStatus
+
+BACKOFF_BASE = 5          # seconds before the first retry
+BACKOFF_MAX = 3600
+LOCK_TIMEOUT = timedelta(minutes=5)
+RETENTION = timedelta(days=int(os.getenv('JOBS_RETENTION_DAYS', 7)))
+
+Handler = namedtuple('Handler', 'fn batch batch_window max_attempts')
+HANDLERS = {}
+
+
+def handler(kind, batch=False, batch_window=0, max_attempts=5):
+    """Register the function that runs jobs of `kind`.
+
+    Batch handlers are called with a list of payloads, others with one.
+    """
+    def register(fn):
+        HANDLERS[kind] = Handler(fn, batch, batch_window, max_attempts)
+        return fn
+    return register
+
+
+def enqueue(kind, payload, batch_key=None, delay=None):
+    """Add a job to the current session; it is saved by the caller's commit"""
+    spec = HANDLERS[kind]
+    delay = spec.batch_window if delay is None else delay
+    job = Job(
+        kind=kind,
+        payload=json.dumps(payload),
+        batch_key=batch_key,
+        max_attempts=spec.max_attempts,
+        run_at=datetime.utcnow() + timedelta(seconds=delay)
+    )
+    db.session.add(job)
+    return job
+
+
+def backoff(attempts):
+    delay = min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+    return timedelta(seconds=delay * random.uniform(0.5, 1.0))
+
+
+def queue_stats():
+    counts = dict(db.session.query(Job.status, func.count(Job.id)).group_by(Job.status).all())
+    return {status.value: counts.get(status, 0) for status in JobStatus}
+
+
+class Worker:
+    def __init__(self, batch_size=50, poll_interval=1.0):
+        self.name = f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident() % 10000}'
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.stopping = False
+        self.processed = 0
+        self._last_prune = 0.0
+
+    def claim(self):
+        """Mark due jobs (and the rest of their batches) as ours"""
+        now = datetime.utcnow()
+        token = f'{self.name}:{uuid.uuid4().hex[:12]}'
+        db.session.execute(
+            update(Job)
+            .where(Job.status == JobStatus.RUNNING, Job.locked_at < now - LOCK_TIMEOUT)
+            .values(status=JobStatus.QUEUED, locked_by=None)
+        )
+        due = db.session.query(Job.id, Job.kind, Job.batch_key).filter(
+            Job.status == JobStatus.QUEUED, Job.run_at <= now
+        ).order_by(Job.run_at).limit(self.batch_size).all()
+        if not due:
+            db.session.commit()
+            return []
+
+        wanted = Job.id.in_([row.id for row in due])
+        for kind, batch_key in {(row.kind, row.batch_key) for row in due if row.batch_key}:
+            if kind in HANDLERS and HANDLERS[kind].batch:
+                wanted = or_(wanted, and_(Job.kind == kind, Job.batch_key == batch_key))
+        db.session.execute(
+            update(Job)
+            .where(Job.status == JobStatus.QUEUED, wanted)
+            .values(status=JobStatus.RUNNING, locked_by=token, locked_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        return Job.query.filter_by(locked_by=token, status=JobStatus.RUNNING).order_by(Job.id).all()
+
+    def run_once(self):
+        """Run one round of due jobs. Returns how many were claimed."""
+        jobs = self.claim()
+        groups = {}
+        for job in jobs:
+            spec = HANDLERS.get(job.kind)
+            key = (job.kind, job.batch_key) if spec and spec.batch and job.batch_key else (job.kind, job.id)
+            groups.setdefault(key, []).append(job)
+        for (kind, _), group in groups.items():
+            self._run(kind, group)
+        self.processed += len(jobs)
+        return len(jobs)
+
+    def _run(self, kind, jobs):
+        spec = HANDLERS.get(kind)
+        try:
+            if spec is None:
+                raise LookupError(f'No handler registered for {kind} jobs')
+            payloads = [json.loads(job.payload) for job in jobs]
+            spec.fn(payloads) if spec.batch else spec.fn(payloads[0])
+            for job in jobs:
+                job.status = JobStatus.DONE
+                job.attempts += 1
+                job.locked_by = None
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            error = f'{type(e).__name__}: {e}'
+            for job in jobs:
+                job.attempts += 1
+                job.last_error = error[:2000]
+                job.locked_by = None
+                if job.attempts >= job.max_attempts:
+                    job.status = JobStatus.FAILED
+                    print(f"❌ Job {job.id} ({kind}) failed for good: {error}")
+                else:
+                    job.status = JobStatus.QUEUED
+                    job.run_at = datetime.utcnow() + backoff(job.attempts)
+            db.session.commit()
+
+    def prune(self):
+        """Forget finished jobs after RETENTION"""
+        db.session.execute(delete(Job).where(
+            Job.status == JobStatus.DONE, Job.updated_at < datetime.utcnow() - RETENTION
+        ))
+        db.session.commit()
+
+    def run_forever(self):
+        print(f"👷 Job worker {self.name} started ({', '.join(sorted(HANDLERS))})")
+        while not self.stopping:
+            try:
+                claimed = self.run_once()
+                if time.monotonic() - self._last_prune > 3600:
+                    self.prune()
+                    self._last_prune = time.monotonic()
+            except Exception as e:
+                db.session.rollback()
+                print(f"⚠️ Job worker error: {e}")
+                claimed = 0
+            if not claimed:
+                time.sleep(self.poll_interval)
+            db.session.remove()
+        print(f"👋 Job worker {self.name} stopped after {self.processed} jobs")
+
+
+def start_worker_thread(app):
+    """Run a worker inside the web process, for development without `python worker.py`"""
+    def run():
+        with app.app_context():
+            Worker().run_forever()
+    thread = threading.Thread(target=run, name='job-worker', daemon=True)
+    thread.start()
+    return thread
+
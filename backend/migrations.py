@@ -0,0 +1,489 @@
+"""Versioned schema migrations.
+
+db.create_all() only creates missing tables, so anything that has to reach
+an existing database (indexes, new columns, backfills) is written here as a
+numbered step. Applied versions are recorded in `schema_migrations`.
+
+    python migrations.py            # apply pending migrations
+    python migrations.py down 0001  # roll back one migration
+"""
+import json
+import sys
+from datetime import datetime, timedelta
+from sqlalchemy import inspect, text
+
+from models import db
+
+
+def _true(conn):
+    """Boolean literal as the dialect renders `column == True`"""
+    return '1' if conn.dialect.name == 'sqlite' else 'true'
+
+
+# 0001 - indexes for the search, availability and booking hot paths
+
+def _search_and_booking_indexes(conn):
+    true = _true(conn)
+    bookable = f"is_approved = {true} AND is_active = {true}"
+    open_date = f"is_available = {true} AND available_slots > 0"
+    return {
+        # search_experiences / get_experiences: only approved, active rows are listed
+        'ix_experiences_listed_category_price': f"experiences (category, price_per_person) WHERE {bookable}",
+        'ix_experiences_listed_location': f"experiences (location) WHERE {bookable}",
+        'ix_experiences_listed_price': f"experiences (price_per_person) WHERE {bookable}",
+        'ix_experiences_guide_id': "experiences (guide_id)",
+        # get_availability: one experience, a date range, bookable slots only
+        'ix_experience_dates_open_by_experience': f"experience_dates (experience_id, date) WHERE {open_date}",
+        # search_experiences?date=: every experience open on one date
+        'ix_experience_dates_open_by_date': f"experience_dates (date, experience_id) WHERE {open_date}",
+        # my-bookings (keyset on id), cancellations and admin lookups
+        'ix_bookings_traveler_id': "bookings (traveler_id, id)",
+        'ix_bookings_experience_id': "bookings (experience_id)",
+        'ix_bookings_experience_date_id': "bookings (experience_date_id)",
+    }
+
+def upgrade_0001(conn):
+    for name, definition in _search_and_booking_indexes(conn).items():
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {definition}"))
+
+def downgrade_0001(conn):
+    for name in _search_and_booking_indexes(conn):
+        conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+
+# 0002 - full-text search over experience text
+#
+# Postgres gets a generated tsvector column with a GIN index; SQLite gets an
+# external-content FTS5 table kept in sync by triggers. Either way the index
+# follows every insert/update/delete of experiences without app code.
+
+FTS_COLUMNS = ['title', 'short_description', 'description', 'category', 'location']
+
+def _sqlite_has_fts5(conn):
+    options = {row[0] for row in conn.execute(text("PRAGMA compile_options"))}
+    return 'ENABLE_FTS5' in options
+
+def upgrade_0002(conn):
+    if conn.dialect.name == 'postgresql':
+        conn.execute(text(
+            "ALTER TABLE experiences ADD COLUMN IF NOT EXISTS search_vector tsvector "
+            "GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(category, '') || ' ' || coalesce(location, '')), 'B') || "
+            "setweight(to_tsvector('english', coalesce(short_description, '')), 'C') || "
+            "setweight(to_tsvector('english', coalesce(description, '')), 'D')"
+            ") STORED"
+        ))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_experiences_search_vector ON experiences USING GIN (search_vector)"
+        ))
+        return
+    if conn.dialect.name != 'sqlite' or not _sqlite_has_fts5(conn):
+        print("⚠️ Full-text search not supported by this database, q= falls back to LIKE")
+        return
+
+    columns = ', '.join(FTS_COLUMNS)
+    new_values = ', '.join(f"new.{column}" for column in FTS_COLUMNS)
+    old_values = ', '.join(f"old.{column}" for column in FTS_COLUMNS)
+    conn.execute(text(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS experiences_fts USING fts5("
+        f"{columns}, content='experiences', content_rowid='id', tokenize='porter unicode61')"
+    ))
+    conn.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS experiences_fts_insert AFTER INSERT ON experiences BEGIN "
+        f"INSERT INTO experiences_fts(rowid, {columns}) VALUES (new.id, {new_values}); END"
+    ))
+    conn.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS experiences_fts_delete AFTER DELETE ON experiences BEGIN "
+        f"INSERT INTO experiences_fts(experiences_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values}); END"
+    ))
+    conn.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS experiences_fts_update AFTER UPDATE ON experiences BEGIN "
+        f"INSERT INTO experiences_fts(experiences_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values}); "
+        f"INSERT INTO experiences_fts(rowid, {columns}) VALUES (new.id, {new_values}); END"
+    ))
+    conn.execute(text("INSERT INTO experiences_fts(experiences_fts) VALUES ('rebuild')"))
+
+def downgrade_0002(conn):
+    if conn.dialect.name == 'postgresql':
+        conn.execute(text("DROP INDEX IF EXISTS ix_experiences_search_vector"))
+        conn.execute(text("ALTER TABLE experiences DROP COLUMN IF EXISTS search_vector"))
+        return
+    for trigger in ('insert', 'delete', 'update'):
+        conn.execute(text(f"DROP TRIGGER IF EXISTS experiences_fts_{trigger}"))
+    conn.execute(text("DROP TABLE IF EXISTS experiences_fts"))
+
+
+# 0003 - experience_dates.updated_at, so availability can be fingerprinted
+# for ETags without reading every row
+
+def _has_column(conn, table_name, column_name):
+    return any(col['name'] == column_name for col in inspect(conn).get_columns(table_name))
+
+def upgrade_0003(conn):
+    if not _has_column(conn, 'experience_dates', 'updated_at'):
+        conn.execute(text("ALTER TABLE experience_dates ADD COLUMN updated_at TIMESTAMP"))
+    conn.execute(text("UPDATE experience_dates SET updated_at = CURRENT_TIMESTAMP WHERE updated_at IS NULL"))
+
+def downgrade_0003(conn):
+    conn.execute(text("ALTER TABLE experience_dates DROP COLUMN updated_at"))
+
+
+# 0004 - one row per experience, day and start time, so calendar publishing
+# can upsert with ON CONFLICT DO NOTHING
+
+def upgrade_0004(conn):
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_experience_dates_slot "
+        "ON experience_dates (experience_id, date, start_time)"
+    ))
+
+def downgrade_0004(conn):
+    conn.execute(text("DROP INDEX IF EXISTS ux_experience_dates_slot"))
+
+
+
+# 0005 - resized image variants for uploads and the experiences using them
+
+def upgrade_0005(conn):
+    if not _has_column(conn, 'upload_jobs', 'variants'):
+        conn.execute(text("ALTER TABLE upload_jobs ADD COLUMN variants TEXT"))
+    if not _has_column(conn, 'experiences', 'image_variants'):
+        conn.execute(text("ALTER TABLE experiences ADD COLUMN image_variants TEXT"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_upload_jobs_url ON upload_jobs (url)"))
+
+def downgrade_0005(conn):
+    conn.execute(text("DROP INDEX IF EXISTS ix_upload_jobs_url"))
+    conn.execute(text("ALTER TABLE experiences DROP COLUMN image_variants"))
+    conn.execute(text("ALTER TABLE upload_jobs DROP COLUMN variants"))
+
+
+# 0006 - statistics counters, backfilled from the existing rows
+
+def upgrade_0006(conn):
+    import rollups
+    rollups.rebuild(conn)
+
+def downgrade_0006(conn):
+    conn.execute(text("DELETE FROM stat_counters"))
+
+
+# 0007 - hourly and daily booking rollups for analytics
+
+def upgrade_0007(conn):
+    import rollups
+    rollups.rebuild(conn)
+
+def downgrade_0007(conn):
+    conn.execute(text("DELETE FROM booking_rollups"))
+
+
+# 0008 - denormalized review ratings on experiences and guides
+
+RATING_COLUMNS = ['rating_count', 'rating_sum', 'rating_avg']
+
+def upgrade_0008(conn):
+    for table_name in ('experiences', 'users'):
+        for column_name in RATING_COLUMNS:
+            if not _has_column(conn, table_name, column_name):
+                column_type = 'FLOAT' if column_name == 'rating_avg' else 'INTEGER'
+                conn.execute(text(
+                    f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type} NOT NULL DEFAULT 0"
+                ))
+    true = _true(conn)
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_experiences_listed_rating "
+        f"ON experiences (rating_avg DESC, rating_count DESC) WHERE is_approved = {true} AND is_active = {true}"
+    ))
+    import ratings
+    ratings.rebuild(conn)
+
+def downgrade_0008(conn):
+    conn.execute(text("DROP INDEX IF EXISTS ix_experiences_listed_rating"))
+    for table_name in ('experiences', 'users'):
+        for column_name in RATING_COLUMNS:
+            conn.execute(text(f"ALTER TABLE {table_name} DROP COLUMN {column_name}"))
+
+
+# 0009 - listed-experience indexes for the search sort orders
+
+def _sort_indexes(conn):
+    true = _true(conn)
+    bookable = f"is_approved = {true} AND is_active = {true}"
+    return {
+        'ix_experiences_listed_duration': f"experiences (duration_hours, id) WHERE {bookable}",
+        'ix_experiences_listed_newest': f"experiences (created_at DESC, id) WHERE {bookable}",
+    }
+
+def upgrade_0009(conn):
+    for name, definition in _sort_indexes(conn).items():
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {definition}"))
+
+def downgrade_0009(conn):
+    for name in _sort_indexes(conn):
+        conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+
+# 0010 - experiences.images/includes/excludes as JSON arrays
+#
+# images held a JSON string and includes/excludes comma separated text. Rows
+# are converted in id batches, each in its own short transaction, so the
+# table is never locked for the whole rewrite. Postgres gets new jsonb
+# columns that are backfilled and then swapped in by rename (only the swap
+# takes a brief exclusive lock); SQLite's JSON1 reads the same JSON text, so
+# the values are rewritten in place. Interrupted runs resume where they left
+# off. Rows the old code edits while the backfill runs are found again by
+# updated_at and reconverted under the swap lock.
+
+JSON_LIST_COLUMNS = ['images', 'includes', 'excludes']
+BACKFILL_BATCH_SIZE = 2000
+# updated_at comes from the app servers' clocks, not the database's
+BACKFILL_CLOCK_SKEW = timedelta(minutes=5)
+
+def _column_type(conn, table_name, column_name):
+    for col in inspect(conn).get_columns(table_name):
+        if col['name'] == column_name:
+            return col['type'].__class__.__name__.lower()
+    return None
+
+def _convert_json_lists(conn, source, target, where, params=None):
+    """Rewrite `source` columns as JSON arrays into `target` columns for the rows matching `where`"""
+    from models import as_list
+    rows = conn.execute(text(f"SELECT id, {', '.join(source)} FROM experiences WHERE {where}"), params or {}).all()
+    if rows:
+        cast = (lambda name: f"CAST(:{name} AS jsonb)") if conn.dialect.name == 'postgresql' else (lambda name: f":{name}")
+        conn.execute(text(
+            f"UPDATE experiences SET {', '.join(f'{column} = {cast(column)}' for column in target)} WHERE id = :id"
+        ), [
+            {'id': row[0], **{column: json.dumps(as_list(value)) for column, value in zip(target, row[1:])}}
+            for row in rows
+        ])
+    return rows
+
+def _backfill_json_lists(engine, source, target, pending):
+    last_id = 0
+    while True:
+        with engine.begin() as batch:
+            rows = _convert_json_lists(
+                batch, source, target,
+                f"id > :last_id AND ({pending}) ORDER BY id LIMIT {BACKFILL_BATCH_SIZE}", {'last_id': last_id}
+            )
+        if not rows:
+            return
+        last_id = rows[-1][0]
+
+def upgrade_0010(conn):
+    if conn.dialect.name == 'postgresql':
+        if _column_type(conn, 'experiences', 'images') == 'jsonb':
+            return  # created by create_all()
+        with conn.engine.begin() as ddl:
+            for column in JSON_LIST_COLUMNS:
+                ddl.execute(text(f"ALTER TABLE experiences ADD COLUMN IF NOT EXISTS {column}_json jsonb"))
+        target = [f'{column}_json' for column in JSON_LIST_COLUMNS]
+        started = datetime.utcnow() - BACKFILL_CLOCK_SKEW
+        _backfill_json_lists(conn.engine, JSON_LIST_COLUMNS, target, 'images_json IS NULL')
+        # Catch rows the old code inserted or edited during the backfill, then swap the columns
+        conn.execute(text("LOCK TABLE experiences IN SHARE ROW EXCLUSIVE MODE"))
+        _convert_json_lists(conn, JSON_LIST_COLUMNS, target, 'images_json IS NULL OR updated_at >= :started',
+                            {'started': started})
+        for column in JSON_LIST_COLUMNS:
+            conn.execute(text(f"ALTER TABLE experiences DROP COLUMN {column}"))
+            conn.execute(text(f"ALTER TABLE experiences RENAME COLUMN {column}_json TO {column}"))
+        return
+    # SQLite: anything that isn't already a JSON array
+    pending = ' OR '.join(
+        f"({column} IS NULL OR NOT json_valid({column}) OR json_type({column}) != 'array')"
+        for column in JSON_LIST_COLUMNS
+    )
+    _backfill_json_lists(conn.engine, JSON_LIST_COLUMNS, JSON_LIST_COLUMNS, pending)
+
+def downgrade_0010(conn):
+    if conn.dialect.name == 'postgresql':
+        conn.execute(text("ALTER TABLE experiences ALTER COLUMN images TYPE TEXT USING images::text"))
+        # ALTER ... USING can't take a subquery, so the joined text goes through a new column
+        for column in ('includes', 'excludes'):
+            conn.execute(text(f"ALTER TABLE experiences ADD COLUMN {column}_text TEXT"))
+            conn.execute(text(
+                f"UPDATE experiences SET {column}_text = COALESCE(("
+                f"SELECT string_agg(item, ', ' ORDER BY position) "
+                f"FROM jsonb_array_elements_text(experiences.{column}) WITH ORDINALITY AS items(item, position)"
+                f"), '') WHERE jsonb_typeof({column}) = 'array'"
+            ))
+            conn.execute(text(f"ALTER TABLE experiences DROP COLUMN {column}"))
+            conn.execute(text(f"ALTER TABLE experiences RENAME COLUMN {column}_text TO {column}"))
+        return
+    for column in ('includes', 'excludes'):
+        conn.execute(text(
+            f"UPDATE experiences SET {column} = "
+            f"(SELECT group_concat(value, ', ') FROM json_each(experiences.{column})) "
+            f"WHERE json_valid({column}) AND json_type({column}) = 'array'"
+        ))
+
+
+# 0011 - experience coordinates and a spatial index for radius search
+#
+# SQLite gets an R-tree kept in sync by triggers (like the FTS5 table of
+# 0002); Postgres a GiST index over ll_to_earth() when cube/earthdistance can
+# be installed. Otherwise a (latitude, longitude) B-tree serves box scans.
+
+def _sqlite_has_rtree(conn):
+    options = {row[0] for row in conn.execute(text("PRAGMA compile_options"))}
+    return 'ENABLE_RTREE' in options
+
+def _earthdistance_index(conn):
+    try:
+        with conn.begin_nested():
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS cube"))
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS earthdistance"))
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_experiences_earth ON experiences "
+                "USING GIST (ll_to_earth(latitude, longitude))"
+            ))
+        return True
+    except Exception as e:
+        print(f"⚠️ earthdistance not available ({e.__class__.__name__}), radius search uses a B-tree box scan")
+        return False
+
+def upgrade_0011(conn):
+    for column_name in ('latitude', 'longitude'):
+        if not _has_column(conn, 'experiences', column_name):
+            conn.execute(text(f"ALTER TABLE experiences ADD COLUMN {column_name} FLOAT"))
+    import geo
+    geo.rebuild(conn)
+
+    if conn.dialect.name == 'postgresql':
+        if _earthdistance_index(conn):
+            return
+    elif conn.dialect.name == 'sqlite' and _sqlite_has_rtree(conn):
+        point = "new.id, new.latitude, new.latitude, new.longitude, new.longitude"
+        conn.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS experiences_rtree USING rtree(id, min_lat, max_lat, min_lng, max_lng)"
+        ))
+        conn.execute(text(
+            "CREATE TRIGGER IF NOT EXISTS experiences_rtree_insert AFTER INSERT ON experiences "
+            f"WHEN new.latitude IS NOT NULL AND new.longitude IS NOT NULL BEGIN "
+            f"INSERT INTO experiences_rtree VALUES ({point}); END"
+        ))
+        conn.execute(text(
+            "CREATE TRIGGER IF NOT EXISTS experiences_rtree_update AFTER UPDATE OF latitude, longitude ON experiences BEGIN "
+            "DELETE FROM experiences_rtree WHERE id = old.id; "
+            f"INSERT INTO experiences_rtree SELECT {point} WHERE new.latitude IS NOT NULL AND new.longitude IS NOT NULL; END"
+        ))
+        conn.execute(text(
+            "CREATE TRIGGER IF NOT EXISTS experiences_rtree_delete AFTER DELETE ON experiences BEGIN "
+            "DELETE FROM experiences_rtree WHERE id = old.id; END"
+        ))
+        conn.execute(text("DELETE FROM experiences_rtree"))
+        conn.execute(text(
+            "INSERT INTO experiences_rtree SELECT id, latitude, latitude, longitude, longitude "
+            "FROM experiences WHERE latitude IS NOT NULL AND longitude IS NOT NULL"
+        ))
+        return
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_experiences_lat_lng ON experiences (latitude, longitude)"))
+
+def downgrade_0011(conn):
+    conn.execute(text("DROP INDEX IF EXISTS ix_experiences_lat_lng"))
+    if conn.dialect.name == 'postgresql':
+        conn.execute(text("DROP INDEX IF EXISTS ix_experiences_earth"))
+    else:
+        for trigger in ('insert', 'update', 'delete'):
+            conn.execute(text(f"DROP TRIGGER IF EXISTS experiences_rtree_{trigger}"))
+        conn.execute(text("DROP TABLE IF EXISTS experiences_rtree"))
+    for column_name in ('latitude', 'longitude'):
+        conn.execute(text(f"ALTER TABLE experiences DROP COLUMN {column_name}"))
+
+
+# 0012 - reviews keep their row when the booking is cancelled
+#
+# Cancelling deletes the booking, which a plain FK from reviews.booking_id
+# rejects on Postgres. SQLite can't alter a constraint in place and doesn't
+# enforce FKs by default; cancel_booking clears the reference itself there.
+
+def _review_booking_fk(conn):
+    for fk in inspect(conn).get_foreign_keys('reviews'):
+        if fk['constrained_columns'] == ['booking_id']:
+            return fk['name']
+    return None
+
+def _replace_review_booking_fk(conn, on_delete):
+    if conn.dialect.name != 'postgresql':
+        return
+    name = _review_booking_fk(conn)
+    if name:
+        conn.execute(text(f"ALTER TABLE reviews DROP CONSTRAINT {name}"))
+    conn.execute(text(
+        "ALTER TABLE reviews ADD CONSTRAINT reviews_booking_id_fkey "
+        f"FOREIGN KEY (booking_id) REFERENCES bookings (id){on_delete}"
+    ))
+
+def upgrade_0012(conn):
+    _replace_review_booking_fk(conn, ' ON DELETE SET NULL')
+
+def downgrade_0012(conn):
+    _replace_review_booking_fk(conn, '')
+
+
+MIGRATIONS = [
+    ('0001', 'search and booking indexes', upgrade_0001, downgrade_0001),
+    ('0002', 'experience full-text search', upgrade_0002, downgrade_0002),
+    ('0003', 'experience_dates.updated_at', upgrade_0003, downgrade_0003),
+    ('0004', 'unique experience date slots', upgrade_0004, downgrade_0004),
+    ('0005', 'image variants', upgrade_0005, downgrade_0005),
+    ('0006', 'statistics counters', upgrade_0006, downgrade_0006),
+    ('0007', 'booking rollups', upgrade_0007, downgrade_0007),
+    ('0008', 'review ratings', upgrade_0008, downgrade_0008),
+    ('0009', 'search sort indexes', upgrade_0009, downgrade_0009),
+    ('0010', 'JSON experience lists', upgrade_0010, downgrade_0010),
+    ('0011', 'experience coordinates', upgrade_0011, downgrade_0011),
+    ('0012', 'review booking ON DELETE SET NULL', upgrade_0012, downgrade_0012),
+]
+
+
+def _ensure_version_table(conn):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version VARCHAR(32) PRIMARY KEY, "
+        "applied_at TIMESTAMP NOT NULL)"
+    ))
+
+def applied_versions():
+    with db.engine.begin() as conn:
+        _ensure_version_table(conn)
+        return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+def run_migrations():
+    """Apply pending migrations in order, each in its own transaction"""
+    done = applied_versions()
+    for version, description, upgrade, _ in MIGRATIONS:
+        if version in done:
+            continue
+        with db.engine.begin() as conn:
+            upgrade(conn)
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, applied_at) VALUES (:version, :applied_at)"),
+                {'version': version, 'applied_at': datetime.utcnow()}
+            )
+        print(f"📐 Applied migration {version}: {description}")
+
+def rollback_migration(version):
+    for candidate, description, _, downgrade in MIGRATIONS:
+        if candidate != version:
+            continue
+        with db.engine.begin() as conn:
+            _ensure_version_table(conn)
+            downgrade(conn)
+            conn.execute(text("DELETE FROM schema_migrations WHERE version = :version"), {'version': version})
+        print(f"↩️  Rolled back migration {version}: {description}")
+        return
+    raise ValueError(f"Unknown migration {version}")
+
+
+if __name__ == '__main__':
+    from app import app
+
+    with app.app_context():
+        db.create_all()
+        if len(sys.argv) == 3 and sys.argv[1] == 'down':
+            rollback_migration(sys.argv[2])
+        else:
+            run_migrations()
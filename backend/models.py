@@ -1,11 +1,15 @@
 from flask_sqlalchemy import SQLAlchemy
-from flask_bcrypt import Bcrypt
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import joinedload, validates
 from datetime import datetime, date
 import enum
 import json
+import re
+
+from passwords import PasswordHasher
 
 db = SQLAlchemy()
-bcrypt = Bcrypt()
+hasher = PasswordHasher()
 
 class UserRole(enum.Enum):
     TRAVELER = "traveler"
@@ -18,6 +22,46 @@ class BookingStatus(enum.Enum):
     COMPLETED = "completed"
     CANCELLED = "cancelled"
 
+class UploadStatus(enum.Enum):
+    PENDING = "pending"
+    PROCESSING = "processing"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+class JobStatus(enum.Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+# JSONB on Postgres; on SQLite a JSON1 text column (json_each/json_extract work on it)
+JSONList = db.JSON(none_as_null=True).with_variant(JSONB(none_as_null=True), 'postgresql')
+
+def as_list(value):
+    """A list from a list, a JSON array string or a comma separated string.
+
+    Commas inside parentheses don't split: 'accommodation (2 nights, tented), meals'
+    is two items.
+    """
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return [item for item in value if item not in (None, '')]
+    value = value.strip()
+    if value.startswith('['):
+        try:
+            return as_list(json.loads(value))
+        except ValueError:
+            pass
+    return [item.strip() for item in re.split(r',(?![^()]*\))', value) if item.strip()]
+
+def variant_url(image_variants, image_url, variant, image_format='webp'):
+    """Look up a variant in an Experience.image_variants JSON document"""
+    if not image_variants or not image_url:
+        return image_url
+    formats = json.loads(image_variants).get(image_url, {}).get(variant, {})
+    return formats.get(image_format) or image_url
+
 class User(db.Model):
     __tablename__ = 'users'
     
@@ -32,13 +76,21 @@ class User(db.Model):
     bio = db.Column(db.Text)
     profile_picture = db.Column(db.String(255))
     is_verified = db.Column(db.Boolean, default=True)
+    # Reviews of all the guide's experiences, maintained by ratings.py
+    rating_count = db.Column(db.Integer, nullable=False, default=0)
+    rating_sum = db.Column(db.Integer, nullable=False, default=0)
+    rating_avg = db.Column(db.Float, nullable=False, default=0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Both raise passwords.HashingBusy when the hashing pool is saturated
     def set_password(self, password):
-        self.password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+        self.password_hash = hasher.hash(password)
     
     def check_password(self, password):
-        return bcrypt.check_password_hash(self.password_hash, password)
+        return hasher.check(password, self.password_hash)
+    
+    def password_needs_rehash(self):
+        return hasher.needs_rehash(self.password_hash)
     
     def to_dict(self):
         return {
@@ -65,20 +117,38 @@ class Experience(db.Model):
     short_description = db.Column(db.String(300))
     category = db.Column(db.String(50), nullable=False)
     location = db.Column(db.String(100), nullable=False)
+    # Filled from the location by geo.py unless given explicitly
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
     duration_hours = db.Column(db.Integer, nullable=False)
     max_group_size = db.Column(db.Integer, nullable=False)
     price_per_person = db.Column(db.Float, nullable=False)
     itinerary = db.Column(db.Text)
-    includes = db.Column(db.Text)
-    excludes = db.Column(db.Text)
+    includes = db.Column(JSONList, default=list)
+    excludes = db.Column(JSONList, default=list)
     requirements = db.Column(db.Text)
     cover_image = db.Column(db.String(255))
-    images = db.Column(db.Text)
+    images = db.Column(JSONList, default=list)
+    image_variants = db.Column(db.Text)  # JSON: {image url: {'thumb': {'webp': url}, 'card': {...}}}
+    # Maintained by ratings.py on review insert/delete
+    rating_count = db.Column(db.Integer, nullable=False, default=0)
+    rating_sum = db.Column(db.Integer, nullable=False, default=0)
+    rating_avg = db.Column(db.Float, nullable=False, default=0)
     is_active = db.Column(db.Boolean, default=True)
     is_approved = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    guide = db.relationship('User', backref='experiences')
+    
+    @validates('images', 'includes', 'excludes')
+    def _validate_list(self, key, value):
+        return as_list(value)
+    
+    def variant_url(self, image_url, variant, image_format='webp'):
+        """A resized variant of one of this experience's images, else the original"""
+        return variant_url(self.image_variants, image_url, variant, image_format)
+    
     def to_dict(self):
         guide_data = None
         if self.guide:
@@ -86,7 +156,8 @@ class Experience(db.Model):
                 'name': f"{self.guide.first_name} {self.guide.last_name}",
                 'experience': self.guide.bio,
                 'languages': ['English', 'Swahili'],
-                'rating': 4.8
+                'rating': round(self.guide.rating_avg, 2) if self.guide.rating_count else None,
+                'review_count': self.guide.rating_count
             }
         
         return {
@@ -97,6 +168,8 @@ class Experience(db.Model):
             'short_description': self.short_description,
             'category': self.category,
             'location': self.location,
+            'latitude': self.latitude,
+            'longitude': self.longitude,
             'duration_hours': self.duration_hours,
             'max_group_size': self.max_group_size,
             'price_per_person': self.price_per_person,
@@ -105,7 +178,12 @@ class Experience(db.Model):
             'excludes': self.excludes,
             'requirements': self.requirements,
             'cover_image': self.cover_image,
+            'card_image': self.variant_url(self.cover_image, 'card'),
+            'thumbnail_image': self.variant_url(self.cover_image, 'thumb'),
             'images': self.images,
+            'image_variants': json.loads(self.image_variants) if self.image_variants else None,
+            'rating': round(self.rating_avg, 2) if self.rating_count else None,
+            'review_count': self.rating_count,
             'is_active': self.is_active,
             'is_approved': self.is_approved,
             'created_at': self.created_at.isoformat(),
@@ -122,6 +200,7 @@ class ExperienceDate(db.Model):
     start_time = db.Column(db.Time, nullable=False)
     available_slots = db.Column(db.Integer, nullable=False)
     is_available = db.Column(db.Boolean, default=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     def to_dict(self):
         return {
@@ -148,8 +227,12 @@ class Booking(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    def to_dict(self):
-        return {
+    traveler = db.relationship('User', backref='bookings')
+    experience = db.relationship('Experience', backref='bookings')
+    experience_date = db.relationship('ExperienceDate', backref='bookings')
+    
+    def to_dict(self, include_relations=True):
+        data = {
             'id': self.id,
             'traveler_id': self.traveler_id,
             'experience_id': self.experience_id,
@@ -160,7 +243,181 @@ class Booking(db.Model):
             'status': self.status.value,
             'is_paid': self.is_paid,
             'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat(),
-            'experience': self.experience.to_dict() if self.experience else None,
-            'experience_date': self.experience_date.to_dict() if self.experience_date else None
-        }
\ No newline at end of file
+            'updated_at': self.updated_at.isoformat()
+        }
+        if include_relations:
+            data['experience'] = self.experience.to_dict() if self.experience else None
+            data['experience_date'] = self.experience_date.to_dict() if self.experience_date else None
+        return data
+
+class Review(db.Model):
+    __tablename__ = 'reviews'
+    __table_args__ = (
+        db.UniqueConstraint('experience_id', 'user_id', name='ux_reviews_experience_user'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    experience_id = db.Column(db.Integer, db.ForeignKey('experiences.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    booking_id = db.Column(db.Integer, db.ForeignKey('bookings.id', ondelete='SET NULL'))
+    rating = db.Column(db.Integer, nullable=False)  # 1-5
+    comment = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    user = db.relationship('User')
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'experience_id': self.experience_id,
+            'user_id': self.user_id,
+            'rating': self.rating,
+            'comment': self.comment,
+            'created_at': self.created_at.isoformat(),
+            'user': {
+                'id': self.user.id,
+                'name': f"{self.user.first_name} {self.user.last_name}"
+            } if self.user else None
+        }
+
+class UploadJob(db.Model):
+    __tablename__ = 'upload_jobs'
+    
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    status = db.Column(db.Enum(UploadStatus), nullable=False, default=UploadStatus.PENDING)
+    filename = db.Column(db.String(255))
+    content_type = db.Column(db.String(50))
+    size = db.Column(db.Integer)
+    width = db.Column(db.Integer)
+    height = db.Column(db.Integer)
+    url = db.Column(db.String(500))
+    variants = db.Column(db.Text)  # JSON: {'thumb': {'webp': url}, 'card': {...}}
+    error = db.Column(db.String(500))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'status': self.status.value,
+            'filename': self.filename,
+            'content_type': self.content_type,
+            'size': self.size,
+            'width': self.width,
+            'height': self.height,
+            'url': self.url,
+            'variants': json.loads(self.variants) if self.variants else None,
+            'error': self.error,
+            'created_at': self.created_at.isoformat(),
+            'updated_at': self.updated_at.isoformat()
+        }
+
+class Job(db.Model):
+    """A unit of background work, see jobs.py"""
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        db.Index('ix_jobs_status_run_at', 'status', 'run_at'),
+        db.Index('ix_jobs_batch', 'kind', 'batch_key', 'status'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON
+    batch_key = db.Column(db.String(100))
+    status = db.Column(db.Enum(JobStatus), nullable=False, default=JobStatus.QUEUED)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = db.Column(db.String(64))
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'payload': json.loads(self.payload),
+            'batch_key': self.batch_key,
+            'status': self.status.value,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'run_at': self.run_at.isoformat(),
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat(),
+            'updated_at': self.updated_at.isoformat()
+        }
+
+class StatCounter(db.Model):
+    """A running count and amount for the admin dashboard, see rollups.py"""
+    __tablename__ = 'stat_counters'
+
+    scope = db.Column(db.String(20), primary_key=True)  # users, experiences, day, category, guide
+    name = db.Column(db.String(100), primary_key=True, default='')
+    count = db.Column(db.Integer, nullable=False, default=0)
+    amount = db.Column(db.Float, nullable=False, default=0)
+
+class BookingRollup(db.Model):
+    """Booking activity per hour or day, see rollups.py and analytics.py"""
+    __tablename__ = 'booking_rollups'
+
+    grain = db.Column(db.String(4), primary_key=True)  # hour, day
+    bucket = db.Column(db.DateTime, primary_key=True)
+    bookings = db.Column(db.Integer, nullable=False, default=0)
+    guests = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    cancellations = db.Column(db.Integer, nullable=False, default=0)
+
+
+# Batch serialization
+#
+# Calling to_dict() row by row lazy-loads guide, experience and
+# experience_date one SELECT at a time. These helpers attach eager-load
+# options so a whole listing is fetched in a fixed number of queries and
+# serialized in a single pass.
+
+def with_experience_relations(query):
+    """Eager-load everything Experience.to_dict touches"""
+    return query.options(joinedload(Experience.guide))
+
+def with_booking_relations(query):
+    """Eager-load everything Booking.to_dict touches"""
+    return query.options(
+        joinedload(Booking.experience).joinedload(Experience.guide),
+        joinedload(Booking.experience_date)
+    )
+
+def with_review_relations(query):
+    return query.options(joinedload(Review.user))
+
+def users_to_dicts(users):
+    return [user.to_dict() for user in users]
+
+def experiences_to_dicts(experiences):
+    return [experience.to_dict() for experience in experiences]
+
+def reviews_to_dicts(reviews):
+    return [review.to_dict() for review in reviews]
+
+def bookings_to_dicts(bookings):
+    """Serialize bookings, reusing one payload per shared experience/date"""
+    experiences = {}
+    experience_dates = {}
+    result = []
+    for booking in bookings:
+        data = booking.to_dict(include_relations=False)
+        
+        experience = booking.experience
+        if experience is not None and experience.id not in experiences:
+            experiences[experience.id] = experience.to_dict()
+        data['experience'] = experiences.get(booking.experience_id)
+        
+        experience_date = booking.experience_date
+        if experience_date is not None and experience_date.id not in experience_dates:
+            experience_dates[experience_date.id] = experience_date.to_dict()
+        data['experience_date'] = experience_dates.get(booking.experience_date_id)
+        
+        result.append(data)
+    return result
\ No newline at end of file
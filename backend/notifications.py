@@ -0,0 +1,71 @@
+"""Notification jobs for travelers and guides.
+
+Requests only enqueue these (see jobs.py); the worker delivers them.
+Everything addressed to a guide goes through the batched `guide_digest` job,
+so a guide who gets several messages or bookings within GUIDE_DIGEST_WINDOW
+seconds receives one digest instead of one notification each.
+
+deliver() prints to the worker log until an email/SMS provider is configured.
+"""
+import os
+
+from jobs import handler, enqueue
+from models import db, User, Booking, Experience, ExperienceDate, with_booking_relations
+
+GUIDE_DIGEST_WINDOW = int(os.getenv('GUIDE_DIGEST_WINDOW', 30))
+
+
+def deliver(recipient, subject, body):
+    print(f"📧 To {recipient}: {subject}\n{body}")
+
+
+def notify_guide(guide_id, text):
+    return enqueue('guide_digest', {'guide_id': guide_id, 'text': text}, batch_key=f'guide:{guide_id}')
+
+
+def _describe(experience, experience_date):
+    return f"{experience.title} on {experience_date.date.isoformat()} at {experience_date.start_time.strftime('%H:%M')}"
+
+
+@handler('guide_digest', batch=True, batch_window=GUIDE_DIGEST_WINDOW)
+def send_guide_digest(notifications):
+    guide = db.session.get(User, notifications[0]['guide_id'])
+    if guide is None:
+        return
+    count = len(notifications)
+    subject = 'New activity on Digital Guides' if count == 1 else f'{count} updates on Digital Guides'
+    deliver(guide.email, subject, '\n\n'.join(n['text'] for n in notifications))
+
+
+@handler('booking_confirmation')
+def send_booking_confirmation(payload):
+    booking = with_booking_relations(Booking.query.filter_by(id=payload['booking_id'])).first()
+    if booking is None:
+        return  # cancelled before we got to it
+    what = _describe(booking.experience, booking.experience_date)
+    deliver(
+        booking.traveler.email,
+        'Your booking is confirmed',
+        f"{what} for {booking.number_of_guests} guest(s). Total: {booking.total_price:,.2f}"
+    )
+    notify_guide(
+        booking.experience.guide_id,
+        f"New booking from {booking.traveler.first_name} {booking.traveler.last_name}: "
+        f"{what}, {booking.number_of_guests} guest(s)"
+    )
+
+
+@handler('booking_cancellation')
+def send_booking_cancellation(payload):
+    traveler = db.session.get(User, payload['traveler_id'])
+    experience = db.session.get(Experience, payload['experience_id'])
+    experience_date = db.session.get(ExperienceDate, payload['experience_date_id'])
+    if experience is None or experience_date is None:
+        return
+    what = _describe(experience, experience_date)
+    if traveler is not None:
+        deliver(traveler.email, 'Your booking was cancelled', f"{what} ({payload['number_of_guests']} guest(s))")
+    notify_guide(
+        experience.guide_id,
+        f"Booking cancelled: {what}, {payload['number_of_guests']} guest(s) released"
+    )
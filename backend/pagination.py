@@ -0,0 +1,93 @@
+import base64
+import json
+from flask import request, jsonify, current_app, Response, stream_with_context
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+STREAM_BATCH_SIZE = 500
+
+
+class PaginationError(ValueError):
+    pass
+
+
+def encode_cursor(last_id):
+    raw = json.dumps({'id': last_id}).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        return int(json.loads(base64.urlsafe_b64decode(padded.encode()))['id'])
+    except Exception:
+        raise PaginationError('Invalid cursor')
+
+def parse_limit(value):
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise PaginationError('Invalid limit')
+    if limit < 1:
+        raise PaginationError('Invalid limit')
+    return min(limit, MAX_PAGE_SIZE)
+
+def wants_ndjson():
+    return (request.args.get('format') == 'ndjson'
+            or 'application/x-ndjson' in request.headers.get('Accept', ''))
+
+
+def list_response(query, id_column, serialize, key):
+    """Build a listing response for `query`.
+
+    - `?format=ndjson` (or `Accept: application/x-ndjson`) streams every row
+      as one JSON object per line from a server-side cursor.
+    - `?limit=` / `?cursor=` return one keyset page ordered by `id_column`
+      plus a `next_cursor` for the following page.
+    - Without either, the full list is returned as before.
+
+    `serialize` turns a list of rows into a list of dicts, so callers can
+    pass the batch serializers from models.py.
+    """
+    query = query.order_by(id_column)
+
+    try:
+        if wants_ndjson():
+            return _stream_ndjson(query, serialize)
+
+        if 'limit' not in request.args and 'cursor' not in request.args:
+            rows = query.all()
+            return jsonify({key: serialize(rows), 'count': len(rows)})
+
+        limit = parse_limit(request.args.get('limit', DEFAULT_PAGE_SIZE))
+        cursor = request.args.get('cursor')
+        if cursor:
+            query = query.filter(id_column > decode_cursor(cursor))
+    except PaginationError as e:
+        return jsonify({'message': str(e)}), 400
+
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return jsonify({
+        key: serialize(rows),
+        'count': len(rows),
+        'next_cursor': encode_cursor(rows[-1].id) if has_more else None
+    })
+
+
+def _stream_ndjson(query, serialize):
+    dumps = current_app.json.dumps
+    rows = query.execution_options(stream_results=True).yield_per(STREAM_BATCH_SIZE)
+
+    def generate():
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == STREAM_BATCH_SIZE:
+                for item in serialize(batch):
+                    yield dumps(item) + '\n'
+                batch = []
+        for item in serialize(batch):
+            yield dumps(item) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
@@ -0,0 +1,132 @@
+"""Password hashing off the request thread.
+
+bcrypt is deliberately slow (~250 ms at cost 12), and with a couple of sync
+gunicorn workers a burst of logins used to hold every worker. Hashes are now
+computed in a small process pool sized to the CPU count. Admission is
+bounded: at most `workers + queue_size` hashes can be pending, and beyond
+that hash()/check() raise HashingBusy right away so the endpoint can answer
+503 instead of tying up a worker behind the queue.
+
+Hashes stay in the standard $2b$ format (the same one Flask-Bcrypt wrote), so
+existing passwords keep working. When BCRYPT_LOG_ROUNDS changes, needs_rehash()
+tells login to upgrade the stored hash.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import bcrypt
+
+
+class HashingBusy(Exception):
+    """Every hashing slot is taken, or a hash ran past the timeout; retry later"""
+
+
+def hash_password(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+def check_password(password, password_hash):
+    return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+
+def hash_rounds(password_hash):
+    """Cost factor of a $2b$NN$... hash, or None if it isn't bcrypt"""
+    try:
+        return int(password_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    """bcrypt in a bounded process pool, configured like a Flask extension.
+
+    Config:
+        BCRYPT_LOG_ROUNDS     cost factor for new hashes (default 12)
+        PASSWORD_HASH_WORKERS pool size (default CPU count; 0 hashes inline)
+        PASSWORD_HASH_QUEUE   hashes allowed to wait for a free worker
+        PASSWORD_HASH_TIMEOUT seconds to wait for a result (default 30)
+    """
+
+    def __init__(self, app=None):
+        self.rounds = 12
+        self.workers = os.cpu_count() or 1
+        self.queue_size = 2 * self.workers
+        self.timeout = 30
+        self.rejected = 0
+        self.timeouts = 0
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue_size)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.rounds = int(app.config.get('BCRYPT_LOG_ROUNDS', 12))
+        self.workers = int(app.config.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))
+        self.queue_size = int(app.config.get('PASSWORD_HASH_QUEUE', 2 * max(self.workers, 1)))
+        self.timeout = float(app.config.get('PASSWORD_HASH_TIMEOUT', 30))
+        self._slots = threading.BoundedSemaphore(max(self.workers, 1) + self.queue_size)
+
+    def _executor(self):
+        # Created lazily so each gunicorn worker gets its own pool. Children
+        # are not forks of a threaded worker holding DB connections and locks:
+        # they come from a forkserver that has only imported this module (or
+        # are spawned where forkserver is missing). Like any spawn/forkserver
+        # child they still re-import the parent's __main__ as __mp_main__, so
+        # entry points keep their side effects under `if __name__ ==
+        # '__main__'` (app.py, worker.py); under gunicorn __main__ is gunicorn.
+        with self._pool_lock:
+            if self._pool is None:
+                if 'forkserver' in multiprocessing.get_all_start_methods():
+                    context = multiprocessing.get_context('forkserver')
+                    context.set_forkserver_preload(['passwords'])
+                else:
+                    context = multiprocessing.get_context('spawn')
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+            return self._pool
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise HashingBusy('Password hashing is at capacity')
+        try:
+            if self.workers <= 0:
+                return fn(*args)
+            future = self._executor().submit(fn, *args)
+            try:
+                return future.result(timeout=self.timeout)
+            except TimeoutError:
+                future.cancel()
+                self.timeouts += 1
+                raise HashingBusy(f'Password hashing took longer than {self.timeout:g} s')
+            except BrokenProcessPool:
+                with self._pool_lock:
+                    self._pool = None
+                raise
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(hash_password, password, self.rounds)
+
+    def check(self, password, password_hash):
+        return self._run(check_password, password, password_hash)
+
+    def needs_rehash(self, password_hash):
+        return hash_rounds(password_hash) != self.rounds
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'queue_size': self.queue_size,
+            'rounds': self.rounds,
+            'rejected': self.rejected,
+            'timeouts': self.timeouts
+        }
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True, cancel_futures=True)
+                self._pool = None
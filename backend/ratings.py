@@ -0,0 +1,73 @@
+"""Denormalized review ratings for experiences and guides.
+
+Experience and User (guide) rows carry rating_count, rating_sum and
+rating_avg. A review insert or delete adjusts them with one UPDATE each, in
+the same flush, so listings read ratings from columns they already load (the
+guide is eager-loaded) and search can ORDER BY rating_avg without touching
+reviews. The sum is an integer, so the average never drifts.
+
+A rating change also bumps updated_at on the guide's experiences: their
+payloads embed the guide rating, and the ETag fingerprints in
+conditional.py are built from updated_at.
+
+    python ratings.py --rebuild    # recompute every aggregate from reviews
+"""
+import sys
+from datetime import datetime
+
+from sqlalchemy import case, event, func, select, update
+
+from models import db, Experience, Review, User
+
+
+def apply_rating(connection, experience_id, rating, sign=1):
+    """Add (sign=1) or remove (sign=-1) one rating. Returns the guide id."""
+    guide_id = connection.execute(
+        select(Experience.guide_id).where(Experience.id == experience_id)
+    ).scalar_one()
+    for model, row_id in ((Experience, experience_id), (User, guide_id)):
+        count = model.rating_count + sign
+        total = model.rating_sum + sign * rating
+        connection.execute(update(model).where(model.id == row_id).values(
+            rating_count=count,
+            rating_sum=total,
+            rating_avg=case((count > 0, total * 1.0 / count), else_=0)
+        ))
+    connection.execute(
+        update(Experience).where(Experience.guide_id == guide_id).values(updated_at=datetime.utcnow())
+    )
+    return guide_id
+
+
+@event.listens_for(Review, 'after_insert')
+def _review_inserted(mapper, connection, review):
+    apply_rating(connection, review.experience_id, review.rating)
+
+@event.listens_for(Review, 'after_delete')
+def _review_deleted(mapper, connection, review):
+    apply_rating(connection, review.experience_id, review.rating, sign=-1)
+
+
+def rebuild(connection):
+    """Recompute every experience and guide aggregate from the reviews table"""
+    for model, key in ((Experience, Review.experience_id), (User, Experience.guide_id)):
+        joined = select(key.label('id'), func.count(Review.id).label('count'),
+                        func.sum(Review.rating).label('total'))
+        if model is User:
+            joined = joined.join(Experience, Review.experience_id == Experience.id)
+        connection.execute(update(model).values(rating_count=0, rating_sum=0, rating_avg=0))
+        for row in connection.execute(joined.group_by(key)).all():
+            connection.execute(update(model).where(model.id == row.id).values(
+                rating_count=row.count, rating_sum=row.total, rating_avg=row.total / row.count
+            ))
+
+
+if __name__ == '__main__':
+    from app import app
+
+    if '--rebuild' not in sys.argv[1:]:
+        sys.exit('usage: python ratings.py --rebuild')
+    with app.app_context():
+        with db.engine.begin() as connection:
+            rebuild(connection)
+        print(f"✅ Rebuilt ratings from {Review.query.count()} reviews")
@@ -0,0 +1,236 @@
+"""Materialized statistics for the admin dashboard and analytics.
+
+/api/admin/statistics used to count users, experiences and bookings and sum
+revenue over the whole tables on every refresh. Those numbers now live in
+`stat_counters`, one row per (scope, name), updated in the same transaction
+as the write that changes them:
+
+    users        ''             registered users
+    experiences  ''             experiences, approved and active or not
+    category     'Hiking'       bookings and revenue by experience category
+    guide        '12'           bookings and revenue by guide
+
+Booking totals are the sum of the category rows, so no single row is written
+by every booking. Bookings count toward their experience's current category
+and guide: when an experience is recategorised or handed to another guide,
+its bookings' totals move with it, so a later cancellation takes them back
+out of the rows they are in (and rebuild() agrees).
+
+Activity over time goes to `booking_rollups`, one row per hour and per day
+(the `grain`), which analytics.py turns into time series. Bookings, guests
+and revenue count in the bucket the booking was made in, net of later
+cancellations; cancellations count in the bucket they happened in.
+
+Writes that bypass the ORM (bulk loads, raw SQL) are not counted; rebuild()
+recomputes everything from the base tables. Cancelled bookings are deleted,
+so cancellation counts cannot be recomputed and are kept as they are.
+
+    python rollups.py --rebuild
+"""
+import sys
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import DateTime, bindparam, event, func, inspect, select, text
+
+from models import db, User, Experience, Booking, StatCounter, BookingRollup
+
+UPSERT = text(
+    "INSERT INTO stat_counters (scope, name, count, amount) VALUES (:scope, :name, :count, :amount) "
+    "ON CONFLICT (scope, name) DO UPDATE SET "
+    "count = stat_counters.count + excluded.count, amount = stat_counters.amount + excluded.amount"
+)
+
+
+def bump(connection, changes):
+    """Apply [(scope, name, count, amount)] increments"""
+    connection.execute(UPSERT, [
+        {'scope': scope, 'name': name, 'count': count, 'amount': amount}
+        for scope, name, count, amount in changes
+    ])
+
+
+ROLLUP_UPSERT = text(
+    "INSERT INTO booking_rollups (grain, bucket, bookings, guests, revenue, cancellations) "
+    "VALUES (:grain, :bucket, :bookings, :guests, :revenue, :cancellations) "
+    "ON CONFLICT (grain, bucket) DO UPDATE SET "
+    "bookings = booking_rollups.bookings + excluded.bookings, "
+    "guests = booking_rollups.guests + excluded.guests, "
+    "revenue = booking_rollups.revenue + excluded.revenue, "
+    "cancellations = booking_rollups.cancellations + excluded.cancellations"
+).bindparams(bindparam('bucket', type_=DateTime))  # stored exactly as the ORM stores DateTime
+
+
+def add_activity(connection, changes):
+    """Apply [(when, bookings, guests, revenue, cancellations)] to the hour and day rollups"""
+    rows = []
+    for when, bookings, guests, revenue, cancellations in changes:
+        values = {'bookings': bookings, 'guests': guests, 'revenue': revenue, 'cancellations': cancellations}
+        rows.append({'grain': 'hour', 'bucket': when.replace(minute=0, second=0, microsecond=0), **values})
+        rows.append({'grain': 'day', 'bucket': datetime.combine(when.date(), datetime.min.time()), **values})
+    connection.execute(ROLLUP_UPSERT, rows)
+
+
+def record_booking(connection, booking, sign=1):
+    """Count a new booking (sign=1) or take a cancelled one back out (sign=-1)"""
+    category, guide_id = connection.execute(
+        select(Experience.category, Experience.guide_id).where(Experience.id == booking.experience_id)
+    ).one()
+    amount = sign * booking.total_price
+    bump(connection, [
+        ('category', category, sign, amount),
+        ('guide', str(guide_id), sign, amount),
+    ])
+    changes = [(booking.created_at, sign, sign * booking.number_of_guests, amount, 0)]
+    if sign < 0:
+        changes.append((datetime.utcnow(), 0, 0, 0, 1))
+    add_activity(connection, changes)
+
+
+@event.listens_for(Booking, 'after_insert')
+def _booking_inserted(mapper, connection, booking):
+    record_booking(connection, booking)
+
+@event.listens_for(Booking, 'after_delete')
+def _booking_deleted(mapper, connection, booking):
+    record_booking(connection, booking, sign=-1)
+
+@event.listens_for(User, 'after_insert')
+def _user_inserted(mapper, connection, user):
+    bump(connection, [('users', '', 1, 0)])
+
+@event.listens_for(User, 'after_delete')
+def _user_deleted(mapper, connection, user):
+    bump(connection, [('users', '', -1, 0)])
+
+@event.listens_for(Experience, 'after_insert')
+def _experience_inserted(mapper, connection, experience):
+    bump(connection, [('experiences', '', 1, 0)])
+
+@event.listens_for(Experience, 'after_delete')
+def _experience_deleted(mapper, connection, experience):
+    bump(connection, [('experiences', '', -1, 0)])
+
+# Have the ORM load the replaced value even when the attribute was expired
+@event.listens_for(Experience.category, 'set', active_history=True)
+@event.listens_for(Experience.guide_id, 'set', active_history=True)
+def _keep_old_attribution(target, value, oldvalue, initiator):
+    pass
+
+@event.listens_for(Experience, 'after_update')
+def _experience_updated(mapper, connection, experience):
+    state = inspect(experience)
+    category, guide = state.attrs.category.history, state.attrs.guide_id.history
+    if not category.has_changes() and not guide.has_changes():
+        return
+    count, amount = connection.execute(
+        select(func.count(Booking.id), func.coalesce(func.sum(Booking.total_price), 0))
+        .where(Booking.experience_id == experience.id)
+    ).one()
+    if not count:
+        return
+    changes = []
+    if category.has_changes() and category.deleted:
+        changes += [('category', category.deleted[0], -count, -amount), ('category', experience.category, count, amount)]
+    if guide.has_changes() and guide.deleted:
+        changes += [('guide', str(guide.deleted[0]), -count, -amount), ('guide', str(experience.guide_id), count, amount)]
+    if changes:
+        bump(connection, changes)
+
+
+def _hour(connection, column):
+    if connection.dialect.name == 'postgresql':
+        return func.date_trunc('hour', column)
+    return func.strftime('%Y-%m-%d %H:00:00', column)
+
+
+def _as_datetime(value):
+    return value if isinstance(value, datetime) else datetime.fromisoformat(value)
+
+
+def rebuild(connection):
+    """Recompute every counter and rollup from the base tables"""
+    connection.execute(StatCounter.__table__.delete())
+    changes = [
+        ('users', '', connection.execute(select(func.count(User.id))).scalar(), 0),
+        ('experiences', '', connection.execute(select(func.count(Experience.id))).scalar(), 0),
+    ]
+    revenue = func.coalesce(func.sum(Booking.total_price), 0)
+    joined = select(Experience.category, Experience.guide_id, func.count(Booking.id), revenue).join(
+        Experience, Booking.experience_id == Experience.id
+    ).group_by(Experience.category, Experience.guide_id)
+    by_category, by_guide = {}, {}
+    for category, guide_id, count, amount in connection.execute(joined):
+        for totals, name in ((by_category, category), (by_guide, str(guide_id))):
+            previous = totals.get(name, (0, 0))
+            totals[name] = (previous[0] + count, previous[1] + amount)
+    changes += [('category', name, count, amount) for name, (count, amount) in by_category.items()]
+    changes += [('guide', name, count, amount) for name, (count, amount) in by_guide.items()]
+    bump(connection, changes)
+
+    rollups = BookingRollup.__table__
+    cancelled = connection.execute(
+        select(rollups.c.grain, rollups.c.bucket, rollups.c.cancellations).where(rollups.c.cancellations != 0)
+    ).all()
+    connection.execute(rollups.delete())
+    hour = _hour(connection, Booking.created_at)
+    hourly = connection.execute(
+        select(hour, func.count(Booking.id), func.sum(Booking.number_of_guests), revenue).group_by(hour)
+    ).all()
+    if hourly:
+        add_activity(connection, [
+            (_as_datetime(bucket), count, guests, amount, 0) for bucket, count, guests, amount in hourly
+        ])
+    if cancelled:
+        connection.execute(ROLLUP_UPSERT, [
+            {'grain': grain, 'bucket': bucket, 'bookings': 0, 'guests': 0, 'revenue': 0, 'cancellations': count}
+            for grain, bucket, count in cancelled
+        ])
+
+
+def dashboard(days=30, top_guides=10):
+    """Everything /api/admin/statistics reports, read from the counters"""
+    since = datetime.combine(date.today() - timedelta(days=days - 1), datetime.min.time())
+    rows = StatCounter.query.filter(StatCounter.scope.in_(['users', 'experiences', 'category'])).all()
+    by_day = BookingRollup.query.filter(
+        BookingRollup.grain == 'day', BookingRollup.bucket >= since
+    ).order_by(BookingRollup.bucket).all()
+    top = StatCounter.query.filter_by(scope='guide').order_by(
+        StatCounter.amount.desc()
+    ).limit(top_guides).all()
+    names = dict(db.session.query(User.id, User.first_name + ' ' + User.last_name).filter(
+        User.id.in_([int(row.name) for row in top])
+    )) if top else {}
+
+    scalars = {row.scope: row.count for row in rows if row.scope in ('users', 'experiences')}
+    categories = sorted((row for row in rows if row.scope == 'category'), key=lambda row: -row.amount)
+    return {
+        'total_users': scalars.get('users', 0),
+        'total_bookings': sum(row.count for row in categories),
+        'total_experiences': scalars.get('experiences', 0),
+        'total_revenue': float(round(sum(row.amount for row in categories), 2)),
+        'by_day': [
+            {'date': row.bucket.date().isoformat(), 'bookings': row.bookings, 'revenue': round(row.revenue, 2),
+             'cancellations': row.cancellations}
+            for row in by_day
+        ],
+        'by_category': [
+            {'category': row.name, 'bookings': row.count, 'revenue': round(row.amount, 2)}
+            for row in categories if row.count
+        ],
+        'top_guides': [
+            {'guide_id': int(row.name), 'name': names.get(int(row.name)),
+             'bookings': row.count, 'revenue': round(row.amount, 2)}
+            for row in top if row.count
+        ]
+    }
+
+
+if __name__ == '__main__':
+    from app import app
+
+    if '--rebuild' not in sys.argv[1:]:
+        sys.exit('usage: python rollups.py --rebuild')
+    with app.app_context():
+        with db.engine.begin() as connection:
+            rebuild(connection)
+        print(f"✅ Rebuilt {StatCounter.query.count()} statistics counters")
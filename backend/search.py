@@ -0,0 +1,250 @@
+import re
+import time
+from datetime import date
+from dateutil.parser import parse
+from sqlalchemy import case, func, inspect, literal, literal_column, or_, select, table, column, union_all
+
+from models import db, Experience, ExperienceDate
+from geo import parse_near, filter_near, order_by_distance, InvalidLocation
+
+_fts_backend = {}
+# A missing index may just not be migrated yet, so "none" is only trusted this long
+NO_BACKEND_RECHECK = 60
+
+# bm25 weights, in the column order of migrations.FTS_COLUMNS:
+# title, short_description, description, category, location
+FTS5_WEIGHTS = (10.0, 4.0, 1.0, 6.0, 6.0)
+
+
+def full_text_backend():
+    """'postgresql', 'fts5' or None, looked up once per database (None is rechecked)"""
+    url = str(db.engine.url)
+    cached = _fts_backend.get(url)
+    if cached is None or (cached[0] is None and time.monotonic() - cached[1] > NO_BACKEND_RECHECK):
+        inspector = inspect(db.engine)
+        if db.engine.dialect.name == 'postgresql':
+            columns = {col['name'] for col in inspector.get_columns('experiences')}
+            backend = 'postgresql' if 'search_vector' in columns else None
+        elif inspector.has_table('experiences_fts'):
+            backend = 'fts5'
+        else:
+            backend = None
+        _fts_backend[url] = cached = (backend, time.monotonic())
+    return cached[0]
+
+
+def search_terms(q):
+    return re.findall(r'\w+', q.lower())
+
+
+def full_text_search(query, q):
+    """Restrict an Experience query to rows matching `q`, best match first.
+
+    Every word must match (prefix matching on SQLite). Falls back to LIKE on
+    title and description when the database has no full-text index.
+    """
+    terms = search_terms(q)
+    if not terms:
+        return query
+
+    backend = full_text_backend()
+    if backend == 'postgresql':
+        ts_query = func.to_tsquery('english', ' & '.join(f"{term}:*" for term in terms))
+        vector = literal_column('experiences.search_vector')
+        return query.filter(vector.op('@@')(ts_query)).order_by(
+            func.ts_rank(vector, ts_query).desc(), Experience.id
+        )
+
+    if backend == 'fts5':
+        fts = table('experiences_fts', column('rowid'))
+        match = ' '.join(f'"{term}"*' for term in terms)
+        ranked = select(
+            fts.c.rowid.label('experience_id'),
+            func.bm25(literal_column('experiences_fts'), *FTS5_WEIGHTS).label('rank')
+        ).where(literal_column('experiences_fts').op('MATCH')(match)).subquery()
+        return query.join(ranked, ranked.c.experience_id == Experience.id).order_by(
+            ranked.c.rank, Experience.id
+        )
+
+    for term in terms:
+        query = query.filter(or_(
+            Experience.title.ilike(f'%{term}%'),
+            Experience.description.ilike(f'%{term}%')
+        ))
+    return query
+
+
+# Search query builder
+#
+# Each filter is a (param, parser, apply) triple. build_search_query() runs
+# the parsers over the request args and applies every filter to one Query,
+# so any combination of parameters compiles to a single SQL statement.
+
+class InvalidSearchParameter(ValueError):
+    pass
+
+
+def listed_experiences():
+    return Experience.query.filter_by(is_approved=True, is_active=True)
+
+def filter_category(query, category):
+    return query.filter(Experience.category.ilike(f'%{category}%'))
+
+def filter_location(query, location):
+    return query.filter(Experience.location.ilike(f'%{location}%'))
+
+def filter_min_price(query, min_price):
+    return query.filter(Experience.price_per_person >= min_price)
+
+def filter_max_price(query, max_price):
+    return query.filter(Experience.price_per_person <= max_price)
+
+def filter_available_on(query, day):
+    """Semi-join: keep experiences with an open slot on `day`"""
+    open_date = db.session.query(ExperienceDate.id).filter(
+        ExperienceDate.experience_id == Experience.id,
+        ExperienceDate.date == day,
+        ExperienceDate.available_slots > 0,
+        ExperienceDate.is_available == True
+    )
+    return query.filter(open_date.exists())
+
+
+def _parse_price(value):
+    try:
+        return float(value)
+    except ValueError:
+        raise InvalidSearchParameter('Invalid price')
+
+def _parse_date(value):
+    try:
+        return parse(value).date()
+    except (ValueError, OverflowError):
+        raise InvalidSearchParameter('Invalid date format')
+
+
+SEARCH_FILTERS = [
+    ('q', str, full_text_search),
+    ('category', str, filter_category),
+    ('location', str, filter_location),
+    ('min_price', _parse_price, filter_min_price),
+    ('max_price', _parse_price, filter_max_price),
+    ('date', _parse_date, filter_available_on),
+]
+
+
+def _order(*columns):
+    return lambda query: query.order_by(*columns, Experience.id)
+
+def _by_availability(query):
+    """Soonest bookable date from today first, experiences with none last"""
+    next_open = db.session.query(
+        ExperienceDate.experience_id, func.min(ExperienceDate.date).label('next_date')
+    ).filter(
+        ExperienceDate.date >= date.today(),
+        ExperienceDate.available_slots > 0,
+        ExperienceDate.is_available == True
+    ).group_by(ExperienceDate.experience_id).subquery()
+    return query.outerjoin(next_open, next_open.c.experience_id == Experience.id).order_by(
+        next_open.c.next_date.is_(None), next_open.c.next_date, Experience.id
+    )
+
+
+# sort=: replaces the default order (best text match first, else id). Each
+# order ends with the id so pages are stable; the plain column sorts are
+# served by the partial indexes of migrations 0008 and 0009.
+SEARCH_SORTS = {
+    'price': _order(Experience.price_per_person),
+    'price_desc': _order(Experience.price_per_person.desc()),
+    'duration': _order(Experience.duration_hours),
+    'newest': _order(Experience.created_at.desc()),
+    'rating': _order(Experience.rating_avg.desc(), Experience.rating_count.desc()),
+    'availability': _by_availability,
+}
+
+
+def build_search_query(args, query=None):
+    """Return (query, parsed params) for the search parameters in `args`.
+
+    `lat`, `lng` and `radius_km` (default 50) restrict results to a circle,
+    nearest first unless another sort is asked for (see geo.py).
+
+    Raises InvalidSearchParameter for values that cannot be parsed.
+    """
+    query = listed_experiences() if query is None else query
+    params = {}
+    for name, parser, apply in SEARCH_FILTERS:
+        value = args.get(name)
+        if not value:
+            continue
+        params[name] = parser(value)
+        query = apply(query, params[name])
+    try:
+        near = parse_near(args)
+    except InvalidLocation as e:
+        raise InvalidSearchParameter(str(e))
+    if near is not None:
+        params['near'] = near
+        query = filter_near(query, near)
+    sort = args.get('sort') or ('distance' if near is not None else None)
+    if sort == 'distance':
+        if near is None:
+            raise InvalidSearchParameter('sort=distance needs lat and lng')
+        params['sort'] = sort
+        query = order_by_distance(query.order_by(None), near)
+    elif sort:
+        if sort not in SEARCH_SORTS:
+            raise InvalidSearchParameter(f"sort must be one of {', '.join(SEARCH_SORTS)}, distance")
+        params['sort'] = sort
+        query = SEARCH_SORTS[sort](query.order_by(None))
+    return query, params
+
+
+# Facet counts
+#
+# Each facet counts the results of every filter except its own, so the
+# category facet still lists the other categories while one is selected.
+# All facets and the total come back from a single UNION ALL statement.
+
+PRICE_BUCKETS = [0, 50, 100, 250, 500]
+
+def price_bucket():
+    edges = list(zip(PRICE_BUCKETS, PRICE_BUCKETS[1:]))
+    return case(
+        *[(Experience.price_per_person < high, f'{low}-{high}') for low, high in edges],
+        else_=f'{PRICE_BUCKETS[-1]}+'
+    )
+
+# facet: (grouping expression, the filters it ignores)
+SEARCH_FACETS = {
+    'category': (lambda: Experience.category, ('category',)),
+    'location': (lambda: Experience.location, ('location',)),
+    'price': (price_bucket, ('min_price', 'max_price')),
+}
+
+
+def search_facets(args):
+    """{'total': n, 'category': [{'value', 'count'}], 'location': [...], 'price': [...]}"""
+    args = {name: value for name, value in args.items() if name != 'sort'}
+    query, _ = build_search_query(args)
+    branches = [query.order_by(None).with_entities(
+        literal('total').label('facet'), literal('').label('value'), func.count(Experience.id).label('count')
+    )]
+    for facet, (expression, ignored) in SEARCH_FACETS.items():
+        facet_query, _ = build_search_query({name: value for name, value in args.items() if name not in ignored})
+        value = expression()
+        branches.append(facet_query.order_by(None).with_entities(
+            literal(facet).label('facet'), value.label('value'), func.count(Experience.id).label('count')
+        ).group_by(value))
+
+    facets = {'total': 0, **{facet: [] for facet in SEARCH_FACETS}}
+    for facet, value, count in db.session.execute(union_all(*[branch.statement for branch in branches])):
+        if facet == 'total':
+            facets['total'] = count
+        else:
+            facets[facet].append({'value': value, 'count': count})
+    for facet in ('category', 'location'):
+        facets[facet].sort(key=lambda item: (-item['count'], item['value']))
+    labels = [f'{low}-{high}' for low, high in zip(PRICE_BUCKETS, PRICE_BUCKETS[1:])] + [f'{PRICE_BUCKETS[-1]}+']
+    facets['price'].sort(key=lambda item: labels.index(item['value']))
+    return facets
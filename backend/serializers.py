@@ -0,0 +1,311 @@
+"""Fast JSON for list endpoints.
+
+Two parts:
+
+- FastJSONProvider replaces Flask's stdlib JSON with orjson when it is
+  installed. jsonify(), request.get_json() and NDJSON streaming all go
+  through app.json, so every endpoint benefits. orjson encodes datetimes,
+  dates, times and enums natively, in the same ISO format as isoformat().
+
+- RowEncoder serializes listings from plain row tuples instead of ORM
+  objects. It selects only the columns a payload needs, and compiles its
+  field spec once into a single function that builds each dict from `r[i]`
+  lookups. That skips identity-map bookkeeping, attribute instrumentation
+  and the per-row method calls of to_dict(). The output is the same JSON as
+  the models' to_dict(). Nested payloads (a booking's experience, an
+  experience's guide) are built once per batch per id and then shared.
+
+    experience_rows.select(query)  # Experience query -> tuple query
+    experience_rows(rows)          # tuples -> list of dicts
+
+Experience listings also take sparse fieldsets: `?view=summary` returns the
+card fields only and `?fields=title,price_per_person` any subset of the
+detail keys. The projected encoder selects just those columns, so the long
+description, itinerary and image text never leave the database.
+"""
+import json
+from functools import lru_cache
+
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy.orm import aliased
+
+from models import User, Experience, ExperienceDate, Booking, variant_url
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+    print("⚠️ orjson not available, using the standard library JSON encoder")
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """app.json backed by orjson, falling back to Flask's default provider"""
+
+    def _options(self):
+        options = orjson.OPT_NON_STR_KEYS
+        if self._app.debug:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps(self, obj, **kwargs):
+        if not ORJSON_AVAILABLE or kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self._options()).decode()
+
+    def loads(self, s, **kwargs):
+        if not ORJSON_AVAILABLE or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if not ORJSON_AVAILABLE:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default, option=self._options()),
+            mimetype=self.mimetype
+        )
+
+
+# Field spec
+#
+# A spec is a dict of output key -> field, where a field is a column, one of
+# the wrappers below, or another spec dict (an inline nested object).
+
+class Iso:
+    """A date/time column, as isoformat()"""
+    def __init__(self, column):
+        self.column = column
+
+class Value:
+    """An enum column, as its .value"""
+    def __init__(self, column):
+        self.column = column
+
+class Call:
+    """fn(*args), where args are columns or constants"""
+    def __init__(self, fn, *args):
+        self.fn = fn
+        self.args = args
+
+class Const:
+    def __init__(self, value):
+        self.value = value
+
+class Nested:
+    """A nested object built once per distinct `key` column value per batch, None when key is NULL"""
+    def __init__(self, key, spec):
+        self.key = key
+        self.spec = spec
+
+
+class RowEncoder:
+    def __init__(self, id_column, spec, joins=()):
+        self.spec = spec
+        self.joins = joins  # (target, onclause) outer joins the spec's columns need
+        self.columns = [id_column]
+        self._positions = {id(id_column): 0}
+        self._env = {}
+        self._memos = []
+        body = self._source(spec)
+        memos = ''.join(f'    {memo} = {{}}\n' for memo in self._memos)
+        source = f'def encode(rows):\n{memos}    return [{body} for r in rows]\n'
+        exec(compile(source, f'<RowEncoder {id_column}>', 'exec'), self._env)
+        self.encode = self._env['encode']
+
+    def _column(self, column):
+        key = id(column)
+        if key not in self._positions:
+            self._positions[key] = len(self.columns)
+            self.columns.append(column)
+        return f'r[{self._positions[key]}]'
+
+    def _name(self, value):
+        name = f'_v{len(self._env)}'
+        self._env[name] = value
+        return name
+
+    def _source(self, field):
+        if isinstance(field, dict):
+            return '{' + ', '.join(f'{key!r}: {self._source(value)}' for key, value in field.items()) + '}'
+        if isinstance(field, Iso):
+            ref = self._column(field.column)
+            return ref if ORJSON_AVAILABLE else f'({ref}.isoformat() if {ref} is not None else None)'
+        if isinstance(field, Value):
+            ref = self._column(field.column)
+            return ref if ORJSON_AVAILABLE else f'({ref}.value if {ref} is not None else None)'
+        if isinstance(field, Call):
+            return f'{self._name(field.fn)}({", ".join(self._source(arg) for arg in field.args)})'
+        if isinstance(field, Const):
+            return self._name(field.value)
+        if isinstance(field, Nested):
+            ref = self._column(field.key)
+            memo = f'_m{len(self._memos)}'
+            self._memos.append(memo)
+            build = f'{memo}.setdefault({ref}, {self._source(field.spec)})'
+            return f'(None if {ref} is None else {memo}[{ref}] if {ref} in {memo} else {build})'
+        if isinstance(field, str):
+            return repr(field)
+        return self._column(field)
+
+    def select(self, query):
+        """Turn an ORM query into one returning the spec's columns"""
+        labeled = [self.columns[0].label('id')] + [
+            column.label(f'c{i}') for i, column in enumerate(self.columns[1:], 1)
+        ]
+        query = query.with_entities(*labeled)
+        for target, onclause in self.joins:
+            query = query.outerjoin(target, onclause)
+        return query
+
+    def __call__(self, rows):
+        return self.encode(rows)
+
+
+# Encoders matching the models' to_dict()
+
+@lru_cache(maxsize=4096)
+def _parse_variants(document):
+    return json.loads(document) if document else None
+
+def _variant(document, image_url, variant):
+    return variant_url(document, image_url, variant)
+
+def _rating(average, count):
+    return round(average, 2) if count else None
+
+def _full_name(first_name, last_name):
+    return f"{first_name} {last_name}"
+
+
+Guide = aliased(User, name='guide')
+
+USER_SPEC = {
+    'id': User.id,
+    'first_name': User.first_name,
+    'last_name': User.last_name,
+    'email': User.email,
+    'role': Value(User.role),
+    'phone': User.phone,
+    'location': User.location,
+    'bio': User.bio,
+    'profile_picture': User.profile_picture,
+    'is_verified': User.is_verified,
+    'created_at': Iso(User.created_at),
+}
+
+EXPERIENCE_SPEC = {
+    'id': Experience.id,
+    'guide_id': Experience.guide_id,
+    'title': Experience.title,
+    'description': Experience.description,
+    'short_description': Experience.short_description,
+    'category': Experience.category,
+    'location': Experience.location,
+    'latitude': Experience.latitude,
+    'longitude': Experience.longitude,
+    'duration_hours': Experience.duration_hours,
+    'max_group_size': Experience.max_group_size,
+    'price_per_person': Experience.price_per_person,
+    'itinerary': Experience.itinerary,
+    'includes': Experience.includes,
+    'excludes': Experience.excludes,
+    'requirements': Experience.requirements,
+    'cover_image': Experience.cover_image,
+    'card_image': Call(_variant, Experience.image_variants, Experience.cover_image, 'card'),
+    'thumbnail_image': Call(_variant, Experience.image_variants, Experience.cover_image, 'thumb'),
+    'images': Experience.images,
+    'image_variants': Call(_parse_variants, Experience.image_variants),
+    'rating': Call(_rating, Experience.rating_avg, Experience.rating_count),
+    'review_count': Experience.rating_count,
+    'is_active': Experience.is_active,
+    'is_approved': Experience.is_approved,
+    'created_at': Iso(Experience.created_at),
+    'updated_at': Iso(Experience.updated_at),
+    'guide': Nested(Guide.id, {
+        'name': Call(_full_name, Guide.first_name, Guide.last_name),
+        'experience': Guide.bio,
+        'languages': Const(['English', 'Swahili']),
+        'rating': Call(_rating, Guide.rating_avg, Guide.rating_count),
+        'review_count': Guide.rating_count,
+    }),
+}
+
+EXPERIENCE_DATE_SPEC = {
+    'id': ExperienceDate.id,
+    'experience_id': ExperienceDate.experience_id,
+    'date': Iso(ExperienceDate.date),
+    'start_time': Iso(ExperienceDate.start_time),
+    'available_slots': ExperienceDate.available_slots,
+    'is_available': ExperienceDate.is_available,
+}
+
+BOOKING_SPEC = {
+    'id': Booking.id,
+    'traveler_id': Booking.traveler_id,
+    'experience_id': Booking.experience_id,
+    'experience_date_id': Booking.experience_date_id,
+    'number_of_guests': Booking.number_of_guests,
+    'total_price': Booking.total_price,
+    'special_requests': Booking.special_requests,
+    'status': Value(Booking.status),
+    'is_paid': Booking.is_paid,
+    'created_at': Iso(Booking.created_at),
+    'updated_at': Iso(Booking.updated_at),
+    'experience': Nested(Experience.id, EXPERIENCE_SPEC),
+    'experience_date': Nested(ExperienceDate.id, EXPERIENCE_DATE_SPEC),
+}
+
+user_rows = RowEncoder(User.id, USER_SPEC)
+experience_date_rows = RowEncoder(ExperienceDate.id, EXPERIENCE_DATE_SPEC)
+experience_rows = RowEncoder(Experience.id, EXPERIENCE_SPEC, joins=[
+    (Guide, Guide.id == Experience.guide_id),
+])
+booking_rows = RowEncoder(Booking.id, BOOKING_SPEC, joins=[
+    (Experience, Experience.id == Booking.experience_id),
+    (Guide, Guide.id == Experience.guide_id),
+    (ExperienceDate, ExperienceDate.id == Booking.experience_date_id),
+])
+
+
+# Sparse fieldsets for experience listings
+
+class InvalidFields(ValueError):
+    pass
+
+
+EXPERIENCE_VIEWS = {
+    'summary': (
+        'id', 'guide_id', 'title', 'short_description', 'category', 'location', 'latitude', 'longitude',
+        'duration_hours',
+        'max_group_size', 'price_per_person', 'cover_image', 'card_image', 'thumbnail_image',
+        'rating', 'review_count', 'created_at', 'updated_at', 'guide'
+    ),
+    'detail': tuple(EXPERIENCE_SPEC),
+}
+
+
+@lru_cache(maxsize=256)
+def _project_experiences(fields):
+    spec = {key: EXPERIENCE_SPEC[key] for key in fields}
+    joins = [(Guide, Guide.id == Experience.guide_id)] if 'guide' in spec else []
+    return RowEncoder(Experience.id, spec, joins=joins)
+
+
+def experience_encoder(args):
+    """The encoder for ?view=summary|detail (default detail) or ?fields=a,b,c"""
+    if args.get('fields'):
+        requested = [field.strip() for field in args['fields'].split(',') if field.strip()]
+        unknown = [field for field in requested if field not in EXPERIENCE_SPEC]
+        if unknown:
+            raise InvalidFields(f"Unknown fields: {', '.join(unknown)}")
+        fields = ('id',) + tuple(field for field in EXPERIENCE_SPEC if field in requested and field != 'id')
+    else:
+        view = args.get('view', 'detail')
+        if view not in EXPERIENCE_VIEWS:
+            raise InvalidFields(f"view must be one of {', '.join(EXPERIENCE_VIEWS)}")
+        if view == 'detail':
+            return experience_rows
+        fields = EXPERIENCE_VIEWS[view]
+    return _project_experiences(fields)
@@ -0,0 +1,360 @@
+"""Image upload pipeline.
+
+POST /api/upload used to hand the request's file to cloudinary.uploader
+inside the request, so every upload held a worker for the whole remote
+transfer. Now the request only:
+
+1. streams the body to a spool file in 64 KB chunks, enforcing
+   UPLOAD_MAX_BYTES as it goes,
+2. sniffs the format and dimensions from the file header (no decode),
+3. records an UploadJob row and queues the transfer on a thread pool
+   (which also renders the resized variants, see images.py),
+
+and answers 202 with the job id. GET /api/upload/<job_id> reports the job
+until it is completed (with its url) or failed.
+
+The thread pool lives in the web worker, so a recycled or restarted worker
+drops the transfers it had queued. The spool file is named after its job,
+and the process holding a job keeps it leased: a heartbeat thread bumps
+updated_at on its queued and running jobs every quarter of
+UPLOAD_STALE_AFTER, however slow the storage is. recover() picks up jobs
+whose lease has run out: it requeues them while their spool file is still
+on disk and fails them otherwise. It runs when a worker starts
+(gunicorn_config.py) and when a client polls a stale job.
+
+Storage backends:
+- CloudinaryStorage: the existing Cloudinary account
+- LocalStorage: files under UPLOAD_LOCAL_DIR, served by /api/uploads/<name>;
+  used when Cloudinary is not installed, and for offline testing
+"""
+import json
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from models import db, UploadJob, UploadStatus
+
+CHUNK_SIZE = 64 * 1024
+EXTENSIONS = {'jpeg': 'jpg', 'png': 'png', 'gif': 'gif', 'webp': 'webp'}
+
+
+class InvalidUpload(ValueError):
+    pass
+
+class UploadTooLarge(InvalidUpload):
+    pass
+
+
+# Header sniffing
+#
+# Only the first bytes of the file are read: enough to know the format and
+# the pixel dimensions, so oversized images are refused before any decode.
+
+def _png_size(head, stream):
+    if head[12:16] != b'IHDR':
+        raise InvalidUpload('Corrupt PNG header')
+    return struct.unpack('>II', head[16:24])
+
+def _gif_size(head, stream):
+    return struct.unpack('<HH', head[6:10])
+
+def _webp_size(head, stream):
+    chunk = head[12:16]
+    if chunk == b'VP8 ':
+        width, height = struct.unpack('<HH', head[26:30])
+        return width & 0x3fff, height & 0x3fff
+    if chunk == b'VP8L':
+        bits = int.from_bytes(head[21:25], 'little')
+        return (bits & 0x3fff) + 1, ((bits >> 14) & 0x3fff) + 1
+    if chunk == b'VP8X':
+        return int.from_bytes(head[24:27], 'little') + 1, int.from_bytes(head[27:30], 'little') + 1
+    raise InvalidUpload('Corrupt WebP header')
+
+def _jpeg_size(head, stream):
+    """Walk the JPEG segments up to the first start-of-frame marker"""
+    stream.seek(2)
+    while True:
+        marker = stream.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            raise InvalidUpload('Corrupt JPEG header')
+        while marker[1] == 0xFF:
+            marker = marker[1:] + stream.read(1)
+        code = marker[1]
+        if code in (0xD8, 0x01) or 0xD0 <= code <= 0xD7:
+            continue
+        length = stream.read(2)
+        if len(length) < 2:
+            raise InvalidUpload('Corrupt JPEG header')
+        length = struct.unpack('>H', length)[0]
+        if 0xC0 <= code <= 0xCF and code not in (0xC4, 0xC8, 0xCC):
+            frame = stream.read(5)
+            if len(frame) < 5:
+                raise InvalidUpload('Corrupt JPEG header')
+            height, width = struct.unpack('>HH', frame[1:5])
+            return width, height
+        stream.seek(length - 2, os.SEEK_CUR)
+
+
+SIGNATURES = [
+    (lambda head: head[:3] == b'\xff\xd8\xff', 'jpeg', _jpeg_size),
+    (lambda head: head[:8] == b'\x89PNG\r\n\x1a\n', 'png', _png_size),
+    (lambda head: head[:6] in (b'GIF87a', b'GIF89a'), 'gif', _gif_size),
+    (lambda head: head[:4] == b'RIFF' and head[8:12] == b'WEBP', 'webp', _webp_size),
+]
+
+
+def sniff_image(path):
+    """Return (format, width, height) read from the file header"""
+    with open(path, 'rb') as stream:
+        head = stream.read(32)
+        for matches, image_format, size in SIGNATURES:
+            if matches(head):
+                try:
+                    width, height = size(head, stream)
+                except struct.error:
+                    raise InvalidUpload(f'Corrupt {image_format.upper()} header')
+                return image_format, width, height
+    raise InvalidUpload('Unsupported image type (JPEG, PNG, GIF or WebP only)')
+
+
+# Storage backends
+
+class LocalStorage:
+    name = 'local'
+
+    def __init__(self, root, base_url='/api/uploads'):
+        self.root = root
+        self.base_url = base_url
+
+    def store(self, path, name):
+        os.makedirs(self.root, exist_ok=True)
+        shutil.move(path, os.path.join(self.root, name))
+        return f'{self.base_url}/{name}'
+
+
+class CloudinaryStorage:
+    name = 'cloudinary'
+
+    def __init__(self, folder='digital-guides/'):
+        self.folder = folder
+
+    def store(self, path, name):
+        import cloudinary.uploader
+        result = cloudinary.uploader.upload(
+            path,
+            folder=self.folder,
+            public_id=os.path.splitext(name)[0],
+            overwrite=False
+        )
+        return result['secure_url']
+
+
+class UploadPipeline:
+    """Spool, validate and queue uploads, configured like a Flask extension.
+
+    Config:
+        UPLOAD_MAX_BYTES   largest accepted file (default 10 MB)
+        UPLOAD_MAX_PIXELS  largest accepted width x height (default 40 MP)
+        UPLOAD_WORKERS     concurrent transfers to storage (default 4)
+        UPLOAD_STORAGE     'cloudinary' or 'local' (default)
+        UPLOAD_SPOOL_DIR   where request bodies are spooled (default tmp)
+        UPLOAD_LOCAL_DIR   where LocalStorage keeps files
+        UPLOAD_STALE_AFTER seconds without a heartbeat before an unfinished
+                           job counts as abandoned (default 600)
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.storage = None
+        self.variants = None  # images.ImageVariants, when resized copies are wanted
+        self._executor = None
+        self._leases = set()  # ids of the jobs this process has queued or is running
+        self._lease_lock = threading.Lock()
+        self._heartbeat = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.max_bytes = int(app.config.get('UPLOAD_MAX_BYTES', 10 * 1024 * 1024))
+        self.max_pixels = int(app.config.get('UPLOAD_MAX_PIXELS', 40_000_000))
+        self.workers = int(app.config.get('UPLOAD_WORKERS', 4))
+        self.spool_dir = app.config.get('UPLOAD_SPOOL_DIR') or tempfile.gettempdir()
+        self.stale_after = timedelta(seconds=int(app.config.get('UPLOAD_STALE_AFTER', 600)))
+        if app.config.get('UPLOAD_STORAGE') == 'cloudinary':
+            self.storage = CloudinaryStorage()
+        else:
+            self.storage = LocalStorage(app.config.get('UPLOAD_LOCAL_DIR') or os.path.join(app.instance_path, 'uploads'))
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='upload')
+        return self._executor
+
+    def spool(self, stream, content_length=None):
+        """Copy `stream` to a spool file, refusing it once it passes max_bytes"""
+        if content_length is not None and content_length > self.max_bytes:
+            raise UploadTooLarge(f'Images must be under {self.max_bytes // (1024 * 1024)} MB')
+        spool = tempfile.NamedTemporaryFile(dir=self.spool_dir, prefix='upload-', delete=False)
+        size = 0
+        try:
+            with spool:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise UploadTooLarge(f'Images must be under {self.max_bytes // (1024 * 1024)} MB')
+                    spool.write(chunk)
+        except BaseException:
+            os.unlink(spool.name)
+            raise
+        if size == 0:
+            os.unlink(spool.name)
+            raise InvalidUpload('Empty upload')
+        return spool.name, size
+
+    def submit(self, user_id, stream, filename='', content_length=None):
+        """Spool and validate an upload, then queue it. Returns the UploadJob."""
+        path, size = self.spool(stream, content_length)
+        try:
+            image_format, width, height = sniff_image(path)
+            if width * height > self.max_pixels:
+                raise InvalidUpload(f'Images must be under {self.max_pixels // 1_000_000} megapixels')
+        except InvalidUpload:
+            os.unlink(path)
+            raise
+
+        job_id = uuid.uuid4().hex
+        spooled = self.spool_path(job_id)
+        os.replace(path, spooled)
+        job = UploadJob(
+            id=job_id,
+            user_id=user_id,
+            filename=(filename or '')[:255],
+            content_type=f'image/{image_format}',
+            size=size,
+            width=width,
+            height=height
+        )
+        db.session.add(job)
+        db.session.commit()
+        self._queue(job)
+        return job
+
+    def spool_path(self, job_id):
+        return os.path.join(self.spool_dir, f'upload-{job_id}')
+
+    def _queue(self, job):
+        name = f"{job.id}.{EXTENSIONS[job.content_type.split('/', 1)[1]]}"
+        with self._lease_lock:
+            self._leases.add(job.id)
+            if self._heartbeat is None:
+                self._heartbeat = threading.Thread(target=self._renew_leases, name='upload-heartbeat', daemon=True)
+                self._heartbeat.start()
+        self.executor.submit(self._transfer, job.id, self.spool_path(job.id), name)
+
+    def _renew_leases(self):
+        while True:
+            time.sleep(self.stale_after.total_seconds() / 4)
+            with self._lease_lock:
+                held = list(self._leases)
+            if not held:
+                continue
+            try:
+                with self.app.app_context(), db.engine.begin() as connection:
+                    connection.execute(
+                        update(UploadJob)
+                        .where(UploadJob.id.in_(held),
+                               UploadJob.status.in_([UploadStatus.PENDING, UploadStatus.PROCESSING]))
+                        .values(updated_at=datetime.utcnow())
+                    )
+            except Exception as e:
+                print(f"⚠️ Could not renew upload leases: {e}")
+
+    def is_stale(self, job):
+        return (job.status in (UploadStatus.PENDING, UploadStatus.PROCESSING)
+                and job.updated_at < datetime.utcnow() - self.stale_after)
+
+    def recover(self, jobs=None):
+        """Requeue or fail stale jobs (all of them by default). Returns (requeued, failed)."""
+        if jobs is None:
+            jobs = UploadJob.query.filter(
+                UploadJob.status.in_([UploadStatus.PENDING, UploadStatus.PROCESSING]),
+                UploadJob.updated_at < datetime.utcnow() - self.stale_after
+            ).all()
+        requeued = failed = 0
+        for job in jobs:
+            if not self.is_stale(job):
+                continue
+            spooled = os.path.exists(self.spool_path(job.id))
+            values = {'status': UploadStatus.PENDING, 'updated_at': datetime.utcnow()} if spooled else {
+                'status': UploadStatus.FAILED, 'error': 'Upload was interrupted by a server restart, please upload again'
+            }
+            # Conditional on the row being untouched, so only one worker takes it over
+            claimed = db.session.execute(
+                update(UploadJob)
+                .where(UploadJob.id == job.id, UploadJob.status == job.status, UploadJob.updated_at == job.updated_at)
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            db.session.commit()
+            db.session.refresh(job)
+            if claimed and spooled:
+                self._queue(job)
+                requeued += 1
+            elif claimed:
+                failed += 1
+        return requeued, failed
+
+    def _transfer(self, job_id, path, name):
+        try:
+            self._run_transfer(job_id, path, name)
+        finally:
+            with self._lease_lock:
+                self._leases.discard(job_id)
+
+    def _run_transfer(self, job_id, path, name):
+        with self.app.app_context():
+            job = db.session.get(UploadJob, job_id)
+            if job is None or job.status != UploadStatus.PENDING:
+                return  # failed by recover() after this process lost the lease
+            job.status = UploadStatus.PROCESSING
+            db.session.commit()
+            # Variants are rendered from the spool file before storage moves it.
+            # They are best-effort: a picture Pillow can't decode still uploads,
+            # its job just keeps variants NULL and clients fall back to the original.
+            rendered = None
+            if self.variants and self.variants.enabled:
+                try:
+                    rendered = self.variants.render(path)
+                except Exception as e:
+                    print(f"⚠️ Could not render variants for upload {job_id}: {e}")
+            try:
+                job.url = self.storage.store(path, name)
+                job.status = UploadStatus.COMPLETED
+            except Exception as e:
+                job.status = UploadStatus.FAILED
+                job.error = str(e)[:500]
+            finally:
+                if os.path.exists(path):
+                    os.unlink(path)
+            if rendered and job.status == UploadStatus.COMPLETED:
+                try:
+                    job.variants = json.dumps(self.variants.save(rendered, job.url))
+                except Exception as e:
+                    print(f"⚠️ Could not save variants for upload {job_id}: {e}")
+            db.session.commit()
+
+    def local_root(self):
+        return self.storage.root if isinstance(self.storage, LocalStorage) else None
@@ -0,0 +1,36 @@
+"""Background job worker process.
+
+    python worker.py           # run a worker until interrupted
+    python worker.py --once    # run the jobs that are due, then exit
+
+This lives outside jobs.py on purpose: run as a script, jobs.py would be
+`__main__`, while notifications.py registers its handlers on the module
+imported as `jobs`, and the worker would start with no handlers at all.
+"""
+import os
+import signal
+import sys
+
+from app import app
+import notifications  # noqa: F401  registers the notification handlers
+from jobs import Worker, HANDLERS
+
+
+if __name__ == '__main__':
+    if not HANDLERS:
+        sys.exit('No job handlers registered')
+    with app.app_context():
+        worker = Worker(
+            batch_size=int(os.getenv('JOBS_BATCH_SIZE', 50)),
+            poll_interval=float(os.getenv('JOBS_POLL_INTERVAL', 1.0))
+        )
+        if '--once' in sys.argv[1:]:
+            while worker.run_once():
+                pass
+            print(f"✅ Ran {worker.processed} jobs")
+        else:
+            def stop(signum, frame):
+                worker.stopping = True
+            signal.signal(signal.SIGTERM, stop)
+            signal.signal(signal.SIGINT, stop)
+            worker.run_forever()
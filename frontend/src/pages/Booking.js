@@ -169,10 +169,10 @@ const Booking = () => {
                   <p className="text-gray-600 leading-relaxed">{experience.description}</p>
                 </div>
 
-                {experience.includes && (
+                {experience.includes && experience.includes.length > 0 && (
                   <div>
                     <h3 className="font-semibold text-gray-900 mb-2">What's Included</h3>
-                    <p className="text-gray-600">{experience.includes}</p>
+                    <p className="text-gray-600">{experience.includes.join(', ')}</p>
                   </div>
                 )}
 
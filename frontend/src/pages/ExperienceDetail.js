@@ -176,10 +176,10 @@ const ExperienceDetail = () => {
                 )}
 
                 {/* What's Included */}
-                {experience.includes && (
+                {experience.includes && experience.includes.length > 0 && (
                   <div className="mb-6">
                     <h3 className="text-xl font-semibold text-gray-900 mb-3">What's Included</h3>
-                    <p className="text-gray-600">{experience.includes}</p>
+                    <p className="text-gray-600">{experience.includes.join(', ')}</p>
                   </div>
                 )}
 
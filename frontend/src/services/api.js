@@ -57,9 +57,13 @@ export const authAPI = {
 
 // Experiences API calls
 export const experiencesAPI = {
-  // Get all experiences
-  getAll: async () => {
-    return apiRequest('/api/experiences');
+  // Get all experiences; view: 'summary' for catalog cards, or fields: ['title', ...]
+  getAll: async ({ view, fields } = {}) => {
+    const params = new URLSearchParams();
+    if (view) params.append('view', view);
+    if (fields) params.append('fields', fields.join(','));
+    const query = params.toString();
+    return apiRequest(`/api/experiences${query ? `?${query}` : ''}`);
   },
 
   // Get single experience by ID
@@ -92,6 +96,22 @@ export const experiencesAPI = {
     if (filters.maxPrice) params.append('max_price', filters.maxPrice);
     if (filters.date) params.append('date', filters.date);
     if (filters.availability) params.append('availability', filters.availability);
+    if (filters.q) params.append('q', filters.q);
+    // Near a point, nearest first: lat, lng and radiusKm (default 50)
+    if (filters.lat != null && filters.lng != null) {
+      params.append('lat', filters.lat);
+      params.append('lng', filters.lng);
+      if (filters.radiusKm) params.append('radius_km', filters.radiusKm);
+    }
+    // Server-side ordering and paging: price, price_desc, duration, newest, rating, availability, distance
+    if (filters.sort) params.append('sort', filters.sort);
+    if (filters.limit) params.append('limit', filters.limit);
+    if (filters.offset) params.append('offset', filters.offset);
+    // Category, location and price bucket counts for the filter sidebar
+    if (filters.facets) params.append('facets', 'true');
+    // Sparse payloads: view=summary|detail or a list of fields
+    if (filters.view) params.append('view', filters.view);
+    if (filters.fields) params.append('fields', filters.fields.join(','));
     
     return apiRequest(`/api/experiences/search?${params.toString()}`);
   },
@@ -171,7 +191,30 @@ export const uploadAPI = {
       throw new Error('Upload failed');
     }
 
-    return response.json();
+    // The server stores the image in the background; poll the job until it's done
+    let job = await response.json();
+    while (job.status === 'pending' || job.status === 'processing') {
+      await new Promise((resolve) => setTimeout(resolve, 500));
+      const status = await fetch(`${API_URL}/api/upload/${job.job_id}`, {
+        headers: {
+          'Authorization': `Bearer ${token}`,
+        },
+      });
+      if (!status.ok) {
+        throw new Error('Upload failed');
+      }
+      job = await status.json();
+    }
+
+    if (job.status === 'failed') {
+      throw new Error(job.error || 'Upload failed');
+    }
+
+    // Local storage serves files from the API itself
+    if (job.url && job.url.startsWith('/')) {
+      job.url = `${API_URL}${job.url}`;
+    }
+    return job;
   },
 };
 
@@ -189,6 +232,29 @@ export const contactAPI = {
   },
 };
 
+// Reviews API calls
+export const reviewsAPI = {
+  // Review a booked experience (rating 1-5)
+  create: async (review) => {
+    return apiRequest('/api/reviews', {
+      method: 'POST',
+      body: review,
+    });
+  },
+
+  getByExperience: async (experienceId) => {
+    return apiRequest(`/api/experiences/${experienceId}/reviews`);
+  },
+
+  delete: async (reviewId) => {
+    return apiRequest(`/api/reviews/${reviewId}`, {
+      method: 'DELETE',
+    });
+  },
+};
+
+export const createReview = reviewsAPI.create;
+
 // Utility functions
 export const apiUtils = {
   // Check if user is authenticated